@@ -0,0 +1,134 @@
+from bisect import bisect_left, insort
+from typing import Iterable, Iterator, Optional
+
+
+def normalize(value) -> str:
+    # `casefold()` is a stronger `lower()` meant for case-insensitive comparisons (e.g. "ß" -> "ss")
+    return value.casefold() if isinstance(value, str) else ""
+
+
+# Case-insensitive index over the book dictionaries used in `example.py`.
+# Every title, author and category is normalized once, when the book is added,
+# and stored as a key in a hash map, so a lookup costs one `casefold()` of the query
+# and one dictionary access instead of re-normalizing every stored book on each request.
+# Each map points to a "bucket" `{slot: book}`, where `slot` is an internal insertion number,
+# which keeps results in insertion order and makes removing a book O(1).
+# A sorted list of the normalized titles answers prefix (autocomplete) queries with `bisect`.
+class BookIndex:
+    def __init__(self, books: Iterable[dict] = ()):
+        self._books: dict[int, dict] = {}
+        self._keys: dict[int, tuple[str, str, str]] = {}
+        self._by_title: dict[str, dict[int, dict]] = {}
+        self._by_author: dict[str, dict[int, dict]] = {}
+        self._by_category: dict[str, dict[int, dict]] = {}
+        self._by_author_category: dict[tuple[str, str], dict[int, dict]] = {}
+        self._sorted_titles: list[str] = []
+        self._next_slot = 0
+        self.extend(books)
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self._books.values())
+
+    def all(self) -> list[dict]:
+        return list(self._books.values())
+
+    def by_title(self, title: str) -> Optional[dict]:
+        bucket = self._by_title.get(normalize(title))
+        return next(iter(bucket.values())) if bucket else None
+
+    def by_author(self, author: str) -> list[dict]:
+        return list(self._by_author.get(normalize(author), {}).values())
+
+    def by_category(self, category: str) -> list[dict]:
+        return list(self._by_category.get(normalize(category), {}).values())
+
+    def by_author_category(self, author: str, category: str) -> list[dict]:
+        key = (normalize(author), normalize(category))
+        return list(self._by_author_category.get(key, {}).values())
+
+    def by_title_prefix(self, prefix: str, limit: int) -> list[dict]:
+        # Titles sharing a prefix are next to each other in the sorted list,
+        # so we jump to the first candidate and stop at the first title that doesn't match
+        prefix = normalize(prefix)
+        books = []
+        position = bisect_left(self._sorted_titles, prefix)
+        while len(books) < limit and position < len(self._sorted_titles):
+            title = self._sorted_titles[position]
+            if not title.startswith(prefix):
+                break
+            books.extend(self._by_title[title].values())
+            position += 1
+        return books[:limit]
+
+    def add(self, book: dict) -> dict:
+        slot = self._next_slot
+        self._next_slot += 1
+        self._books[slot] = book
+        self._index(slot, book)
+        return book
+
+    def extend(self, books: Iterable[dict]) -> None:
+        # Bulk load: new titles are appended and the title list is sorted once at the end,
+        # instead of inserting every title at its sorted position (which shifts the rest of the list)
+        for book in books:
+            slot = self._next_slot
+            self._next_slot += 1
+            self._books[slot] = book
+            self._index(slot, book, keep_sorted=False)
+        self._sorted_titles.sort()
+
+    def replace(self, title: str, book: dict) -> bool:
+        # Like the original loop, every book with a matching title is replaced
+        slots = list(self._by_title.get(normalize(title), {}))
+        for slot in slots:
+            self._unindex(slot)
+            self._books[slot] = book
+            self._index(slot, book)
+        return bool(slots)
+
+    def remove(self, title: str) -> Optional[dict]:
+        # Only the first book with a matching title is removed
+        bucket = self._by_title.get(normalize(title))
+        if not bucket:
+            return None
+        slot = next(iter(bucket))
+        self._unindex(slot)
+        return self._books.pop(slot)
+
+    def _index(self, slot: int, book: dict, keep_sorted: bool = True) -> None:
+        title = normalize(book.get("title"))
+        author = normalize(book.get("author"))
+        category = normalize(book.get("category"))
+        self._keys[slot] = (title, author, category)
+
+        if title not in self._by_title:
+            self._by_title[title] = {}
+            if keep_sorted:
+                insort(self._sorted_titles, title)
+            else:
+                self._sorted_titles.append(title)
+        self._by_title[title][slot] = book
+        self._by_author.setdefault(author, {})[slot] = book
+        self._by_category.setdefault(category, {})[slot] = book
+        self._by_author_category.setdefault((author, category), {})[slot] = book
+
+    def _unindex(self, slot: int) -> None:
+        title, author, category = self._keys.pop(slot)
+        self._discard(self._by_author, author, slot)
+        self._discard(self._by_category, category, slot)
+        self._discard(self._by_author_category, (author, category), slot)
+        if self._discard(self._by_title, title, slot):
+            del self._sorted_titles[bisect_left(self._sorted_titles, title)]
+
+    @staticmethod
+    def _discard(index: dict, key, slot: int) -> bool:
+        # Returns True when the bucket became empty and was dropped
+        bucket = index[key]
+        del bucket[slot]
+        if bucket:
+            return False
+        del index[key]
+        return True
@@ -1,78 +1,126 @@
 """A basic FastAPI application demonstrating how to build and interact with RESTful APIs."""
 
+from contextlib import asynccontextmanager
+
 import uvicorn
-from fastapi import Body, FastAPI
-
-app = FastAPI()
-
-BOOKS = [
-    {
-        "title": "A Brief History of Time",
-        "author": "Stephen Hawking",
-        "category": "science",
-    },
-    {"title": "The Selfish Gene", "author": "Richard Dawkins", "category": "science"},
-    {
-        "title": "Sapiens: A Brief History of Humankind",
-        "author": "Yuval Noah Harari",
-        "category": "history",
-    },
-    {
-        "title": "Guns, Germs, and Steel",
-        "author": "Jared Diamond",
-        "category": "history",
-    },
-    {
-        "title": "The Art of Statistics",
-        "author": "David Spiegelhalter",
-        "category": "math",
-    },
-    {
-        "title": "Mathematics for the Nonmathematician",
-        "author": "Morris Kline",
-        "category": "math",
-    },
-    {"title": "Cosmos", "author": "Carl Sagan", "category": "science"},
-    {
-        "title": "A People’s History of the United States",
-        "author": "Howard Zinn",
-        "category": "history",
-    },
-    {
-        "title": "The Code Book: The Science of Secrecy",
-        "author": "Simon Singh",
-        "category": "science",
-    },
-    {
-        "title": "Introduction to the Theory of Computation",
-        "author": "Michael Sipser",
-        "category": "math",
-    },
-]
+from fastapi import Body, FastAPI, Query
+
+from a0_intro.book_index import BookIndex
+from storage.snapshot_log import from_env
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if BOOK_LOG is not None:
+        await BOOK_LOG.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# `BOOKS` normalizes titles, authors and categories once and keeps them in hash maps,
+# so the endpoints below don't need to call `casefold()` on every stored book (see `book_index.py`)
+BOOKS = BookIndex(
+    [
+        {
+            "title": "A Brief History of Time",
+            "author": "Stephen Hawking",
+            "category": "science",
+        },
+        {
+            "title": "The Selfish Gene",
+            "author": "Richard Dawkins",
+            "category": "science",
+        },
+        {
+            "title": "Sapiens: A Brief History of Humankind",
+            "author": "Yuval Noah Harari",
+            "category": "history",
+        },
+        {
+            "title": "Guns, Germs, and Steel",
+            "author": "Jared Diamond",
+            "category": "history",
+        },
+        {
+            "title": "The Art of Statistics",
+            "author": "David Spiegelhalter",
+            "category": "math",
+        },
+        {
+            "title": "Mathematics for the Nonmathematician",
+            "author": "Morris Kline",
+            "category": "math",
+        },
+        {"title": "Cosmos", "author": "Carl Sagan", "category": "science"},
+        {
+            "title": "A People’s History of the United States",
+            "author": "Howard Zinn",
+            "category": "history",
+        },
+        {
+            "title": "The Code Book: The Science of Secrecy",
+            "author": "Simon Singh",
+            "category": "science",
+        },
+        {
+            "title": "Introduction to the Theory of Computation",
+            "author": "Michael Sipser",
+            "category": "math",
+        },
+    ]
+)
+
+# Optional persistence, enabled with `BOOKS_DATA_DIR` (see `storage/snapshot_log.py`),
+# for a single worker process: a second one fails to start instead of corrupting the log.
+# The log holds `("add", book)`, `("replace", title, book)` and `("remove", title)` operations.
+BOOK_LOG = from_env("example_books")
+
+
+def apply_operation(operation: tuple) -> None:
+    action, *arguments = operation
+    if action == "add":
+        BOOKS.add(*arguments)
+    elif action == "replace":
+        BOOKS.replace(*arguments)
+    elif action == "remove":
+        BOOKS.remove(*arguments)
+
+
+# The fsync and the compaction run in worker threads. The stored dictionaries are never modified
+# (`replace` stores the new one), so the list of them returned by `all()` is a stable snapshot.
+async def persist(*operation) -> None:
+    if BOOK_LOG is None:
+        return
+    await BOOK_LOG.append_async(*operation, snapshot=BOOKS.all)
+
+
+if BOOK_LOG is not None:
+    records, operations = BOOK_LOG.load()
+    if records is not None:
+        BOOKS = BookIndex(records)
+    for operation in operations:
+        apply_operation(operation)
+    if records is None:
+        BOOK_LOG.compact(BOOKS.all())
 
 
 @app.get("/books")
 async def read_all_books():
-    return BOOKS
+    return BOOKS.all()
 
 
 # Endpoint to retrieve a specific book by its title, provided as a path parameter
 # Use URL encoding for spaces when testing in a browser, e.g. localhost:5001/books/the%20selfish%20gene
 @app.get("/books/{book_title}")
 async def read_book(book_title: str):
-    for book in BOOKS:
-        if book.get("title").casefold() == book_title.casefold():
-            return book
+    return BOOKS.by_title(book_title)
 
 
 # Endpoint to retrieve books by category, specified as a query parameter, e.g. localhost:5001/books/?category=math
 @app.get("/books/")
 async def read_category_by_query(category: str):
-    books_to_return = []
-    for book in BOOKS:
-        if book.get("category").casefold() == category.casefold():
-            books_to_return.append(book)
-    return books_to_return
+    return BOOKS.by_category(category)
 
 
 # Endpoint to retrieve books by author, specified as a query parameter
@@ -81,49 +129,43 @@ async def read_category_by_query(category: str):
 # and bypass the `/books/byauthor/` endpoint, resulting in missing 'category' data.
 @app.get("/books/byauthor/")
 async def read_books_by_author_path(author: str):
-    books_to_return = []
-    for book in BOOKS:
-        if book.get("author").casefold() == author.casefold():
-            books_to_return.append(book)
+    return BOOKS.by_author(author)
+
 
-    return books_to_return
+# Endpoint to autocomplete book titles, e.g. localhost:5001/books/autocomplete/?prefix=the
+# Like `/books/byauthor/`, it must be defined before `/books/{book_author}/`
+@app.get("/books/autocomplete/")
+async def read_books_by_title_prefix(
+    prefix: str = Query(min_length=1), limit: int = Query(default=10, gt=0, le=100)
+):
+    return BOOKS.by_title_prefix(prefix, limit)
 
 
 # Endpoint to retrieve books by both author (path parameter) and category (query parameter)
 @app.get("/books/{book_author}/")
 async def read_author_category_by_query(book_author: str, category: str):
-    books_to_return = []
-    for book in BOOKS:
-        if (
-            book.get("author").casefold() == book_author.casefold()
-            and book.get("category").casefold() == category.casefold()
-        ):
-            books_to_return.append(book)
-
-    return books_to_return
+    return BOOKS.by_author_category(book_author, category)
 
 
 # Endpoint to add a new book to the list using POST
 @app.post("/books/create_book")
 async def create_book(new_book: dict = Body()):
-    BOOKS.append(new_book)
+    BOOKS.add(new_book)
+    await persist("add", new_book)
 
 
 # Endpoint to update an existing book's information using PUT
 @app.put("/books/update_book")
 async def update_book(updated_book: dict = Body()):
-    for i in range(len(BOOKS)):
-        if BOOKS[i].get("title").casefold() == updated_book.get("title").casefold():
-            BOOKS[i] = updated_book
+    if BOOKS.replace(updated_book.get("title"), updated_book):
+        await persist("replace", updated_book.get("title"), updated_book)
 
 
 # Endpoint to delete a book from the list using DELETE
 @app.delete("/books/delete_book/{book_title}")
 async def delete_book(book_title: str):
-    for i in range(len(BOOKS)):
-        if BOOKS[i].get("title").casefold() == book_title.casefold():
-            BOOKS.pop(i)
-            break
+    if BOOKS.remove(book_title) is not None:
+        await persist("remove", book_title)
 
 
 if __name__ == "__main__":
@@ -1,129 +1,270 @@
+import gc
+import os
+import time
+from contextlib import asynccontextmanager
+from email.utils import formatdate
+from typing import Any, Callable, Optional
+
 import uvicorn
-from fastapi import FastAPI, HTTPException, Path, Query
+from fastapi import FastAPI, HTTPException, Path, Query, Request, Response
 from starlette import status
 
-from a1_basics.models import Book, BookRequest
-
-app = FastAPI()
-
-BOOKS = [
-    Book(
-        1,
-        "To Kill a Mockingbird",
-        "Harper Lee",
-        "A classic novel of racism and injustice in the Deep South.",
-        5,
-        1960,
-    ),
-    Book(
-        2,
-        "1984",
-        "George Orwell",
-        "A dystopian novel depicting a totalitarian regime and Big Brother surveillance.",
-        5,
-        1949,
-    ),
-    Book(
-        3,
-        "The Great Gatsby",
-        "F. Scott Fitzgerald",
-        "A tragic love story set in the Jazz Age.",
-        4,
-        1925,
-    ),
-    Book(
-        4,
-        "Moby Dick",
-        "Herman Melville",
-        "A story of obsession and revenge on the high seas.",
-        3,
-        1851,
-    ),
-    Book(
-        5,
-        "Pride and Prejudice",
-        "Jane Austen",
-        "A witty romance exploring class and society in England.",
-        5,
-        1813,
-    ),
-    Book(
-        6,
-        "The Catcher in the Rye",
-        "J.D. Salinger",
-        "A tale of teenage rebellion and self-discovery.",
-        4,
-        1951,
-    ),
-    Book(
-        7,
-        "The Hobbit",
-        "J.R.R. Tolkien",
-        "A fantasy adventure preceding the events of The Lord of the Rings.",
-        5,
-        1937,
-    ),
-    Book(
-        8,
-        "The Road",
-        "Cormac McCarthy",
-        "A bleak post-apocalyptic journey of a father and son.",
-        4,
-        2006,
-    ),
-    Book(
-        9,
-        "Sapiens: A Brief History of Humankind",
-        "Yuval Noah Harari",
-        "A thought-provoking exploration of human history and culture.",
-        5,
-        2011,
-    ),
-    Book(
-        10,
-        "Becoming",
-        "Michelle Obama",
-        "A memoir detailing the life and experiences of the former First Lady.",
-        4,
-        2018,
-    ),
-]
+from a1_basics.catalog import CATALOG_BACKENDS
+from a1_basics.models import Book, BookRequest, BookResponse
+from storage.snapshot_log import from_env
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Finish a running compaction and flush the operations not yet written to disk
+    if BOOK_LOG is not None:
+        await BOOK_LOG.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# `BOOKS` is indexed by id, rating and publish date, see `a1_basics/catalog.py`
+# Set `BOOKS_CATALOG_BACKEND=columnar` to store the catalog in compact columns instead,
+# or `BOOKS_CATALOG_BACKEND=shared` to share one catalog between all uvicorn workers (`a1_basics/shared_catalog.py`)
+BookCatalog = CATALOG_BACKENDS[os.environ.get("BOOKS_CATALOG_BACKEND", "indexed")]
+
+BOOKS = BookCatalog(
+    [
+        Book(
+            1,
+            "To Kill a Mockingbird",
+            "Harper Lee",
+            "A classic novel of racism and injustice in the Deep South.",
+            5,
+            1960,
+        ),
+        Book(
+            2,
+            "1984",
+            "George Orwell",
+            "A dystopian novel depicting a totalitarian regime and Big Brother surveillance.",
+            5,
+            1949,
+        ),
+        Book(
+            3,
+            "The Great Gatsby",
+            "F. Scott Fitzgerald",
+            "A tragic love story set in the Jazz Age.",
+            4,
+            1925,
+        ),
+        Book(
+            4,
+            "Moby Dick",
+            "Herman Melville",
+            "A story of obsession and revenge on the high seas.",
+            3,
+            1851,
+        ),
+        Book(
+            5,
+            "Pride and Prejudice",
+            "Jane Austen",
+            "A witty romance exploring class and society in England.",
+            5,
+            1813,
+        ),
+        Book(
+            6,
+            "The Catcher in the Rye",
+            "J.D. Salinger",
+            "A tale of teenage rebellion and self-discovery.",
+            4,
+            1951,
+        ),
+        Book(
+            7,
+            "The Hobbit",
+            "J.R.R. Tolkien",
+            "A fantasy adventure preceding the events of The Lord of the Rings.",
+            5,
+            1937,
+        ),
+        Book(
+            8,
+            "The Road",
+            "Cormac McCarthy",
+            "A bleak post-apocalyptic journey of a father and son.",
+            4,
+            2006,
+        ),
+        Book(
+            9,
+            "Sapiens: A Brief History of Humankind",
+            "Yuval Noah Harari",
+            "A thought-provoking exploration of human history and culture.",
+            5,
+            2011,
+        ),
+        Book(
+            10,
+            "Becoming",
+            "Michelle Obama",
+            "A memoir detailing the life and experiences of the former First Lady.",
+            4,
+            2018,
+        ),
+    ]
+)
+
+
+# Optional persistence, enabled with `BOOKS_DATA_DIR` (see `storage/snapshot_log.py`),
+# for a single worker process: a second one fails to start instead of corrupting the log.
+# Every write is appended to a log as an operation, with books as plain tuples of their fields:
+# `("add", book)`, `("replace", book)` or `("remove", book_id)`.
+# Snapshots hold the catalog column by column (see `a1_basics/catalog.py`).
+# On startup the catalog is rebuilt from the last snapshot and the operations logged after it.
+# The columnar catalog loads a snapshot as is. `BookCatalog` has to create and index a `Book` object
+# per book, which takes a few seconds per million books.
+# The shared catalog already lives in a file, so it doesn't use the log.
+BOOK_LOG = None if BOOKS.shared else from_env("books")
+
+
+def book_record(book: Book) -> tuple:
+    return (
+        book.book_id,
+        book.title,
+        book.author,
+        book.description,
+        book.rating,
+        book.published_date,
+    )
+
+
+def apply_operation(operation: tuple) -> None:
+    action, value = operation
+    if action == "add":
+        BOOKS.add(Book(*value))
+    elif action == "replace":
+        BOOKS.replace(Book(*value))
+    elif action == "remove":
+        BOOKS.remove(value)
+
+
+# The fsync and the compaction run in worker threads, they don't hold up the other requests
+async def persist(*operation) -> None:
+    if BOOK_LOG is None:
+        return
+    await BOOK_LOG.append_async(
+        *operation, snapshot=BOOKS.snapshot, encode=BOOKS.to_columns
+    )
+
+
+if BOOK_LOG is not None:
+    columns, operations = BOOK_LOG.load()
+    # Loading creates millions of objects and no garbage,
+    # the garbage collector's passes over them would only slow it down
+    gc.disable()
+    try:
+        if columns is not None:
+            BOOKS = BookCatalog.from_columns(columns)
+        for operation in operations:
+            apply_operation(operation)
+    finally:
+        gc.enable()
+    if columns is None:
+        # First start, the books above become the first snapshot
+        BOOK_LOG.compact(BOOKS.to_columns(BOOKS.snapshot()))
+
+
+# Conditional GET support.
+# `BOOKS.version` changes on every write and is sent as the `ETag` header.
+# It's prefixed with `CATALOG_EPOCH`, the start time of this process, because the in-memory catalog
+# (and its version) starts over after a restart and differs between worker processes.
+# The shared catalog has one version for all workers, its epoch is the creation time of its file.
+# A client that sends it back in `If-None-Match` while nothing has changed gets `304 Not Modified`
+# with an empty body, so the catalog isn't read or serialized again.
+CATALOG_EPOCH = format(BOOKS.epoch if BOOKS.shared else time.time_ns(), "x")
+
+
+# The shared catalog waits for its file lock, and copies its whole file when it grows,
+# so it's called in its own worker thread (see `SharedBookCatalog.run`) instead of on the event loop.
+# The in-memory catalogs never wait, they're called directly.
+async def call_catalog(function: Callable, *args) -> Any:
+    if BOOKS.shared:
+        return await BOOKS.run(function, *args)
+    return function(*args)
+
+
+def catalog_state() -> tuple[int, float]:
+    return BOOKS.version, BOOKS.last_modified
+
+
+async def catalog_headers() -> dict:
+    version, last_modified = await call_catalog(catalog_state)
+    return {
+        "ETag": f'"{CATALOG_EPOCH}-{version}"',
+        "Last-Modified": formatdate(last_modified, usegmt=True),
+    }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    # The header may hold several tags, weak tags (`W/"..."`) compare equal to strong ones
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
 
 
 # `status.HTTP_200_OK` indicates that the request was successful
-@app.get("/books", status_code=status.HTTP_200_OK)
-async def read_all_books():
-    return BOOKS
+@app.get("/books", status_code=status.HTTP_200_OK, response_model=list[BookResponse])
+async def read_all_books(request: Request, response: Response):
+    headers = await catalog_headers()
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    return await call_catalog(BOOKS.all)
 
 
 # Endpoint to retrieve a specific book by ID
 # `Path` validates that `book_id` is a positive integer (`gt=0`)
-@app.get("/books/{book_id}", status_code=status.HTTP_200_OK)
-async def read_book(book_id: int = Path(gt=0)):
-    for book in BOOKS:
-        if book.book_id == book_id:
-            return book
+@app.get(
+    "/books/{book_id}", status_code=status.HTTP_200_OK, response_model=BookResponse
+)
+async def read_book(request: Request, response: Response, book_id: int = Path(gt=0)):
+    headers = await catalog_headers()
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+    book = await call_catalog(BOOKS.get, book_id)
+    if book is not None:
+        return book
     raise HTTPException(status_code=404, detail="Item not found")
 
 
 # Endpoint to retrieve books filtered by rating using a query parameter
 # `Query` limits `book_rating` between 1 and 5
-@app.get("/books/", status_code=status.HTTP_200_OK)
+@app.get("/books/", status_code=status.HTTP_200_OK, response_model=list[BookResponse])
 async def read_book_by_rating(book_rating: int = Query(gt=0, lt=6)):
-    books_to_return = []
-    for book in BOOKS:
-        if book.rating == book_rating:
-            books_to_return.append(book)
-    return books_to_return
+    return await call_catalog(BOOKS.by_rating, book_rating)
 
 
-@app.get("/books/publish/", status_code=status.HTTP_200_OK)
+@app.get(
+    "/books/publish/", status_code=status.HTTP_200_OK, response_model=list[BookResponse]
+)
 async def read_books_by_publish_date(published_date: int = Query(gt=1800, lt=2100)):
-    books_to_return = []
-    for book in BOOKS:
-        if book.published_date == published_date:
-            books_to_return.append(book)
-    return books_to_return
+    return await call_catalog(BOOKS.by_published_date, published_date)
+
+
+# Endpoint to retrieve books published between `start` and `end` (both inclusive), ordered by date then id
+@app.get(
+    "/books/publish/range/",
+    status_code=status.HTTP_200_OK,
+    response_model=list[BookResponse],
+)
+async def read_books_by_publish_date_range(
+    start: int = Query(gt=1800, lt=2100), end: int = Query(gt=1800, lt=2100)
+):
+    if start > end:
+        raise HTTPException(status_code=422, detail="`start` must not be after `end`")
+    return await call_catalog(BOOKS.by_published_date_range, start, end)
 
 
 # This endpoint uses a Pydantic model (`BookRequest`) to define and validate the structure of the incoming data.
@@ -133,35 +274,26 @@ async def read_books_by_publish_date(published_date: int = Query(gt=1800, lt=210
 @app.post("/create-book", status_code=status.HTTP_201_CREATED)
 async def create_book(book_request: BookRequest):
     new_book = Book(**book_request.model_dump())
-    BOOKS.append(find_book_id(new_book))
-
-
-def find_book_id(book: Book):
-    book.book_id = 1 if len(BOOKS) == 0 else BOOKS[-1].book_id + 1
-    return book
+    # The catalog assigns the next id while adding the book, in one step,
+    # so concurrent creates (e.g. in different workers sharing a catalog) can't get the same id
+    new_book.book_id = None
+    await call_catalog(BOOKS.add, new_book)
+    await persist("add", book_record(new_book))
 
 
 @app.put("/books/update_book", status_code=status.HTTP_204_NO_CONTENT)
 async def update_book(book: BookRequest):
-    book_changed = False
-    for i in range(len(BOOKS)):
-        if BOOKS[i].book_id == book.book_id:
-            BOOKS[i] = book
-            book_changed = True
-    if not book_changed:
+    updated_book = Book(**book.model_dump())
+    if not await call_catalog(BOOKS.replace, updated_book):
         raise HTTPException(status_code=404, detail="Item not found")
+    await persist("replace", book_record(updated_book))
 
 
 @app.delete("/books/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_book(book_id: int = Path(gt=0)):
-    book_changed = False
-    for i in range(len(BOOKS)):
-        if BOOKS[i].book_id == book_id:
-            BOOKS.pop(i)
-            book_changed = True
-            break
-    if not book_changed:
+    if await call_catalog(BOOKS.remove, book_id) is None:
         raise HTTPException(status_code=404, detail="Item not found")
+    await persist("remove", book_id)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,389 @@
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import compress
+from operator import attrgetter
+from typing import Iterable, Iterator, Optional
+
+from a1_basics.column_masks import int8_mask, int16_mask
+from a1_basics.models import Book
+
+# Snapshots of a catalog (see `storage/snapshot_log.py`) are stored column by column:
+# `(last_id, book_ids, titles, authors, author_refs, descriptions, ratings, published_dates)`,
+# where `book_ids`, `author_refs`, `ratings` and `published_dates` are the bytes of `array` columns
+# ("q", "I", "b" and "h") sorted by id, and `author_refs` index the list of distinct `authors`.
+# `ColumnarBookCatalog` copies its columns to write one and loads one without creating any `Book` object,
+# `BookCatalog` converts from and to its `Book` objects.
+# Taking a snapshot is split in two: `snapshot()` copies what's needed quickly (e.g. on the event loop),
+# `to_columns(copy)` does the slow part and can run in a worker thread while the catalog keeps changing.
+
+
+# Every backend returns the books of a filter in the same order, so switching backends doesn't change the responses:
+# `by_rating` and `by_published_date` by `book_id`, `by_published_date_range` by `(published_date, book_id)`.
+BY_DATE = attrgetter("published_date")
+BY_ID = attrgetter("book_id")
+
+
+# In-memory store for `Book` objects.
+# A plain list forces every lookup to scan all books (O(n)), and `list.pop(i)` shifts
+# every element after `i`. `BookCatalog` keeps a few dictionaries instead:
+# - a primary hash index `book_id -> Book`, so reading, updating and deleting by id is O(1)
+# - secondary "bucket" indexes `rating -> {book_id: Book}` and `published_date -> {book_id: Book}`,
+#   so a filtered read only touches the matching books
+# - a sorted list of the distinct publish dates, so range queries use binary search (`bisect`)
+# Every write goes through `add`, `replace` or `remove`, which keep all indexes in sync.
+class BookCatalog:
+    # Only visible to the process that created it, see `SharedBookCatalog` for the alternative
+    shared = False
+
+    def __init__(self, books: Iterable[Book] = ()):
+        self._by_id: dict[int, Book] = {}
+        self._by_rating: dict[int, dict[int, Book]] = {}
+        self._by_published_date: dict[int, dict[int, Book]] = {}
+        self._published_dates: list[int] = []
+        self._last_id = 0
+        # `version` is bumped by every write, it's used as the `ETag` of the responses
+        self.version = 0
+        self.last_modified = time.time()
+        for book in books:
+            self.add(book)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[Book]:
+        return iter(self._by_id.values())
+
+    def __contains__(self, book_id: int) -> bool:
+        return book_id in self._by_id
+
+    def all(self) -> list[Book]:
+        return list(self._by_id.values())
+
+    def get(self, book_id: int) -> Optional[Book]:
+        return self._by_id.get(book_id)
+
+    # A bucket is in insertion order, which `replace` changes (it adds the book again),
+    # so the books are sorted by id; mostly in order already, that's about a linear pass
+    def by_rating(self, rating: int) -> list[Book]:
+        return sorted(self._by_rating.get(rating, {}).values(), key=BY_ID)
+
+    def by_published_date(self, published_date: int) -> list[Book]:
+        return sorted(
+            self._by_published_date.get(published_date, {}).values(), key=BY_ID
+        )
+
+    def by_published_date_range(self, start: int, end: int) -> list[Book]:
+        # Both ends are inclusive. Only the buckets of the matching years are visited, in date order.
+        low = bisect_left(self._published_dates, start)
+        high = bisect_right(self._published_dates, end)
+        books = []
+        for published_date in self._published_dates[low:high]:
+            books.extend(self.by_published_date(published_date))
+        return books
+
+    @classmethod
+    def from_columns(cls, columns: tuple) -> "BookCatalog":
+        (
+            last_id,
+            book_ids,
+            titles,
+            authors,
+            author_refs,
+            descriptions,
+            ratings,
+            dates,
+        ) = columns
+        catalog = cls(
+            map(
+                Book,
+                array("q", book_ids),
+                titles,
+                map(authors.__getitem__, array("I", author_refs)),
+                descriptions,
+                array("b", ratings),
+                array("h", dates),
+            )
+        )
+        catalog._last_id = max(catalog._last_id, last_id)
+        return catalog
+
+    def snapshot(self) -> tuple[int, list[Book]]:
+        # A `Book` is never changed once in the catalog (`replace` stores a new object),
+        # so a list of the current objects is enough
+        return self._last_id, list(self._by_id.values())
+
+    @staticmethod
+    def to_columns(snapshot: tuple[int, list[Book]]) -> tuple:
+        last_id, books = snapshot
+        books = sorted(books, key=BY_ID)
+        authors: dict[str, int] = {}
+        author_refs = array(
+            "I", [authors.setdefault(book.author, len(authors)) for book in books]
+        )
+        return (
+            last_id,
+            array("q", [book.book_id for book in books]).tobytes(),
+            [book.title for book in books],
+            list(authors),
+            author_refs.tobytes(),
+            [book.description for book in books],
+            array("b", [book.rating for book in books]).tobytes(),
+            array("h", [book.published_date for book in books]).tobytes(),
+        )
+
+    def _touch(self) -> None:
+        self.version += 1
+        self.last_modified = time.time()
+
+    def next_id(self) -> int:
+        # Ids are never reused, even after the book with the highest id is deleted.
+        return self._last_id + 1
+
+    def add(self, book: Book) -> Book:
+        if book.book_id is None:
+            book.book_id = self.next_id()
+        if book.book_id in self._by_id:
+            raise KeyError(f"Book with id {book.book_id} already exists")
+        self._by_id[book.book_id] = book
+        self._last_id = max(self._last_id, book.book_id)
+        self._index(book)
+        self._touch()
+        return book
+
+    def replace(self, book: Book) -> bool:
+        old_book = self._by_id.get(book.book_id)
+        if old_book is None:
+            return False
+        self._unindex(old_book)
+        # Assigning to an existing key keeps the book's position in `all()`
+        self._by_id[book.book_id] = book
+        self._index(book)
+        self._touch()
+        return True
+
+    def remove(self, book_id: int) -> Optional[Book]:
+        book = self._by_id.pop(book_id, None)
+        if book is not None:
+            self._unindex(book)
+            self._touch()
+        return book
+
+    def _index(self, book: Book) -> None:
+        self._by_rating.setdefault(book.rating, {})[book.book_id] = book
+        bucket = self._by_published_date.get(book.published_date)
+        if bucket is None:
+            bucket = self._by_published_date[book.published_date] = {}
+            insort(self._published_dates, book.published_date)
+        bucket[book.book_id] = book
+
+    def _unindex(self, book: Book) -> None:
+        rating_bucket = self._by_rating[book.rating]
+        del rating_bucket[book.book_id]
+        if not rating_bucket:
+            del self._by_rating[book.rating]
+
+        date_bucket = self._by_published_date[book.published_date]
+        del date_bucket[book.book_id]
+        if not date_bucket:
+            del self._by_published_date[book.published_date]
+            index = bisect_left(self._published_dates, book.published_date)
+            del self._published_dates[index]
+
+
+# Column-oriented alternative to `BookCatalog` with the same interface.
+# Instead of one object per book, every field lives in its own column:
+# - `book_id`, `rating` and `published_date` are packed into `array` columns (8, 1 and 2 bytes per book)
+# - authors are interned: each distinct author string is stored once and the column keeps its index
+# - titles and descriptions stay in plain lists, since strings can't be packed any further
+# `Book` objects are only created for the rows a request actually returns.
+# Ids are assigned in increasing order, so the `book_id` column is sorted and lookups use `bisect`.
+# Filters build a mask of the matching rows from the packed bytes of a column (see `column_masks.py`)
+# and pick the rows with `itertools.compress`, in C instead of a Python loop over books.
+# Creating the `Book` objects of the matching rows then costs more than the scan itself,
+# so a filter returning many books stays slower than with `BookCatalog`, which keeps the objects around.
+class ColumnarBookCatalog:
+    shared = False
+
+    def __init__(self, books: Iterable[Book] = ()):
+        self._book_ids = array("q")
+        self._ratings = array("b")
+        self._published_dates = array("h")
+        self._author_refs = array("I")
+        self._titles: list[str] = []
+        self._descriptions: list[str] = []
+        self._authors: list[str] = []
+        self._author_index: dict[str, int] = {}
+        self._last_id = 0
+        # `version` is bumped by every write, it's used as the `ETag` of the responses
+        self.version = 0
+        self.last_modified = time.time()
+        for book in books:
+            self.add(book)
+
+    def __len__(self) -> int:
+        return len(self._book_ids)
+
+    def __iter__(self) -> Iterator[Book]:
+        return map(self._row, range(len(self._book_ids)))
+
+    def __contains__(self, book_id: int) -> bool:
+        return self._find(book_id) is not None
+
+    def all(self) -> list[Book]:
+        return list(self)
+
+    def get(self, book_id: int) -> Optional[Book]:
+        row = self._find(book_id)
+        return None if row is None else self._row(row)
+
+    def by_rating(self, rating: int) -> list[Book]:
+        return self._rows(int8_mask(self._ratings.tobytes(), rating, rating))
+
+    def by_published_date(self, published_date: int) -> list[Book]:
+        return self.by_published_date_range(published_date, published_date)
+
+    def by_published_date_range(self, start: int, end: int) -> list[Book]:
+        # Both ends are inclusive. The rows are in id order, a stable sort by date keeps it among equal dates.
+        books = self._rows(int16_mask(self._published_dates.tobytes(), start, end))
+        books.sort(key=BY_DATE)
+        return books
+
+    @classmethod
+    def from_columns(cls, columns: tuple) -> "ColumnarBookCatalog":
+        catalog = cls()
+        (
+            last_id,
+            book_ids,
+            titles,
+            authors,
+            author_refs,
+            descriptions,
+            ratings,
+            dates,
+        ) = columns
+        catalog._book_ids.frombytes(book_ids)
+        catalog._titles = titles
+        catalog._authors = authors
+        catalog._author_index = {author: ref for ref, author in enumerate(authors)}
+        catalog._author_refs.frombytes(author_refs)
+        catalog._descriptions = descriptions
+        catalog._ratings.frombytes(ratings)
+        catalog._published_dates.frombytes(dates)
+        catalog._last_id = last_id
+        return catalog
+
+    def snapshot(self) -> tuple:
+        # Copying the columns is a few `memcpy`s, it's already the snapshot
+        return (
+            self._last_id,
+            self._book_ids.tobytes(),
+            list(self._titles),
+            list(self._authors),
+            self._author_refs.tobytes(),
+            list(self._descriptions),
+            self._ratings.tobytes(),
+            self._published_dates.tobytes(),
+        )
+
+    @staticmethod
+    def to_columns(snapshot: tuple) -> tuple:
+        return snapshot
+
+    def _touch(self) -> None:
+        self.version += 1
+        self.last_modified = time.time()
+
+    def next_id(self) -> int:
+        return self._last_id + 1
+
+    def add(self, book: Book) -> Book:
+        if book.book_id is None:
+            book.book_id = self.next_id()
+        if book.book_id <= self._last_id:
+            raise KeyError(
+                f"Book id {book.book_id} must be greater than the last id {self._last_id}"
+            )
+        self._book_ids.append(book.book_id)
+        self._titles.append(book.title)
+        self._author_refs.append(self._intern_author(book.author))
+        self._descriptions.append(book.description)
+        self._ratings.append(book.rating)
+        self._published_dates.append(book.published_date)
+        self._last_id = book.book_id
+        self._touch()
+        return book
+
+    def replace(self, book: Book) -> bool:
+        row = self._find(book.book_id)
+        if row is None:
+            return False
+        self._titles[row] = book.title
+        self._author_refs[row] = self._intern_author(book.author)
+        self._descriptions[row] = book.description
+        self._ratings[row] = book.rating
+        self._published_dates[row] = book.published_date
+        self._touch()
+        return True
+
+    def remove(self, book_id: int) -> Optional[Book]:
+        row = self._find(book_id)
+        if row is None:
+            return None
+        book = self._row(row)
+        for column in self._columns():
+            del column[row]
+        self._touch()
+        return book
+
+    def _columns(self) -> tuple:
+        return (
+            self._book_ids,
+            self._titles,
+            self._author_refs,
+            self._descriptions,
+            self._ratings,
+            self._published_dates,
+        )
+
+    def _find(self, book_id: Optional[int]) -> Optional[int]:
+        if book_id is None:
+            return None
+        row = bisect_left(self._book_ids, book_id)
+        if row < len(self._book_ids) and self._book_ids[row] == book_id:
+            return row
+        return None
+
+    def _intern_author(self, author: str) -> int:
+        ref = self._author_index.get(author)
+        if ref is None:
+            ref = self._author_index[author] = len(self._authors)
+            self._authors.append(author)
+        return ref
+
+    def _row(self, row: int) -> Book:
+        return Book(
+            self._book_ids[row],
+            self._titles[row],
+            self._authors[self._author_refs[row]],
+            self._descriptions[row],
+            self._ratings[row],
+            self._published_dates[row],
+        )
+
+    def _rows(self, mask: bytes) -> list[Book]:
+        return list(map(self._row, compress(range(len(self._book_ids)), mask)))
+
+
+# Available storage backends, selected in `books.py` by the `BOOKS_CATALOG_BACKEND` environment variable
+CATALOG_BACKENDS = {
+    "indexed": BookCatalog,
+    "columnar": ColumnarBookCatalog,
+}
+
+try:
+    from a1_basics.shared_catalog import SharedBookCatalog
+except ImportError:  # `fcntl` (file locks) is only available on Unix
+    pass
+else:
+    CATALOG_BACKENDS["shared"] = SharedBookCatalog
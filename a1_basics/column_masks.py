@@ -0,0 +1,68 @@
+import sys
+
+# Row masks for the packed integer columns of `ColumnarBookCatalog` and `SharedBookCatalog`.
+# A mask is a `bytes` object holding 1 for every matching row and 0 for the others, ready for `itertools.compress`.
+# It's built without a Python-level loop over the rows: `bytes.translate` maps every byte of the column
+# through a 256-entry table of 0/1 values, and masks are combined with `&` / `|` on one big integer each.
+# All of it runs in C, no Python int is created per row.
+
+
+def _table(start: int, end: int) -> bytes:
+    # `^ 0x80` reads a byte as the high (or only) byte of a signed number shifted to unsigned,
+    # so that comparing unsigned bytes gives the same order as comparing the signed values
+    return bytes(start <= byte ^ 0x80 <= end for byte in range(256))
+
+
+def _low_table(start: int, end: int) -> bytes:
+    return bytes(start <= byte <= end for byte in range(256))
+
+
+def intersect(mask: bytes, other: bytes) -> bytes:
+    value = int.from_bytes(mask, "little") & int.from_bytes(other, "little")
+    return value.to_bytes(len(mask), "little")
+
+
+def union(mask: bytes, other: bytes) -> bytes:
+    value = int.from_bytes(mask, "little") | int.from_bytes(other, "little")
+    return value.to_bytes(len(mask), "little")
+
+
+def int8_mask(column: bytes, start: int, end: int) -> bytes:
+    """Mask of the rows of a signed 1-byte column (array type "b") with `start <= value <= end`."""
+    return column.translate(_table(start + 128, end + 128))
+
+
+def int16_mask(column: bytes, start: int, end: int) -> bytes:
+    """Mask of the rows of a signed 2-byte column (array type "h") with `start <= value <= end`.
+
+    Every value is split into its high and low byte: values in range have a high byte strictly between
+    those of `start` and `end`, or equal to one of them with a low byte on the right side of its low byte.
+    """
+    start = max(start, -32768) + 32768
+    end = min(end, 32767) + 32768
+    if start > end:
+        return bytes(len(column) // 2)
+    if sys.byteorder == "little":
+        low, high = column[0::2], column[1::2]
+    else:
+        high, low = column[0::2], column[1::2]
+    start_high, start_low = divmod(start, 256)
+    end_high, end_low = divmod(end, 256)
+    if start_high == end_high:
+        return intersect(
+            high.translate(_table(start_high, start_high)),
+            low.translate(_low_table(start_low, end_low)),
+        )
+    mask = union(
+        intersect(
+            high.translate(_table(start_high, start_high)),
+            low.translate(_low_table(start_low, 255)),
+        ),
+        intersect(
+            high.translate(_table(end_high, end_high)),
+            low.translate(_low_table(0, end_low)),
+        ),
+    )
+    if end_high - start_high > 1:
+        mask = union(mask, high.translate(_table(start_high + 1, end_high - 1)))
+    return mask
@@ -0,0 +1,396 @@
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from itertools import compress
+from operator import attrgetter
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from a1_basics.column_masks import int8_mask, int16_mask, intersect
+from a1_basics.models import Book
+
+# File layout, every section starts at a multiple of 8 bytes:
+# - header (see `Header`)
+# - `book_id` column, 8 bytes per row, sorted since ids only grow
+# - string references, 6 x 4 bytes per row: (offset, length) of the UTF-8 title, author and description
+# - `published_date` column, 2 bytes per row
+# - `rating` column, 1 byte per row
+# - string heap, new strings are appended at `heap_end`
+# A removed book keeps its row with `rating` and `published_date` set to 0 (a "tombstone").
+# Ratings are always 1-5 (see `BookRequest`), so the non-zero ratings double as the "row is alive" mask,
+# which the filters apply so that they never return a tombstone.
+MAGIC = b"BOOKSHM1"
+HEADER = struct.Struct("<8sQqqdqQQQQ")
+Header = namedtuple(
+    "Header",
+    "magic superseded epoch version last_modified last_id rows live capacity heap_end",
+)
+REFS = struct.Struct("<6I")
+# `bytes.translate` table turning the `rating` column into a mask of the rows that aren't tombstones
+ALIVE = bytes([0]) + bytes([1]) * 255
+MIN_CAPACITY = 1024
+MIN_HEAP_SIZE = 1 << 20
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _layout(capacity: int) -> tuple[int, int, int, int, int]:
+    ids = HEADER.size
+    refs = ids + 8 * capacity
+    dates = refs + REFS.size * capacity
+    ratings = dates + 2 * capacity
+    heap = _align(ratings + capacity)
+    return ids, refs, dates, ratings, heap
+
+
+def _encode(book: Book) -> tuple[bytes, bytes, bytes]:
+    return (
+        book.title.encode("utf-8"),
+        book.author.encode("utf-8"),
+        book.description.encode("utf-8"),
+    )
+
+
+# One memory-mapped catalog file, the columns are `memoryview`s cast to the column's type,
+# so reading `self.ids[row]` reads the mapped memory directly without copying anything.
+# It's not safe to use on its own, `SharedBookCatalog` does the locking.
+class _Mapping:
+    def __init__(self, path: str):
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.view = memoryview(self.map)
+        capacity = self.header().capacity
+        ids, self.refs, dates, ratings, _ = _layout(capacity)
+        self.ids = self.view[ids : self.refs].cast("q")
+        self.dates = self.view[dates:ratings].cast("h")
+        self.ratings = self.view[ratings : ratings + capacity].cast("b")
+
+    @staticmethod
+    def create(
+        path: str,
+        capacity: int,
+        heap_size: int,
+        epoch: int,
+        version: int,
+        last_modified: float,
+        last_id: int,
+    ) -> None:
+        heap = _layout(capacity)[-1]
+        with open(path, "wb") as file:
+            file.truncate(heap + heap_size)
+            file.write(
+                HEADER.pack(
+                    MAGIC,
+                    0,
+                    epoch,
+                    version,
+                    last_modified,
+                    last_id,
+                    0,
+                    0,
+                    capacity,
+                    heap,
+                )
+            )
+
+    def header(self) -> Header:
+        header = Header._make(HEADER.unpack_from(self.map))
+        if header.magic != MAGIC:
+            raise ValueError(f"{self.file.name} is not a shared book catalog")
+        return header
+
+    def write_header(self, header: Header) -> None:
+        HEADER.pack_into(self.map, 0, *header)
+
+    def has_room(self, header: Header, size: int) -> bool:
+        return header.rows < header.capacity and header.heap_end + size <= len(self.map)
+
+    def find(self, book_id: Optional[int], rows: int) -> Optional[int]:
+        if book_id is None:
+            return None
+        row = bisect_left(self.ids, book_id, 0, rows)
+        if row < rows and self.ids[row] == book_id and self.ratings[row]:
+            return row
+        return None
+
+    def book(self, row: int) -> Book:
+        (
+            title,
+            title_length,
+            author,
+            author_length,
+            description,
+            description_length,
+        ) = REFS.unpack_from(self.map, self.refs + row * REFS.size)
+        return Book(
+            self.ids[row],
+            str(self.map[title : title + title_length], "utf-8"),
+            str(self.map[author : author + author_length], "utf-8"),
+            str(self.map[description : description + description_length], "utf-8"),
+            self.ratings[row],
+            self.dates[row],
+        )
+
+    def books(self, rows: int, mask: Iterable) -> list[Book]:
+        return list(map(self.book, compress(range(rows), mask)))
+
+    def write_row(self, header: Header, row: int, book: Book, encoded: tuple) -> Header:
+        heap_end = header.heap_end
+        refs = []
+        for value in encoded:
+            self.map[heap_end : heap_end + len(value)] = value
+            refs += (heap_end, len(value))
+            heap_end += len(value)
+        REFS.pack_into(self.map, self.refs + row * REFS.size, *refs)
+        self.ids[row] = book.book_id
+        self.dates[row] = book.published_date
+        self.ratings[row] = book.rating
+        return header._replace(heap_end=heap_end)
+
+    def close(self) -> None:
+        # The views must be released before the map can be closed
+        for view in (self.ids, self.dates, self.ratings, self.view):
+            view.release()
+        self.map.close()
+        self.file.close()
+
+
+# Catalog shared by all worker processes on one host, with the same interface as `BookCatalog`.
+# The books live in one memory-mapped file (`BOOKS_SHARED_PATH`, `books.shared` by default):
+# every worker maps the same file, the operating system keeps a single copy of its pages in memory,
+# so memory doesn't grow with the number of workers, and a write by one worker is seen by all the others.
+# `Book` objects are only created for the rows a request returns, like in `ColumnarBookCatalog`.
+#
+# Access is serialized with an `flock` on a separate lock file: reads take a shared lock, writes an exclusive one.
+# Ids are assigned by `add` while holding the exclusive lock, so concurrent creates in different workers
+# can't get the same id.
+# When the columns or the string heap are full, a writer copies the live books into a bigger file
+# and atomically renames it over the old one, then marks the old file as superseded,
+# so the other workers map the new file on their next access.
+# Waiting for the lock blocks, and a writer that grows the file copies the whole catalog while holding it,
+# so an async app calls the catalog through `run`: the calls go to a single worker thread of the catalog
+# and the event loop keeps serving other requests meanwhile.
+# Within a process the catalog must only be used from one thread at a time: the `flock` belongs to the open
+# lock file, which all threads of the process share, so it doesn't keep them apart.
+#
+# The data is written to the file directly, so it survives restarts of the workers;
+# the first worker creates the file from the `books` passed in, later ones ignore them.
+class SharedBookCatalog:
+    shared = True
+
+    def __init__(self, books: Iterable[Book] = (), path: Optional[str] = None):
+        self.path = path or os.environ.get("BOOKS_SHARED_PATH", "books.shared")
+        self._lock_file = open(self.path + ".lock", "a+b")
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="shared-catalog")
+        self._mapping: Optional[_Mapping] = None
+        with self._locked(fcntl.LOCK_EX):
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                self._mapping = _Mapping(self.path)
+            else:
+                self._rewrite(list(books), time.time_ns(), 0, time.time(), 0)
+
+    def __len__(self) -> int:
+        with self._locked(fcntl.LOCK_SH) as mapping:
+            return mapping.header().live
+
+    def __iter__(self) -> Iterator[Book]:
+        return iter(self.all())
+
+    def __contains__(self, book_id: int) -> bool:
+        with self._locked(fcntl.LOCK_SH) as mapping:
+            return mapping.find(book_id, mapping.header().rows) is not None
+
+    @property
+    def epoch(self) -> int:
+        # Creation time of the file, shared by all workers, used in the `ETag` like `version`
+        with self._locked(fcntl.LOCK_SH) as mapping:
+            return mapping.header().epoch
+
+    @property
+    def version(self) -> int:
+        with self._locked(fcntl.LOCK_SH) as mapping:
+            return mapping.header().version
+
+    @property
+    def last_modified(self) -> float:
+        with self._locked(fcntl.LOCK_SH) as mapping:
+            return mapping.header().last_modified
+
+    def all(self) -> list[Book]:
+        with self._locked(fcntl.LOCK_SH) as mapping:
+            rows = mapping.header().rows
+            return mapping.books(rows, mapping.ratings[:rows])
+
+    def get(self, book_id: int) -> Optional[Book]:
+        with self._locked(fcntl.LOCK_SH) as mapping:
+            row = mapping.find(book_id, mapping.header().rows)
+            return None if row is None else mapping.book(row)
+
+    # Filters build their row mask from the mapped column bytes (see `column_masks.py`),
+    # `rating` 0 is never matched since it marks a tombstone
+    def by_rating(self, rating: int) -> list[Book]:
+        if rating == 0:
+            return []
+        with self._locked(fcntl.LOCK_SH) as mapping:
+            rows = mapping.header().rows
+            mask = int8_mask(mapping.ratings[:rows].tobytes(), rating, rating)
+            return mapping.books(rows, mask)
+
+    def by_published_date(self, published_date: int) -> list[Book]:
+        return self.by_published_date_range(published_date, published_date)
+
+    def by_published_date_range(self, start: int, end: int) -> list[Book]:
+        with self._locked(fcntl.LOCK_SH) as mapping:
+            rows = mapping.header().rows
+            mask = intersect(
+                int16_mask(mapping.dates[:rows].tobytes(), start, end),
+                mapping.ratings[:rows].tobytes().translate(ALIVE),
+            )
+            books = mapping.books(rows, mask)
+        # Same order as the other backends (see `catalog.py`)
+        books.sort(key=attrgetter("published_date"))
+        return books
+
+    def next_id(self) -> int:
+        # Only a hint, another worker may take this id first; `add` assigns ids atomically
+        with self._locked(fcntl.LOCK_SH) as mapping:
+            return mapping.header().last_id + 1
+
+    def add(self, book: Book) -> Book:
+        with self._locked(fcntl.LOCK_EX):
+            self._add(book)
+        return book
+
+    def replace(self, book: Book) -> bool:
+        encoded = _encode(book)
+        with self._locked(fcntl.LOCK_EX) as mapping:
+            header = mapping.header()
+            row = mapping.find(book.book_id, header.rows)
+            if row is None:
+                return False
+            # The new strings are appended to the heap, the old ones are dropped on the next rewrite
+            if header.heap_end + sum(map(len, encoded)) > len(mapping.map):
+                mapping = self._rewrite_bigger(sum(map(len, encoded)))
+                header = mapping.header()
+                row = mapping.find(book.book_id, header.rows)
+            header = mapping.write_row(header, row, book, encoded)
+            mapping.write_header(self._touched(header))
+        return True
+
+    def remove(self, book_id: int) -> Optional[Book]:
+        with self._locked(fcntl.LOCK_EX) as mapping:
+            header = mapping.header()
+            row = mapping.find(book_id, header.rows)
+            if row is None:
+                return None
+            book = mapping.book(row)
+            mapping.ratings[row] = 0
+            mapping.dates[row] = 0
+            mapping.write_header(self._touched(header._replace(live=header.live - 1)))
+        return book
+
+    async def run(self, function: Callable, *args) -> Any:
+        """Call `function(*args)` (e.g. `catalog.get`, 1) in the catalog's worker thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(function, *args))
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+        self._lock_file.close()
+
+    @contextmanager
+    def _locked(self, operation: int) -> Iterator[_Mapping]:
+        fcntl.flock(self._lock_file, operation)
+        try:
+            if self._mapping is not None and self._mapping.header().superseded:
+                self._mapping.close()
+                self._mapping = _Mapping(self.path)
+            yield self._mapping
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _touched(header: Header) -> Header:
+        return header._replace(version=header.version + 1, last_modified=time.time())
+
+    def _add(self, book: Book) -> None:
+        # Must be called with the exclusive lock held
+        mapping = self._mapping
+        header = mapping.header()
+        if book.book_id is None:
+            book.book_id = header.last_id + 1
+        if book.book_id <= header.last_id:
+            raise KeyError(
+                f"Book id {book.book_id} must be greater than the last id {header.last_id}"
+            )
+        encoded = _encode(book)
+        if not mapping.has_room(header, sum(map(len, encoded))):
+            mapping = self._rewrite_bigger(sum(map(len, encoded)))
+            header = mapping.header()
+        header = mapping.write_row(header, header.rows, book, encoded)
+        header = header._replace(
+            last_id=book.book_id, rows=header.rows + 1, live=header.live + 1
+        )
+        mapping.write_header(self._touched(header))
+
+    def _rewrite_bigger(self, size: int) -> _Mapping:
+        header = self._mapping.header()
+        books = self._mapping.books(header.rows, self._mapping.ratings[: header.rows])
+        return self._rewrite(
+            books,
+            header.epoch,
+            header.version,
+            header.last_modified,
+            header.last_id,
+            extra_size=size,
+        )
+
+    def _rewrite(
+        self,
+        books: list[Book],
+        epoch: int,
+        version: int,
+        last_modified: float,
+        last_id: int,
+        extra_size: int = 0,
+    ) -> _Mapping:
+        # Write the books into a new file with room for twice as many, then swap it in.
+        # `os.replace` is atomic, other workers see either the complete old file or the complete new one.
+        encoded = [_encode(book) for book in books]
+        text_size = sum(len(value) for values in encoded for value in values)
+        temporary_path = self.path + ".tmp"
+        _Mapping.create(
+            temporary_path,
+            capacity=max(MIN_CAPACITY, 2 * (len(books) + 1)),
+            heap_size=max(MIN_HEAP_SIZE, 2 * (text_size + extra_size)),
+            epoch=epoch,
+            version=version,
+            last_modified=last_modified,
+            last_id=last_id,
+        )
+        mapping = _Mapping(temporary_path)
+        header = mapping.header()
+        for row, (book, values) in enumerate(zip(books, encoded)):
+            header = mapping.write_row(header, row, book, values)
+            last_id = max(last_id, book.book_id)
+        rows = len(books)
+        mapping.write_header(header._replace(last_id=last_id, rows=rows, live=rows))
+        os.replace(temporary_path, self.path)
+
+        if self._mapping is not None:
+            self._mapping.write_header(self._mapping.header()._replace(superseded=1))
+            self._mapping.close()
+        self._mapping = mapping
+        return mapping
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The modules import each other as `a1_basics.<module>`, like when the app is started from the repository
+REPOSITORY_DIR = Path(__file__).resolve().parent.parent.parent
+if str(REPOSITORY_DIR) not in sys.path:
+    sys.path.insert(0, str(REPOSITORY_DIR))
@@ -0,0 +1,46 @@
+import pytest
+
+from a1_basics.catalog import CATALOG_BACKENDS
+from a1_basics.models import Book
+
+BOOKS = [
+    (1, 5, 2012),
+    (2, 4, 2008),
+    (3, 3, 2001),
+    (4, 5, 2020),
+    (5, 1, 1999),
+    (6, 4, 2008),
+    (7, 5, 2005),
+]
+
+
+@pytest.fixture(params=sorted(CATALOG_BACKENDS))
+def catalog(request, tmp_path):
+    books = [
+        Book(book_id, f"Title {book_id}", "Author", "Description", rating, date)
+        for book_id, rating, date in BOOKS
+    ]
+    if request.param == "shared":
+        catalog = CATALOG_BACKENDS["shared"](books, path=str(tmp_path / "books.shared"))
+    else:
+        catalog = CATALOG_BACKENDS[request.param](books)
+    yield catalog
+    if hasattr(catalog, "close"):
+        catalog.close()
+
+
+def ids(books: list[Book]) -> list[int]:
+    return [book.book_id for book in books]
+
+
+# All backends return filtered books in the same order (see `catalog.py`)
+def test_date_range_is_ordered_by_date_then_id(catalog):
+    assert ids(catalog.by_published_date_range(2005, 2012)) == [7, 2, 6, 1]
+
+
+# A replaced book keeps its place in the order
+def test_filters_are_ordered_by_id_after_replace(catalog):
+    catalog.replace(Book(2, "New title", "Author", "Description", 4, 2008))
+    assert ids(catalog.by_published_date(2008)) == [2, 6]
+    assert ids(catalog.by_rating(4)) == [2, 6]
+    assert ids(catalog.by_published_date_range(2008, 2008)) == [2, 6]
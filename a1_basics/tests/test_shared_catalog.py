@@ -0,0 +1,106 @@
+import asyncio
+import fcntl
+import multiprocessing
+
+from a1_basics.models import Book
+from a1_basics.shared_catalog import MIN_CAPACITY, SharedBookCatalog
+
+WRITERS = 4
+# Together the writers add more books than the file has room for, so it's rewritten while the others use it
+BOOKS_PER_WRITER = MIN_CAPACITY // 2
+
+
+def add_books(path: str, writer: int, start) -> list[int]:
+    catalog = SharedBookCatalog(path=path)
+    start.wait()
+    ids = []
+    for i in range(BOOKS_PER_WRITER):
+        book = Book(None, f"Book {writer}-{i}", "An author", "A description", 5, 2000)
+        ids.append(catalog.add(book).book_id)
+    catalog.close()
+    return ids
+
+
+def read_books(path: str, start, done) -> int:
+    # Every read sees a consistent catalog: ids in order, no tombstones, every book complete
+    catalog = SharedBookCatalog(path=path)
+    start.wait()
+    reads = 0
+    while not done.is_set():
+        books = catalog.all()
+        ids = [book.book_id for book in books]
+        assert ids == sorted(set(ids))
+        assert all(
+            book.title.startswith("Book ") and book.rating == 5 for book in books
+        )
+        reads += 1
+    catalog.close()
+    return reads
+
+
+# Processes adding books at the same time never get the same id,
+# and a reader keeps working while the file is rewritten under it
+def test_concurrent_adds_from_processes(tmp_path):
+    path = str(tmp_path / "books.shared")
+    SharedBookCatalog(path=path).close()
+
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        # Everyone opens the catalog first, then starts at the same time
+        start = manager.Barrier(WRITERS + 2)
+        done = manager.Event()
+        with context.Pool(WRITERS + 1) as pool:
+            reader = pool.apply_async(read_books, (path, start, done))
+            writers = [
+                pool.apply_async(add_books, (path, writer, start))
+                for writer in range(WRITERS)
+            ]
+            start.wait()
+            added = [writer.get(timeout=60) for writer in writers]
+            done.set()
+            assert reader.get(timeout=60) > 0
+
+    ids = [book_id for writer_ids in added for book_id in writer_ids]
+    assert len(ids) == len(set(ids)) == WRITERS * BOOKS_PER_WRITER
+    # Each process got its ids in increasing order
+    assert all(writer_ids == sorted(writer_ids) for writer_ids in added)
+
+    # The file was rewritten into a bigger one and opens again with every book in it
+    catalog = SharedBookCatalog(path=path)
+    try:
+        assert catalog._mapping.header().capacity > MIN_CAPACITY
+        assert len(catalog) == WRITERS * BOOKS_PER_WRITER
+        assert [book.book_id for book in catalog.all()] == sorted(ids)
+        assert catalog.next_id() == max(ids) + 1
+        titles = {book.title for book in catalog}
+        assert titles == {
+            f"Book {writer}-{i}"
+            for writer in range(WRITERS)
+            for i in range(BOOKS_PER_WRITER)
+        }
+    finally:
+        catalog.close()
+
+
+# While another process holds the lock, `run` waits for it in the catalog's thread, not on the event loop
+def test_run_waits_for_the_lock_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "books.shared")
+    catalog = SharedBookCatalog(
+        [Book(1, "A title", "An author", "A description", 5, 2000)], path=path
+    )
+
+    async def scenario():
+        # A lock taken through another open file conflicts like one taken by another process
+        with open(path + ".lock", "a+b") as other_process:
+            fcntl.flock(other_process, fcntl.LOCK_EX)
+            reading = asyncio.create_task(catalog.run(catalog.get, 1))
+            await asyncio.sleep(0.05)
+            assert not reading.done()
+            fcntl.flock(other_process, fcntl.LOCK_UN)
+            book = await reading
+        assert book.title == "A title"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        catalog.close()
@@ -0,0 +1,228 @@
+import asyncio
+import os
+from collections import deque
+from typing import Optional
+
+import database
+from starlette.routing import BaseRoute, Match
+from write_queue import GROUP_COMMIT_ENABLED, GROUP_COMMIT_MAX_BATCH
+
+# Admission control settings, overridable with environment variables.
+# - `TODOS_ADMISSION=0` turns admission control off
+# - `TODOS_ADMISSION_READ_LIMIT` / `TODOS_ADMISSION_WRITE_LIMIT` are how many reads (GET, HEAD) / writes
+#   are handled at the same time. Reads default to the number of connections they can get from their pool.
+#   Writes default to the size of the write pool; with group commit, writes wait in `todo_writer`
+#   instead of holding a connection, so they default to a full batch.
+# - `TODOS_ADMISSION_READ_QUEUE` / `TODOS_ADMISSION_WRITE_QUEUE` are how many requests may wait for a slot
+# - `TODOS_ADMISSION_QUEUE_TIMEOUT` is how long (in ms) a request may wait before it's rejected
+# - `TODOS_ADMISSION_EXEMPT` lists path prefixes that are never limited: long-lived streams
+#   (which would hold a slot for as long as the client stays connected) and the metrics
+# - `TODOS_ADMISSION_TRANSFER` lists path prefixes of bulk transfers (streaming import and export).
+#   They do use the database, so they aren't exempt, but one of them can run for minutes;
+#   in the read or write class a few of them would take the slots of short requests, which would then get 503s.
+#   They have a class of their own instead, with `TODOS_ADMISSION_TRANSFER_LIMIT` running at the same time
+#   and `TODOS_ADMISSION_TRANSFER_QUEUE` waiting.
+ADMISSION_ENABLED = os.environ.get("TODOS_ADMISSION", "1") == "1"
+ADMISSION_READ_LIMIT = int(
+    os.environ.get(
+        "TODOS_ADMISSION_READ_LIMIT",
+        (database.DB_READ_POOL_SIZE if database.DB_READ_POOL else database.DB_POOL_SIZE)
+        + database.DB_MAX_OVERFLOW,
+    )
+)
+ADMISSION_WRITE_LIMIT = int(
+    os.environ.get(
+        "TODOS_ADMISSION_WRITE_LIMIT",
+        GROUP_COMMIT_MAX_BATCH if GROUP_COMMIT_ENABLED else database.DB_POOL_SIZE,
+    )
+)
+ADMISSION_READ_QUEUE = int(os.environ.get("TODOS_ADMISSION_READ_QUEUE", 64))
+ADMISSION_WRITE_QUEUE = int(os.environ.get("TODOS_ADMISSION_WRITE_QUEUE", 64))
+ADMISSION_QUEUE_TIMEOUT = (
+    float(os.environ.get("TODOS_ADMISSION_QUEUE_TIMEOUT", 1000)) / 1000
+)
+ADMISSION_EXEMPT = tuple(
+    filter(
+        None,
+        os.environ.get("TODOS_ADMISSION_EXEMPT", "/metrics,/todos/changes").split(","),
+    )
+)
+
+ADMISSION_TRANSFER = tuple(
+    filter(
+        None,
+        os.environ.get("TODOS_ADMISSION_TRANSFER", "/todos/import,/todos/export").split(
+            ","
+        ),
+    )
+)
+ADMISSION_TRANSFER_LIMIT = int(os.environ.get("TODOS_ADMISSION_TRANSFER_LIMIT", 2))
+ADMISSION_TRANSFER_QUEUE = int(os.environ.get("TODOS_ADMISSION_TRANSFER_QUEUE", 4))
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+# A concurrency limit with a bounded waiting line.
+# Up to `limit` requests run at once. The next `queue_size` ones wait in arrival order for at most `timeout` seconds,
+# any request beyond that is rejected right away. A finishing request hands its slot directly to the first waiter.
+class ConcurrencyLimiter:
+    def __init__(self, limit: int, queue_size: int, timeout: float):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> bool:
+        """Wait for a slot, return False when the request should be rejected."""
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        if len(self.waiters) >= self.queue_size:
+            self.rejected += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.timeout)
+        except asyncio.TimeoutError:
+            self._forget(waiter)
+            # Since Python 3.12 `wait_for` can time out after `release()` already handed the slot over;
+            # the request is admitted then, rejecting it would lose the slot for good
+            if not (waiter.done() and not waiter.cancelled()):
+                self.timed_out += 1
+                return False
+        except asyncio.CancelledError:
+            # The client went away while waiting; if a slot was already handed over, pass it on
+            self._forget(waiter)
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                # `active` stays the same, the slot goes to the waiter
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": len(self.waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+    def _forget(self, waiter: asyncio.Future) -> None:
+        try:
+            self.waiters.remove(waiter)
+        except ValueError:
+            pass
+
+
+# ASGI middleware shedding load before it reaches the database.
+# Without it, every request is accepted under overload and waits for a pool connection or the SQLite write lock
+# until it times out, so all requests get slow together. With it, the requests that get in run at normal speed,
+# and the excess gets `503 Service Unavailable` with `Retry-After` right away (or after at most the queue timeout),
+# which keeps the latency of admitted requests bounded. Reads, writes and bulk transfers have separate limits,
+# so a burst of writes waiting for the write lock, or a long export, doesn't take the slots of reads.
+class AdmissionMiddleware:
+    def __init__(
+        self,
+        app,
+        read_limiter: Optional[ConcurrencyLimiter] = None,
+        write_limiter: Optional[ConcurrencyLimiter] = None,
+        transfer_limiter: Optional[ConcurrencyLimiter] = None,
+        exempt: tuple[str, ...] = ADMISSION_EXEMPT,
+        transfer: tuple[str, ...] = ADMISSION_TRANSFER,
+    ):
+        self.app = app
+        self.read_limiter = read_limiter or admission_limiters["read"]
+        self.write_limiter = write_limiter or admission_limiters["write"]
+        self.transfer_limiter = transfer_limiter or admission_limiters["transfer"]
+        self.exempt = exempt
+        self.transfer = transfer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt):
+            await self.app(scope, receive, send)
+            return
+
+        if scope["path"].startswith(self.transfer):
+            limiter = self.transfer_limiter
+        elif scope["method"] in READ_METHODS:
+            limiter = self.read_limiter
+        else:
+            limiter = self.write_limiter
+        if not await limiter.acquire():
+            # A rejected request never reaches the router, which is what sets `scope["route"]`;
+            # it's matched here so that `MetricsMiddleware` records the 503 under its route
+            scope["route"] = match_route(scope)
+            await reject(send, retry_after=max(1, round(limiter.timeout)))
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+def match_route(scope):
+    """Return the route the router would pick for the request (a path match with another method as a fallback)."""
+    _, route = _match_route(scope, scope["app"].routes)
+    return route
+
+
+def _match_route(scope, routes) -> tuple[Match, Optional[BaseRoute]]:
+    partial = (Match.NONE, None)
+    for route in routes:
+        # Recent FastAPI versions keep an included router as a single route wrapping the router
+        included = getattr(route, "original_router", None)
+        if included is not None:
+            match, route = _match_route(scope, included.routes)
+        else:
+            match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return match, route
+        if match == Match.PARTIAL and partial[1] is None:
+            partial = (match, route)
+    return partial
+
+
+async def reject(send, retry_after: int) -> None:
+    body = b'{"detail":"Server is overloaded, retry later."}'
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(retry_after).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+admission_limiters = {
+    "read": ConcurrencyLimiter(
+        ADMISSION_READ_LIMIT, ADMISSION_READ_QUEUE, ADMISSION_QUEUE_TIMEOUT
+    ),
+    "write": ConcurrencyLimiter(
+        ADMISSION_WRITE_LIMIT, ADMISSION_WRITE_QUEUE, ADMISSION_QUEUE_TIMEOUT
+    ),
+    "transfer": ConcurrencyLimiter(
+        ADMISSION_TRANSFER_LIMIT, ADMISSION_TRANSFER_QUEUE, ADMISSION_QUEUE_TIMEOUT
+    ),
+}
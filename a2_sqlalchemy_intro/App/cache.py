@@ -0,0 +1,160 @@
+import asyncio
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+# Cache settings, overridable with environment variables.
+# The cache is off by default (`TODOS_CACHE_SIZE=0`, every read goes to the database).
+# It lives in the memory of one process and a write only invalidates the copy of the process handling it.
+# With several workers, the others would keep serving the old todo (and its old `ETag`) for up to `TODOS_CACHE_TTL`
+# seconds, and a process can't reliably tell how many workers were started (`uvicorn --workers N`
+# doesn't set `WEB_CONCURRENCY`, gunicorn may be configured in a file).
+# Enable it with e.g. `TODOS_CACHE_SIZE=1024` when running a single worker, or with several workers
+# together with a `TODOS_CACHE_TTL` as short as reads are allowed to be stale.
+CACHE_SIZE = int(os.environ.get("TODOS_CACHE_SIZE", 0))
+CACHE_TTL = float(os.environ.get("TODOS_CACHE_TTL", 30))
+
+
+# Interface of a cache backend.
+# Methods are `async` so that a backend living in another process (e.g. Redis or memcached)
+# can implement them with network calls, the in-process `LRUCache` simply never awaits anything.
+class CacheBackend(ABC):
+    @abstractmethod
+    async def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None when the key is missing or expired."""
+
+    @abstractmethod
+    async def set(self, key: Hashable, value: Any) -> None:
+        pass
+
+    @abstractmethod
+    async def delete(self, key: Hashable) -> None:
+        pass
+
+    @abstractmethod
+    async def clear(self) -> None:
+        pass
+
+    @abstractmethod
+    def stats(self) -> dict:
+        pass
+
+
+# In-process cache that keeps at most `max_size` entries, each valid for `ttl` seconds.
+# `OrderedDict` remembers the order of use: a hit moves the key to the end,
+# so when the cache is full the first key is the least recently used one and gets evicted.
+# Each worker process has its own copy that only its own writes invalidate (see `CACHE_SIZE`).
+class LRUCache(CacheBackend):
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    async def set(self, key: Hashable, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+# Read-through cache: `get_or_load` returns the cached value or calls `loader` and caches its result.
+# Concurrent misses for the same key share one `loader` call ("single-flight"):
+# the first request starts loading, the others await the same future instead of querying the database again.
+# `None` results (e.g. a todo that doesn't exist) are not cached.
+class ReadThroughCache:
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._loading: dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def get_or_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Optional[Any]]]
+    ) -> Optional[Any]:
+        value = await self.backend.get(key)
+        if value is not None:
+            return value
+
+        future = self._loading.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The request that was loading the value got cancelled, load it ourselves
+                if not future.cancelled():
+                    raise
+                return await loader()
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            # Mark the exception as retrieved when no other request is waiting for it
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            # If the key was invalidated while loading, the value may already be stale, so don't store it
+            if value is not None and self._loading.get(key) is future:
+                await self.backend.set(key, value)
+            return value
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+    async def invalidate(self, *keys: Hashable) -> None:
+        for key in keys:
+            self._loading.pop(key, None)
+            await self.backend.delete(key)
+
+    def stats(self) -> dict:
+        return {**self.backend.stats(), "coalesced": self.coalesced}
+
+
+todo_cache = ReadThroughCache(LRUCache())
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Optional
+
+import orjson
+
+# Change feed settings, overridable with environment variables.
+# - `TODOS_CHANGES_BACKLOG` is how many recent changes are kept for clients resuming after a reconnect
+# - `TODOS_CHANGES_QUEUE_SIZE` is how many changes may wait for one subscriber before it's dropped
+CHANGES_BACKLOG = int(os.environ.get("TODOS_CHANGES_BACKLOG", 1024))
+CHANGES_QUEUE_SIZE = int(os.environ.get("TODOS_CHANGES_QUEUE_SIZE", 256))
+
+
+# One change, encoded once and shared by every subscriber.
+# `id` is "<epoch>-<sequence number>", the epoch (start time of the hub) tells a resuming client
+# whether its sequence number comes from this process or from one that has been restarted since.
+class Change:
+    __slots__ = ("sequence", "id", "json", "sse")
+
+    def __init__(self, epoch: str, sequence: int, payload: dict):
+        self.sequence = sequence
+        self.id = f"{epoch}-{sequence}" if sequence else ""
+        self.json = orjson.dumps({"id": self.id, **payload}).decode()
+        self.sse = (
+            f"id: {self.id}\nevent: {payload['type']}\ndata: {self.json}\n\n".encode()
+        )
+
+
+# Tells the client it missed changes that can't be replayed, it should reload with `GET /`
+def reset_change(epoch: str) -> Change:
+    return Change(epoch, 0, {"type": "reset"})
+
+
+class Subscription:
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(size)
+        self.dropped = False
+
+    async def next(self) -> Optional[Change]:
+        """Wait for the next change, None when the subscriber was dropped for falling behind."""
+        return await self.queue.get()
+
+
+# In-process broadcast hub for changes to `todos`.
+# A subscriber costs one `Subscription` (a small queue) and nothing else while it's idle,
+# `publish` only runs when a write happens. Everything runs on the event loop thread, so no locking is needed.
+# A subscriber whose queue is full (a slow client) is dropped instead of holding up the writes
+# or buffering without limit: its queue is emptied and ends with `None`, which closes its connection.
+# It can reconnect and resume from the last change it received, as long as that's still in the backlog.
+# Only writes handled by this worker process are published.
+class ChangeHub:
+    def __init__(
+        self, backlog: int = CHANGES_BACKLOG, queue_size: int = CHANGES_QUEUE_SIZE
+    ):
+        self.epoch = format(time.time_ns(), "x")
+        self.sequence = 0
+        self.queue_size = queue_size
+        self.backlog: deque[Change] = deque(maxlen=backlog)
+        self.subscribers: set[Subscription] = set()
+        self.dropped = 0
+
+    def publish(self, change_type: str, todo_ids) -> None:
+        if not todo_ids:
+            return
+        self.sequence += 1
+        change = Change(
+            self.epoch, self.sequence, {"type": change_type, "ids": sorted(todo_ids)}
+        )
+        self.backlog.append(change)
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait(change)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def subscribe(self, last_id: Optional[str] = None) -> Subscription:
+        """Register a subscriber, replaying the changes after `last_id` (the id of the last change it received)."""
+        subscription = Subscription(self.queue_size)
+        if last_id:
+            for change in self._changes_after(last_id):
+                subscription.queue.put_nowait(change)
+        self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self.subscribers),
+            "sequence": self.sequence,
+            "dropped_subscribers": self.dropped,
+        }
+
+    def _changes_after(self, last_id: str) -> list[Change]:
+        epoch, _, sequence = last_id.partition("-")
+        if (
+            epoch != self.epoch
+            or not sequence.isdigit()
+            or int(sequence) > self.sequence
+        ):
+            return [reset_change(self.epoch)]
+        sequence = int(sequence)
+        oldest = self.backlog[0].sequence if self.backlog else self.sequence + 1
+        if sequence < oldest - 1:
+            # Some of the missed changes already left the backlog
+            return [reset_change(self.epoch)]
+        # At most `queue_size` changes fit in the new subscriber's queue
+        missed = [change for change in self.backlog if change.sequence > sequence]
+        if len(missed) >= self.queue_size:
+            return [reset_change(self.epoch)]
+        return missed
+
+    def _drop(self, subscription: Subscription) -> None:
+        self.subscribers.discard(subscription)
+        subscription.dropped = True
+        self.dropped += 1
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+
+todo_changes = ChangeHub()
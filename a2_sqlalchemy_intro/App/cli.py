@@ -0,0 +1,113 @@
+"""Import and export todos from the command line, streaming like `POST /todos/import` and `GET /todos/export`.
+
+Run from the `App` directory, next to `todosapp.db`:
+
+    python cli.py import todos.ndjson
+    python cli.py import todos.csv --format csv
+    python cli.py export --format csv --output todos.csv
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import AsyncIterator, BinaryIO
+
+import transfer
+from routers.todos import TodoRequest
+from schema import ensure_schema
+
+READ_SIZE = 1 << 16
+
+
+async def read_chunks(file: BinaryIO) -> AsyncIterator[bytes]:
+    while chunk := file.read(READ_SIZE):
+        yield chunk
+
+
+def guess_format(path: str, file_format: str) -> str:
+    if file_format:
+        return file_format
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+async def run_import(args: argparse.Namespace) -> None:
+    async def print_progress(report: transfer.TodoImportReport, todo_ids: list[int]):
+        print(
+            f"\rimported {report.imported} rejected {report.rejected} "
+            f"({report.rows_per_second:.0f} rows/s)",
+            end="",
+            file=sys.stderr,
+        )
+
+    file_format = guess_format(args.path, args.format)
+    failure = None
+    with open(args.path, "rb") if args.path != "-" else sys.stdin.buffer as file:
+        try:
+            report = await transfer.import_todos(
+                read_chunks(file),
+                file_format,
+                TodoRequest,
+                chunk_size=args.chunk_size,
+                on_chunk=print_progress,
+            )
+        except transfer.TransferFormatError as error:
+            failure, report = error, error.report
+    print(file=sys.stderr)
+    for error in report.errors:
+        print(f"line {error.line}: {error.error}", file=sys.stderr)
+    print(
+        f"imported {report.imported} rejected {report.rejected} "
+        f"in {report.seconds:.2f}s ({report.rows_per_second:.0f} rows/s)",
+        file=sys.stderr,
+    )
+    if failure is not None:
+        sys.exit(f"import stopped: {failure}")
+
+
+async def run_export(args: argparse.Namespace) -> None:
+    file_format = guess_format(args.output, args.format)
+    start = time.perf_counter()
+    written = 0
+    with open(args.output, "wb") if args.output != "-" else sys.stdout.buffer as file:
+        async for data in transfer.export_todos(file_format, page_size=args.page_size):
+            file.write(data)
+            written += len(data)
+            print(f"\rwritten {written / 1e6:.1f} MB", end="", file=sys.stderr)
+    seconds = time.perf_counter() - start
+    print(
+        f"\rwritten {written / 1e6:.1f} MB in {seconds:.2f}s "
+        f"({written / 1e6 / seconds:.1f} MB/s)",
+        file=sys.stderr,
+    )
+
+
+# The defaults follow the same `TODOS_IMPORT_CHUNK_SIZE` / `TODOS_EXPORT_PAGE_SIZE` settings as the routes
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="import todos from a file")
+    import_parser.add_argument("path", help="NDJSON or CSV file, `-` for stdin")
+    import_parser.add_argument("--format", choices=["ndjson", "csv"])
+    import_parser.add_argument(
+        "--chunk-size", type=int, default=transfer.IMPORT_CHUNK_SIZE
+    )
+
+    export_parser = commands.add_parser("export", help="export all todos to a file")
+    export_parser.add_argument("--output", default="-", help="`-` for stdout")
+    export_parser.add_argument("--format", choices=["ndjson", "csv"])
+    export_parser.add_argument(
+        "--page-size", type=int, default=transfer.EXPORT_PAGE_SIZE
+    )
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    ensure_schema()
+    asyncio.run(run_import(args) if args.command == "import" else run_export(args))
+
+
+if __name__ == "__main__":
+    main()
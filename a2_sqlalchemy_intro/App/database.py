@@ -1,4 +1,8 @@
+import os
+
 from sqlalchemy import create_engine  # Creates a connection to the database
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -6,12 +10,59 @@ from sqlalchemy.orm import sessionmaker
 # Here we're using SQLite and the database file will be `todosapp.db` in the current directory.
 SQLALCHEMY_DATABASE_URL = "sqlite:///./todosapp.db"
 
+# The same database, accessed through the `aiosqlite` driver.
+# Async drivers let `await`-ed queries give control back to the event loop while SQLite works,
+# so a slow query no longer blocks every other request handled by the worker.
+SQLALCHEMY_ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./todosapp.db"
+
+# Read-only access to the same file (`mode=ro` is an SQLite URI option, `uri=true` enables URI filenames).
+SQLALCHEMY_ASYNC_READ_DATABASE_URL = (
+    "sqlite+aiosqlite:///file:./todosapp.db?mode=ro&uri=true"
+)
+
+# Engine profile, every setting can be overridden with an environment variable.
+# - `journal_mode=WAL` (write-ahead log) lets readers keep reading while a writer commits,
+#   with the default rollback journal a write blocks all readers.
+# - `synchronous=NORMAL` is safe with WAL and only syncs to disk at checkpoints instead of on every commit.
+# - `cache_size` is the page cache per connection, negative values are in KiB (-65536 = 64 MiB).
+# - `mmap_size` lets SQLite read the file through memory-mapped I/O (in bytes, 0 disables it).
+# - `busy_timeout` makes a connection wait (in ms) for a lock instead of failing right away with "database is locked".
+# - `pool_size` / `max_overflow` are the number of connections kept open / allowed on top of them under load.
+# - `read_pool` enables a separate pool of read-only connections used by the GET routes.
+DB_JOURNAL_MODE = os.environ.get("TODOS_DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.environ.get("TODOS_DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_SIZE = int(os.environ.get("TODOS_DB_CACHE_SIZE", -65536))
+DB_MMAP_SIZE = int(os.environ.get("TODOS_DB_MMAP_SIZE", 268435456))
+DB_BUSY_TIMEOUT = int(os.environ.get("TODOS_DB_BUSY_TIMEOUT", 5000))
+DB_POOL_SIZE = int(os.environ.get("TODOS_DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("TODOS_DB_MAX_OVERFLOW", 10))
+DB_READ_POOL = os.environ.get("TODOS_DB_READ_POOL", "0") == "1"
+DB_READ_POOL_SIZE = int(os.environ.get("TODOS_DB_READ_POOL_SIZE", 10))
+
+
+# SQLite has no server-side configuration, pragmas are set on every new connection.
+# `journal_mode` is stored in the database file, so read-only connections skip it.
+def apply_pragmas(dbapi_connection, read_only=False):
+    cursor = dbapi_connection.cursor()
+    if not read_only:
+        cursor.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size={DB_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT}")
+    cursor.close()
+
+
 # Create a SQLAlchemy engine instance.
 # The engine manages the connection to the SQLite database.
 # The connect_args parameter is specific to SQLite, allowing multiple threads to access the database in this setup.
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
 )
+event.listen(engine, "connect", lambda connection, _: apply_pragmas(connection))
 
 # `sessionmaker` manages sessions to interact with the database.
 # `Session` class is bound to the engine, allowing sessions created from this class to interact with the database.
@@ -19,6 +70,57 @@ engine = create_engine(
 # `autoflush=False` The session won’t automatically push changes to the database until explicitly committed.
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+# Synchronous session dependency.
+# The todos router uses `AsyncSessionLocal`, but the blocking `SessionLocal` path stays available,
+# e.g. for scripts or for routes declared with a plain `def` (FastAPI runs those in a thread pool).
+def get_sync_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Async counterparts of `engine` and `SessionLocal`, used by the routers.
+# `expire_on_commit=False` keeps loaded attributes after a commit. An expired attribute would have to be
+# reloaded lazily, which isn't possible outside of an `await` with the async API.
+# Event listeners are registered on `sync_engine`, the synchronous engine the async one is built around.
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+)
+event.listen(
+    async_engine.sync_engine,
+    "connect",
+    lambda connection, _: apply_pragmas(connection),
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
+# With `TODOS_DB_READ_POOL=1` the GET routes get their own pool of read-only connections,
+# so reads never wait for a connection held by a writer. Otherwise they share `async_engine`.
+if DB_READ_POOL:
+    async_read_engine = create_async_engine(
+        SQLALCHEMY_ASYNC_READ_DATABASE_URL,
+        pool_size=DB_READ_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+    )
+    event.listen(
+        async_read_engine.sync_engine,
+        "connect",
+        lambda connection, _: apply_pragmas(connection, read_only=True),
+    )
+else:
+    async_read_engine = async_engine
+
+AsyncReadSessionLocal = async_sessionmaker(
+    bind=async_read_engine, autoflush=False, expire_on_commit=False
+)
+
 # Create a base class for all models in the app.
 # All ORM (Object-Relational Mapping) model classes will inherit from this class.
 # Base provides a foundation for mapping Python classes to database tables.
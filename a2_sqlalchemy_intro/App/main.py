@@ -1,16 +1,125 @@
-import models  # `models` contains ORM model classes that define the database structure
+import asyncio
+from contextlib import asynccontextmanager
+
+import admission
+import stats
 import uvicorn
-from database import engine
+from cache import todo_cache
+from changes import todo_changes
+from database import async_engine, async_read_engine, engine
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from metrics import MetricsMiddleware, instrument_engine, metrics
 from routers import todos
+from schema import ensure_schema
+from write_queue import todo_writer
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the tables when the server starts rather than when `main` is imported,
+    # so importing the app (reloads, worker spawns, tests, scripts) doesn't touch the database.
+    # `Base.metadata` contains metadata that SQLAlchemy uses to manage database tables,
+    # `create_all` creates the tables of all classes derived from `Base` that don't exist yet.
+    # `ensure_schema` only runs it when the version stored in the database is older than the code's,
+    # otherwise it's one `PRAGMA` read, and a file lock makes concurrently starting workers run it once
+    # (see `schema.py`). It's blocking, so it runs in a thread.
+    await asyncio.to_thread(ensure_schema)
+
+    # Periodic check of the `todos_stats` counters against the `todos` table (see `stats.py`)
+    reconciler = None
+    if stats.STATS_RECONCILE_INTERVAL > 0:
+        reconciler = asyncio.create_task(stats.reconcile_periodically())
+    yield
+    if reconciler is not None:
+        reconciler.cancel()
+    # Commit the writes still waiting in the group commit queue before shutting down
+    await todo_writer.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Concurrency limits for reads, writes and bulk transfers, rejecting the excess with `503` under overload
+# (see `admission.py`).
+# A middleware added later wraps the ones added before, so `MetricsMiddleware` also records the rejected requests.
+if admission.ADMISSION_ENABLED:
+    app.add_middleware(admission.AdmissionMiddleware)
+
+# Per-route latency histograms, in-flight requests and SQL statement counts (see `metrics.py`).
+# The SQL hooks are registered on every engine, async engines expose theirs as `sync_engine`.
+app.add_middleware(MetricsMiddleware)
+for instrumented_engine in {
+    engine,
+    async_engine.sync_engine,
+    async_read_engine.sync_engine,
+}:
+    instrument_engine(instrumented_engine)
+
+
+CACHE_COUNTERS = {"hits", "misses", "evictions", "expirations", "coalesced"}
+
+
+def cache_metrics() -> list[str]:
+    lines = []
+    for name, value in todo_cache.stats().items():
+        kind = "counter" if name in CACHE_COUNTERS else "gauge"
+        suffix = "" if kind == "gauge" else "_total"
+        lines.append(f"# TYPE todo_cache_{name}{suffix} {kind}")
+        lines.append(f"todo_cache_{name}{suffix} {value}")
+    return lines
+
+
+def admission_metrics() -> list[str]:
+    lines = []
+    for name in ("active", "queued", "admitted", "rejected", "timed_out"):
+        kind = "gauge" if name in ("active", "queued") else "counter"
+        suffix = "" if kind == "gauge" else "_total"
+        lines.append(f"# TYPE admission_{name}{suffix} {kind}")
+        for route_class, limiter in admission.admission_limiters.items():
+            value = limiter.stats()[name]
+            lines.append(f'admission_{name}{suffix}{{class="{route_class}"}} {value}')
+    return lines
+
+
+def change_feed_metrics() -> list[str]:
+    lines = []
+    for name, value in todo_changes.stats().items():
+        kind = "counter" if name == "dropped_subscribers" else "gauge"
+        suffix = "" if kind == "gauge" else "_total"
+        lines.append(f"# TYPE todo_changes_{name}{suffix} {kind}")
+        lines.append(f"todo_changes_{name}{suffix} {value}")
+    return lines
+
+
+def group_commit_metrics() -> list[str]:
+    lines = []
+    for name, value in todo_writer.stats().items():
+        lines.append(f"# TYPE todo_group_commit_{name}_total counter")
+        lines.append(f"todo_group_commit_{name}_total {value}")
+    return lines
+
+
+def stats_reconcile_metrics() -> list[str]:
+    lines = []
+    for name in stats.ReconcileStats.__slots__:
+        value = getattr(stats.reconcile_stats, name)
+        lines.append(f"# TYPE todo_stats_reconcile_{name}_total counter")
+        lines.append(f"todo_stats_reconcile_{name}_total {value}")
+    return lines
+
+
+metrics.register_collector(cache_metrics)
+metrics.register_collector(group_commit_metrics)
+metrics.register_collector(change_feed_metrics)
+metrics.register_collector(admission_metrics)
+metrics.register_collector(stats_reconcile_metrics)
+
 
-app = FastAPI()
+# Metrics in the Prometheus text format, to be scraped by Prometheus or read with `curl localhost:5001/metrics`
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics():
+    return metrics.render()
 
-# Create all tables defined by the ORM models in the database.
-# Base.metadata contains metadata that SQLAlchemy uses to manage database tables.
-# The `create_all` function looks for all classes derived from `Base` (e.g., model classes) and creates tables in the database.
-# It will only create tables that do not already exist, making it safe to run on app startup.
-models.Base.metadata.create_all(bind=engine)
 
 # Import the `todos` router from the routers module and include it in the FastAPI application.
 # The `include_router` method allows us to modularize our application by splitting
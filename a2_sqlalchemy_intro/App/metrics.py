@@ -0,0 +1,258 @@
+import os
+import re
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from sqlalchemy import event
+
+# Upper bounds (in seconds) of the latency histogram buckets, the last bucket (`+Inf`) is implicit
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+
+# Per-request profiling is off unless `TODOS_PROFILING=1`,
+# then a request with the header `X-Profile: 1` is profiled and the report is saved in `PROFILE_DIR`.
+PROFILING_ENABLED = os.environ.get("TODOS_PROFILING", "0") == "1"
+PROFILE_DIR = os.environ.get("TODOS_PROFILE_DIR", "./profiles")
+
+
+# Counters of the request being handled.
+# A `ContextVar` has a separate value in every asyncio task, so concurrent requests don't mix their numbers,
+# and SQLAlchemy event hooks running on behalf of a request see that request's value.
+class RequestStats:
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "current_request", default=None
+)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# Metrics of one worker process, all updated from the event loop thread, so no locking is needed.
+# Labels are `(method, route)`, where `route` is the path template (e.g. `/todo/{todo_id}`),
+# so the number of series doesn't grow with the number of ids.
+class Metrics:
+    def __init__(self):
+        self.latency: dict[tuple, Histogram] = defaultdict(Histogram)
+        self.responses: dict[tuple, int] = defaultdict(int)
+        self.queries: dict[tuple, int] = defaultdict(int)
+        self.db_time: dict[tuple, float] = defaultdict(float)
+        self.in_flight = 0
+        self.collectors: list[Callable[[], list[str]]] = []
+
+    def register_collector(self, collector: Callable[[], list[str]]) -> None:
+        """Add a function returning extra lines in the Prometheus text format."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_request_duration_seconds Request latency.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in sorted(self.latency.items()):
+            labels = f'method="{method}",route="{route}"'
+            cumulative = 0
+            for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), histogram.counts):
+                cumulative += count
+                lines.append(
+                    f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f"http_request_duration_seconds_sum{{{labels}}} {histogram.sum}"
+            )
+            lines.append(
+                f"http_request_duration_seconds_count{{{labels}}} {histogram.count}"
+            )
+
+        lines += [
+            "# HELP http_responses_total Responses by status code.",
+            "# TYPE http_responses_total counter",
+        ]
+        for (method, route, code), count in sorted(self.responses.items()):
+            lines.append(
+                f'http_responses_total{{method="{method}",route="{route}",code="{code}"}} {count}'
+            )
+
+        lines += [
+            "# HELP db_queries_total SQL statements executed while handling requests.",
+            "# TYPE db_queries_total counter",
+        ]
+        for (method, route), count in sorted(self.queries.items()):
+            lines.append(
+                f'db_queries_total{{method="{method}",route="{route}"}} {count}'
+            )
+        lines += [
+            "# HELP db_query_duration_seconds_total Time spent executing SQL statements.",
+            "# TYPE db_query_duration_seconds_total counter",
+        ]
+        for (method, route), seconds in sorted(self.db_time.items()):
+            lines.append(
+                f'db_query_duration_seconds_total{{method="{method}",route="{route}"}} {seconds}'
+            )
+
+        for collector in self.collectors:
+            lines += collector()
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+# SQLAlchemy calls these hooks around every statement sent to the database.
+# The start time is kept on the connection, so the hooks work for sync and async engines alike
+# (for an async engine, pass `async_engine.sync_engine`).
+def instrument_engine(engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+
+
+# ASGI middleware recording latency, in-flight requests and SQL statements of every HTTP request.
+# It's written as a plain ASGI app rather than with `BaseHTTPMiddleware`, which adds noticeable
+# overhead per request and buffers streaming responses.
+# The SQL numbers so far are sent in a `Server-Timing` header, which browser dev tools display:
+#   Server-Timing: db;dur=1.52;desc="3 queries", app;dur=4.10
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+        profiler = start_profiler(scope)
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                app_time = (time.perf_counter() - start) * 1000
+                server_timing = (
+                    f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries", '
+                    f"app;dur={app_time:.2f}"
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing.encode()))
+                if profiler is not None:
+                    headers.append((b"x-profile-output", profiler.path.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.in_flight -= 1
+            current_request.reset(token)
+            if profiler is not None:
+                profiler.stop()
+
+            route = scope.get("route")
+            key = (scope["method"], route.path if route is not None else "unmatched")
+            metrics.latency[key].observe(time.perf_counter() - start)
+            metrics.responses[(*key, status_code)] += 1
+            metrics.queries[key] += stats.queries
+            metrics.db_time[key] += stats.db_time
+
+
+# Per-request profiling.
+# `pyinstrument` is a sampling profiler that follows `await`s, it's used when installed (`pip install pyinstrument`).
+# Otherwise the standard library's `cProfile` is used; it's a deterministic profiler,
+# so it's slower and also records whatever other requests run on the event loop meanwhile.
+class RequestProfiler:
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            import cProfile
+
+            self.path += ".prof"
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+            self._pyinstrument = False
+        else:
+            self.path += ".html"
+            self._profiler = Profiler(async_mode="enabled")
+            self._profiler.start()
+            self._pyinstrument = True
+
+    def stop(self) -> None:
+        global profiling_active
+        profiling_active = False
+        if self._pyinstrument:
+            self._profiler.stop()
+            with open(self.path, "w") as file:
+                file.write(self._profiler.output_html())
+        else:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.path)
+
+
+# Only one request is profiled at a time, a Python process can't run two profilers at once
+profiling_active = False
+
+
+def start_profiler(scope) -> Optional[RequestProfiler]:
+    global profiling_active
+    if not PROFILING_ENABLED or profiling_active:
+        return None
+    headers = dict(scope.get("headers", []))
+    if headers.get(b"x-profile") != b"1":
+        return None
+    profiling_active = True
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+    path = os.path.join(PROFILE_DIR, f"{time.time_ns()}-{scope['method']}-{name}")
+    return RequestProfiler(path)
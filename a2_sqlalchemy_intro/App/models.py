@@ -1,5 +1,6 @@
 from database import Base
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String, event
+from sqlalchemy.sql import func
 
 
 class Todos(Base):
@@ -10,3 +11,140 @@ class Todos(Base):
     description = Column(String)
     priority = Column(Integer)
     complete = Column(Boolean, default=False)
+
+    # Composite indexes for `GET /todos/filter`.
+    # An index on several columns is sorted by the first column, then by the second, and so on.
+    # So `(complete, priority, id)` serves `WHERE complete = ? AND priority = ? ORDER BY id`,
+    # and also `WHERE complete = ? ORDER BY priority, id`, as a range scan returning rows already in order.
+    # `(priority, id)` does the same for `priority` alone, `title` serves title prefix ranges.
+    __table_args__ = (
+        Index("ix_todos_complete_priority_id", "complete", "priority", "id"),
+        Index("ix_todos_priority_id", "priority", "id"),
+        Index("ix_todos_title", "title"),
+    )
+
+
+# Single-row table holding a counter of changes made to `todos` and the time of the last change.
+# It's used for `ETag` / `Last-Modified` headers: a client that already has the current version
+# gets `304 Not Modified` after a one-row lookup instead of a query over the whole `todos` table.
+class TodosVersion(Base):
+    __tablename__ = "todos_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
+
+
+# The triggers bump the version on every write, whichever code path (or process) made it.
+TODOS_VERSION_DDL = [
+    "INSERT OR IGNORE INTO todos_version (id, version, updated_at) "
+    "VALUES (1, 0, CURRENT_TIMESTAMP)",
+    *(
+        f"CREATE TRIGGER IF NOT EXISTS todos_version_{operation.lower()} "
+        f"AFTER {operation} ON todos BEGIN "
+        "UPDATE todos_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP "
+        "WHERE id = 1; END"
+        for operation in ("INSERT", "UPDATE", "DELETE")
+    ),
+]
+
+
+# Number of todos for every (priority, complete) pair, so `GET /todos/stats` reads a handful of rows
+# instead of running `GROUP BY` over the whole `todos` table.
+# The triggers below keep the counts up to date in the same transaction as the write,
+# `stats.py` periodically checks them against a real `GROUP BY` and fixes any drift.
+class TodosStats(Base):
+    __tablename__ = "todos_stats"
+
+    priority = Column(Integer, primary_key=True)
+    complete = Column(Boolean, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+# `ON CONFLICT ... DO UPDATE` ("upsert") increments the row of the pair, creating it on first use.
+# The update trigger only fires when `priority` or `complete` actually changed.
+# Todos with a NULL `priority` or `complete` (the columns are nullable) aren't counted.
+TODOS_STATS_INCREMENT = (
+    "INSERT INTO todos_stats (priority, complete, count) "
+    "SELECT new.priority, new.complete, 1 "
+    "WHERE new.priority IS NOT NULL AND new.complete IS NOT NULL "
+    "ON CONFLICT (priority, complete) DO UPDATE SET count = count + 1; "
+)
+TODOS_STATS_DECREMENT = (
+    "UPDATE todos_stats SET count = count - 1 "
+    "WHERE priority = old.priority AND complete = old.complete; "
+)
+TODOS_STATS_DDL = [
+    # Replaces the triggers of older schema versions, which failed on NULL values
+    "DROP TRIGGER IF EXISTS todos_stats_insert",
+    "DROP TRIGGER IF EXISTS todos_stats_update",
+    "CREATE TRIGGER IF NOT EXISTS todos_stats_insert AFTER INSERT ON todos BEGIN "
+    f"{TODOS_STATS_INCREMENT}END",
+    "CREATE TRIGGER IF NOT EXISTS todos_stats_delete AFTER DELETE ON todos BEGIN "
+    f"{TODOS_STATS_DECREMENT}END",
+    "CREATE TRIGGER IF NOT EXISTS todos_stats_update AFTER UPDATE OF priority, complete ON todos "
+    "WHEN old.priority IS NOT new.priority OR old.complete IS NOT new.complete BEGIN "
+    f"{TODOS_STATS_DECREMENT}{TODOS_STATS_INCREMENT}END",
+]
+
+# Recount everything from `todos`, used to fill the table the first time and to fix drift
+TODOS_STATS_REBUILD = [
+    "DELETE FROM todos_stats",
+    "INSERT INTO todos_stats (priority, complete, count) "
+    "SELECT priority, complete, count(*) FROM todos "
+    "WHERE priority IS NOT NULL AND complete IS NOT NULL GROUP BY priority, complete",
+]
+
+
+# Full-text search index over `title` and `description` (SQLite's FTS5 extension).
+# `content='todos'` makes it an "external content" table: it stores only the search index,
+# the text itself is read from `todos` (matched on `rowid` = `todos.id`), so it isn't stored twice.
+# The triggers keep the index in sync with every write to `todos`. An external content index is updated
+# by deleting the old values (the special `'delete'` command) and inserting the new ones.
+TODOS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5("
+    "title, description, content='todos', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_insert AFTER INSERT ON todos BEGIN "
+    "INSERT INTO todos_fts (rowid, title, description) "
+    "VALUES (new.id, new.title, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_delete AFTER DELETE ON todos BEGIN "
+    "INSERT INTO todos_fts (todos_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS todos_fts_update AFTER UPDATE OF title, description ON todos BEGIN "
+    "INSERT INTO todos_fts (todos_fts, rowid, title, description) "
+    "VALUES ('delete', old.id, old.title, old.description); "
+    "INSERT INTO todos_fts (rowid, title, description) "
+    "VALUES (new.id, new.title, new.description); END",
+]
+
+
+# `after_create` on the metadata runs after every `create_all`, even when the tables already existed,
+# so databases created before the triggers and indexes were added get them too
+# (`create_all` itself only creates the indexes of tables it creates).
+@event.listens_for(Base.metadata, "after_create")
+def create_todos_version_triggers(target, connection, **kwargs):
+    for statement in TODOS_VERSION_DDL:
+        connection.exec_driver_sql(statement)
+    for index in Todos.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+    fts_exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'todos_fts'"
+    ).first()
+    for statement in TODOS_FTS_DDL:
+        connection.exec_driver_sql(statement)
+    if fts_exists is None:
+        # Index the todos that were stored before the search index existed
+        connection.exec_driver_sql(
+            "INSERT INTO todos_fts (todos_fts) VALUES ('rebuild')"
+        )
+
+    stats_exist = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'todos_stats_insert'"
+    ).first()
+    for statement in TODOS_STATS_DDL:
+        connection.exec_driver_sql(statement)
+    if stats_exist is None:
+        # Count the todos that were stored before the triggers existed
+        for statement in TODOS_STATS_REBUILD:
+            connection.exec_driver_sql(statement)
@@ -1,14 +1,43 @@
-from typing import Annotated
+import asyncio
+import hashlib
+import html
+import sys
+from datetime import timezone
+from email.utils import format_datetime
+from typing import Annotated, Literal, Optional
 
-from database import SessionLocal
-from fastapi import APIRouter, Depends, HTTPException, Path
-from models import Todos
-from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+import orjson
+import transfer
+from cache import todo_cache
+from changes import todo_changes
+from database import AsyncReadSessionLocal, AsyncSessionLocal
+from fastapi import APIRouter, Body, Depends, HTTPException, Path, Query
+from fastapi.requests import Request
+from fastapi.responses import Response, StreamingResponse
+from fastapi.websockets import WebSocket, WebSocketDisconnect
+from models import Todos, TodosStats, TodosVersion
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import and_, delete, insert, or_, select, text, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
+from uvicorn.protocols.utils import ClientDisconnected
+from write_queue import todo_writer
 
 router = APIRouter()
 
+# Number of rows fetched from the database cursor at a time when streaming `GET /?stream=true`
+STREAM_BATCH_SIZE = 500
+
+# Seconds between two keep-alive comments on an idle `GET /todos/changes` stream,
+# so proxies don't close the connection for inactivity
+CHANGES_KEEPALIVE = 15
+
+# Cursor value of a NULL priority in `GET /todos/filter`
+NULL_CURSOR = "null"
+
+# Maximum number of todos accepted by a single bulk request
+MAX_BULK_ITEMS = 5000
+
 
 class TodoRequest(BaseModel):
     title: str = Field(min_length=3)
@@ -17,52 +46,553 @@ class TodoRequest(BaseModel):
     complete: bool
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+# Response schemas.
+# Declaring them as `response_model` lets FastAPI validate the returned objects with Pydantic
+# and serialize them straight to JSON bytes (in Pydantic's Rust core),
+# instead of walking every ORM object through `jsonable_encoder` first.
+# `from_attributes=True` allows building a `TodoResponse` from a `Todos` object, not only from a dict.
+# The fields are optional like the columns of `Todos`: rows written before `TodoRequest` validated them
+# may hold NULLs, which are returned as `null`.
+class TodoResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    title: Optional[str]
+    description: Optional[str]
+    priority: Optional[int]
+    complete: Optional[bool]
+
+
+class TodoPage(BaseModel):
+    items: list[TodoResponse]
+    next_cursor: Optional[int]
+
+
+# Page of `GET /todos/filter`, the cursor is a string because it may hold more than one value
+class TodoFilterPage(BaseModel):
+    items: list[TodoResponse]
+    next_cursor: Optional[str]
+
+
+# A search hit: the todo, its title and a snippet of its description as HTML-escaped text with the matched terms
+# wrapped in `<mark>` tags, and its BM25 `rank` (lower is a better match)
+class TodoSearchResult(TodoResponse):
+    title_highlight: str
+    description_highlight: str
+    rank: float
+
+
+class TodoSearchPage(BaseModel):
+    items: list[TodoSearchResult]
+    next_offset: Optional[int]
+
+
+class TodoBulkUpdateRequest(TodoRequest):
+    id: int = Field(gt=0)
+
+
+# Result of one item of a bulk request, `status` is "created", "updated", "deleted" or "not_found"
+class TodoBulkResult(BaseModel):
+    id: int
+    status: str
+
+
+class TodoStatusCounts(BaseModel):
+    complete: int = 0
+    incomplete: int = 0
+
+
+class TodoStats(TodoStatusCounts):
+    total: int = 0
+    by_priority: dict[int, TodoStatusCounts] = {}
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Session for routes that only read, backed by the read-only pool when `TODOS_DB_READ_POOL=1`
+async def get_read_db():
+    async with AsyncReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-# The parameter `db: Annotated[Session, Depends(get_db)]` does the following:
-# - `db` is annotated with `Session` (an SQLAlchemy session) and `Depends(get_db)`.
+# Conditional GET support.
+# A response carries an `ETag` (a fingerprint of its content). A client sends it back in `If-None-Match`,
+# and when it still matches, the server answers `304 Not Modified` with an empty body,
+# skipping the query and the serialization of the payload.
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    # The header may hold several tags, weak tags (`W/"..."`) compare equal to strong ones
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+# The parameter `db: Annotated[AsyncSession, Depends(get_db)]` does the following:
+# - `db` is annotated with `AsyncSession` (an async SQLAlchemy session) and `Depends(get_db)`.
 # - `Depends(get_db)` tells FastAPI to call the `get_db()` function to retrieve
 #   a database session for each request.
 # - `get_db()` yields a session, ensuring a new session is opened for each request,
 #   and closes it automatically after the request completes, to prevent open connections.
 #
-# The function `read_all` then uses this session (`db`) to query the Todos table,
-# calling `db.query(Todos).all()` to retrieve all records.
-# FastAPI converts the query result to JSON and returns it as the response.
-@router.get("/", status_code=status.HTTP_200_OK)
+# The function `read_all` then uses this session (`db`) to query the Todos table.
+# Instead of loading the whole table at once, it returns one page of todos at a time (keyset pagination):
+# - `limit` is the page size, `after` is the id of the last todo the client has already seen.
+# - `WHERE id > :after ORDER BY id LIMIT :limit` is answered directly from the primary key index,
+#   so every page is equally cheap, unlike `OFFSET`, which has to skip over all previous rows.
+# - `next_cursor` is the value to pass as `after` for the next page, or `null` on the last page.
+# With `stream=true` every todo after `after` is sent as newline-delimited JSON (NDJSON) instead, see `stream_todos`.
+#
+# The `ETag` is the change counter from `todos_version`, which triggers bump on every write (see `models.py`).
+# It's read first with a one-row primary key lookup, so a client polling an unchanged table
+# gets `304 Not Modified` without the `todos` table being queried at all.
+@router.get("/", status_code=status.HTTP_200_OK, response_model=TodoPage)
 async def read_all(
-    db: Annotated[Session, Depends(get_db)],
+    request: Request,
+    response: Response,
+    db: Annotated[AsyncSession, Depends(get_read_db)],
+    limit: int = Query(default=100, gt=0, le=1000),
+    after: int = Query(default=0, ge=0),
+    stream: bool = False,
 ):
-    return db.query(Todos).all()
+    version = await db.get(TodosVersion, 1)
+    headers = {}
+    if version is not None:
+        headers["ETag"] = f'"{version.version}"'
+        # SQLite's CURRENT_TIMESTAMP is in UTC but is stored without a timezone
+        updated_at = version.updated_at.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(updated_at, usegmt=True)
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return not_modified(headers)
+
+    if stream:
+        return StreamingResponse(
+            stream_todos(after), media_type="application/x-ndjson", headers=headers
+        )
+
+    query = select(Todos).where(Todos.id > after).order_by(Todos.id).limit(limit)
+    todos = (await db.scalars(query)).all()
+    next_cursor: Optional[int] = todos[-1].id if len(todos) == limit else None
+    response.headers.update(headers)
+    return {"items": todos, "next_cursor": next_cursor}
+
+
+# Yields the todos as NDJSON, one JSON object per line.
+# `db.stream` uses a server-side cursor and `yield_per` fetches `STREAM_BATCH_SIZE` rows at a time,
+# so memory use depends on the batch size, not on the size of the table.
+# Selecting `Todos.__table__` returns plain rows and skips creating ORM objects,
+# which `orjson` serializes directly.
+# The generator opens its own session because it keeps running after `read_all` has returned.
+async def stream_todos(after: int):
+    query = (
+        select(Todos.__table__)
+        .where(Todos.id > after)
+        .order_by(Todos.id)
+        .execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+    async with AsyncReadSessionLocal() as db:
+        result = await db.stream(query)
+        async for rows in result.mappings().partitions():
+            yield b"".join(orjson.dumps(dict(row)) + b"\n" for row in rows)
 
 
 # To avoid duplicating the dependency annotation for database sessions in each route,
-# we extract the `db: Annotated[Session, Depends(get_db)]` parameter into a global
+# we extract the `db: Annotated[AsyncSession, Depends(get_db)]` parameter into a global
 # variable, `db_dependency`. This variable can then be reused wherever the database
 # dependency is needed, promoting consistency and simplifying updates to dependency definitions.
-db_dependency = Annotated[Session, Depends(get_db)]
+db_dependency = Annotated[AsyncSession, Depends(get_db)]
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
 
 
-@router.get("/todo/{todo_id}", status_code=status.HTTP_200_OK)
-async def read_todo(db: db_dependency, todo_id: int = Path(gt=0)):
-    todo_model = db.query(Todos).filter(Todos.id == todo_id).first()
-    if todo_model is not None:
-        return todo_model
-    raise HTTPException(status_code=404, detail="Todo not found.")
+# Reads of single todos go through `todo_cache` (see `cache.py`), an in-process LRU cache with a TTL,
+# off unless enabled with `TODOS_CACHE_SIZE`.
+# Popular todos are served from memory, and concurrent misses for the same id share one database query.
+# The cached value is the plain row (a dict), not an ORM object bound to a session.
+# Every write below invalidates the ids it touched, so a cached todo is never served after it changed.
+# The `ETag` of a single todo is a hash of its values, computed from the (usually cached) row.
+@router.get(
+    "/todo/{todo_id}", status_code=status.HTTP_200_OK, response_model=TodoResponse
+)
+async def read_todo(
+    request: Request,
+    response: Response,
+    db: read_db_dependency,
+    todo_id: int = Path(gt=0),
+):
+    async def load_todo():
+        query = select(Todos.__table__).where(Todos.id == todo_id)
+        row = (await db.execute(query)).mappings().first()
+        return None if row is None else dict(row)
+
+    todo = await todo_cache.get_or_load(todo_id, load_todo)
+    if todo is None:
+        raise HTTPException(status_code=404, detail="Todo not found.")
+
+    digest = hashlib.blake2b(repr(tuple(todo.values())).encode(), digest_size=8)
+    etag = f'"{digest.hexdigest()}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified({"ETag": etag})
+    response.headers["ETag"] = etag
+    return todo
 
 
+# Server-side filtering and sorting.
+# - `complete` and `priority` are exact matches, `title_prefix` matches titles starting with it (case-sensitive).
+# - `sort` is `id` or `priority`, prefixed with `-` for descending order. Ties on priority are ordered by id.
+# The composite indexes declared on `Todos` let SQLite answer these with an index range scan
+# instead of reading the whole table, e.g. for `complete=false&priority=3`:
+#   SEARCH todos USING INDEX ix_todos_complete_priority_id (complete=? AND priority=?)
+# Like `GET /`, results are paginated by keyset: `next_cursor` holds the sort key of the last row
+# (`"<id>"` or `"<priority>:<id>"`) and is passed back as `cursor` to get the next page.
+# `priority` may be NULL (rows written before it was validated): SQLite sorts NULLs first in ascending order,
+# a cursor on such a row is `"null:<id>"` and `keyset_after` handles it with `IS NULL` instead of a comparison.
+# The title prefix is turned into a range (`title >= 'Buy' AND title < 'Buz'`), which the `title` index can serve,
+# whereas SQLite's `LIKE 'Buy%'` is case-insensitive and can't use a regular index.
+@router.get(
+    "/todos/filter", status_code=status.HTTP_200_OK, response_model=TodoFilterPage
+)
+async def filter_todos(
+    db: read_db_dependency,
+    complete: Optional[bool] = None,
+    priority: Optional[int] = Query(default=None, gt=0, lt=6),
+    title_prefix: Optional[str] = Query(default=None, min_length=1),
+    sort: Literal["id", "-id", "priority", "-priority"] = "id",
+    limit: int = Query(default=100, gt=0, le=1000),
+    cursor: Optional[str] = None,
+):
+    query = select(Todos)
+    if complete is not None:
+        query = query.where(Todos.complete == complete)
+    if priority is not None:
+        query = query.where(Todos.priority == priority)
+    if title_prefix is not None:
+        query = query.where(Todos.title >= title_prefix)
+        upper_bound = prefix_upper_bound(title_prefix)
+        if upper_bound is not None:
+            query = query.where(Todos.title < upper_bound)
+
+    descending = sort.startswith("-")
+    if sort.endswith("priority"):
+        order_by = [Todos.priority, Todos.id]
+    else:
+        order_by = [Todos.id]
+
+    if cursor is not None:
+        query = query.where(
+            keyset_after(parse_cursor(cursor, len(order_by)), descending)
+        )
+
+    query = query.order_by(
+        *(column.desc() if descending else column for column in order_by)
+    ).limit(limit)
+    todos = (await db.scalars(query)).all()
+
+    next_cursor = None
+    if len(todos) == limit:
+        last = todos[-1]
+        values = (last.priority, last.id) if len(order_by) > 1 else (last.id,)
+        next_cursor = ":".join(
+            NULL_CURSOR if value is None else str(value) for value in values
+        )
+    return {"items": todos, "next_cursor": next_cursor}
+
+
+# Condition selecting the rows after the cursor position `values` in the sort order
+def keyset_after(values: list[Optional[int]], descending: bool):
+    if len(values) == 1:
+        return Todos.id < values[0] if descending else Todos.id > values[0]
+    priority, todo_id = values
+    if priority is None:
+        # The remaining NULL rows, then (ascending only) every row with a priority
+        same_priority = and_(
+            Todos.priority.is_(None),
+            Todos.id < todo_id if descending else Todos.id > todo_id,
+        )
+        if descending:
+            return same_priority
+        return or_(same_priority, Todos.priority.is_not(None))
+    # A comparison with NULL is never true, so the NULL rows (last in descending order) are added explicitly
+    position = tuple_(Todos.priority, Todos.id)
+    if descending:
+        return or_(position < (priority, todo_id), Todos.priority.is_(None))
+    return position > (priority, todo_id)
+
+
+# Smallest string greater than every string starting with `prefix`, e.g. "Buy" -> "Buz".
+# Trailing U+10FFFF (the last code point) can't be incremented and is dropped before incrementing the character
+# in front of it, surrogates (which can't be stored as UTF-8) are skipped.
+# None when `prefix` is only made of U+10FFFF: no string starting with it has an upper bound.
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    code_point = ord(prefix[-1]) + 1
+    if 0xD800 <= code_point <= 0xDFFF:
+        code_point = 0xE000
+    return prefix[:-1] + chr(code_point)
+
+
+# Only the priority (the first of two values) can be NULL
+def parse_cursor(cursor: str, size: int) -> list[Optional[int]]:
+    try:
+        values = [
+            None if size > 1 and i == 0 and value == NULL_CURSOR else int(value)
+            for i, value in enumerate(cursor.split(":"))
+        ]
+    except ValueError:
+        values = []
+    if len(values) != size:
+        raise HTTPException(status_code=422, detail="Invalid cursor.")
+    return values
+
+
+# Full-text search over titles and descriptions, backed by the FTS5 index `todos_fts` (see `models.py`).
+# `MATCH` looks the words up in the inverted index, so the cost depends on the number of hits,
+# not on the size of the table. Results are ranked with BM25 (title matches weigh twice as much
+# as description matches), which is why they are paginated with `offset` instead of a keyset cursor.
+# Every word of `q` must appear (in any order), `prefix=true` also matches words starting with the last one,
+# e.g. `q=buy gro&prefix=true` finds "Buy groceries".
+# SQLite returns the highlights with the stored text as is, the matches are wrapped in the control characters
+# `HIGHLIGHT_START` and `HIGHLIGHT_END` instead of tags: `highlight_html` escapes the text before turning them
+# into `<mark>` tags, so a title holding HTML can't inject it into a page showing the results.
+HIGHLIGHT_START, HIGHLIGHT_END = "\x02", "\x03"
+TODOS_SEARCH_QUERY = text(
+    """
+    SELECT todos.id, todos.title, todos.description, todos.priority, todos.complete,
+           highlight(todos_fts, 0, char(2), char(3)) AS title_highlight,
+           snippet(todos_fts, 1, char(2), char(3), '…', 16) AS description_highlight,
+           bm25(todos_fts, 2.0, 1.0) AS rank
+    FROM todos_fts
+    JOIN todos ON todos.id = todos_fts.rowid
+    WHERE todos_fts MATCH :query
+    ORDER BY rank
+    LIMIT :limit OFFSET :offset
+    """
+)
+
+
+@router.get(
+    "/todos/search", status_code=status.HTTP_200_OK, response_model=TodoSearchPage
+)
+async def search_todos(
+    db: read_db_dependency,
+    q: str = Query(min_length=1, max_length=200),
+    prefix: bool = False,
+    limit: int = Query(default=20, gt=0, le=100),
+    offset: int = Query(default=0, ge=0, le=10000),
+):
+    query = fts_query(q, prefix)
+    if query is None:
+        return {"items": [], "next_offset": None}
+    params = {"query": query, "limit": limit, "offset": offset}
+    rows = (await db.execute(TODOS_SEARCH_QUERY, params)).mappings().all()
+    items = [
+        {
+            **row,
+            "title_highlight": highlight_html(row["title_highlight"]),
+            "description_highlight": highlight_html(row["description_highlight"]),
+        }
+        for row in rows
+    ]
+    next_offset = offset + limit if len(rows) == limit else None
+    return {"items": items, "next_offset": next_offset}
+
+
+def highlight_html(highlight: Optional[str]) -> str:
+    if highlight is None:
+        return ""
+    return (
+        html.escape(highlight)
+        .replace(HIGHLIGHT_START, "<mark>")
+        .replace(HIGHLIGHT_END, "</mark>")
+    )
+
+
+# Turns user input into an FTS5 query. Every word is quoted, so characters like `-`, `*` or `"`
+# are searched for literally instead of being read as FTS5 operators.
+def fts_query(q: str, prefix: bool) -> Optional[str]:
+    words = ['"' + word.replace('"', '""') + '"' for word in q.split()]
+    if not words:
+        return None
+    if prefix:
+        words[-1] += "*"
+    return " ".join(words)
+
+
+# Change feed.
+# Instead of polling `GET /`, a client subscribes to the changes made by the writes below:
+# `{"id": "<epoch>-<n>", "type": "created" | "updated" | "deleted", "ids": [...]}`.
+# - `GET /todos/changes` sends them as Server-Sent Events (`new EventSource("/todos/changes")` in a browser)
+# - `/todos/changes/ws` sends the same JSON messages over a WebSocket
+# To resume after a reconnect, pass the id of the last received change as `after`
+# (a browser's `EventSource` sends it in the `Last-Event-ID` header by itself).
+# The changes missed meanwhile are sent first; if they aren't available anymore,
+# a `{"type": "reset"}` change tells the client to reload the todos with `GET /`.
+# A client that can't keep up is disconnected and should reconnect the same way (see `changes.py`).
+@router.get("/todos/changes", status_code=status.HTTP_200_OK)
+async def stream_changes(request: Request, after: Optional[str] = None):
+    last_id = after or request.headers.get("last-event-id")
+    return StreamingResponse(
+        sse_changes(last_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def sse_changes(last_id: Optional[str]):
+    subscription = todo_changes.subscribe(last_id)
+    try:
+        while True:
+            try:
+                change = await asyncio.wait_for(subscription.next(), CHANGES_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if change is None:
+                return
+            yield change.sse
+    finally:
+        todo_changes.unsubscribe(subscription)
+
+
+@router.websocket("/todos/changes/ws")
+async def websocket_changes(websocket: WebSocket, after: Optional[str] = None):
+    await websocket.accept()
+    subscription = todo_changes.subscribe(after)
+
+    async def send_changes():
+        while (change := await subscription.next()) is not None:
+            await websocket.send_text(change.json)
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+
+    sender = asyncio.create_task(send_changes())
+    try:
+        # Messages from the client are ignored, receiving is how a disconnect is noticed
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sender.cancel()
+        todo_changes.unsubscribe(subscription)
+        # Awaiting the task raises the error it failed with, if any, instead of losing it.
+        # A send to a client that is already gone is expected (Starlette raises `WebSocketDisconnect`,
+        # older versions let uvicorn's `ClientDisconnected` through), anything else is re-raised.
+        try:
+            await sender
+        except (asyncio.CancelledError, WebSocketDisconnect, ClientDisconnected):
+            pass
+
+
+# Streaming import and export, for moving large numbers of todos between databases (see `transfer.py`).
+# `POST /todos/import?format=csv` reads the request body as it arrives and inserts valid rows in chunks,
+# e.g. `curl -X POST -T todos.ndjson localhost:5001/todos/import`.
+# The response reports how many rows were imported and rejected (with the first errors) and the throughput.
+# When the input can't be read any further (e.g. a line is too long), a 400 response carries the same report
+# for the rows imported up to that point.
+# `GET /todos/export?format=csv` streams all todos, e.g. `curl localhost:5001/todos/export -o todos.ndjson`.
+# `cli.py` offers the same from the command line.
+@router.post(
+    "/todos/import",
+    status_code=status.HTTP_200_OK,
+    response_model=transfer.TodoImportReport,
+)
+async def import_todos_stream(request: Request, format: transfer.FileFormat = "ndjson"):
+    async def on_chunk(report: transfer.TodoImportReport, todo_ids: list[int]):
+        await todo_cache.invalidate(*todo_ids)
+        todo_changes.publish("created", todo_ids)
+
+    try:
+        return await transfer.import_todos(
+            request.stream(), format, TodoRequest, on_chunk=on_chunk
+        )
+    except transfer.TransferFormatError as error:
+        # The chunks committed before the error stay imported, the report tells the client how many
+        raise HTTPException(
+            status_code=400,
+            detail={"error": str(error), "report": error.report.model_dump()},
+        )
+
+
+@router.get("/todos/export", status_code=status.HTTP_200_OK)
+async def export_todos_stream(format: transfer.FileFormat = "ndjson"):
+    return StreamingResponse(
+        transfer.export_todos(format),
+        media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="todos.{format}"'},
+    )
+
+
+# Counts of todos by completion status and priority.
+# They're read from `todos_stats`, one row per (priority, complete) pair kept up to date by triggers
+# (see `models.py`), so the cost doesn't depend on the number of todos.
+@router.get("/todos/stats", status_code=status.HTTP_200_OK, response_model=TodoStats)
+async def read_todo_stats(db: read_db_dependency):
+    stats = TodoStats()
+    for row in await db.scalars(select(TodosStats).where(TodosStats.count > 0)):
+        by_priority = stats.by_priority.setdefault(row.priority, TodoStatusCounts())
+        if row.complete:
+            by_priority.complete += row.count
+            stats.complete += row.count
+        else:
+            by_priority.incomplete += row.count
+            stats.incomplete += row.count
+        stats.total += row.count
+    return stats
+
+
+# Hit, miss and eviction counters of `todo_cache`
+@router.get("/todos/cache/stats", status_code=status.HTTP_200_OK)
+async def read_todo_cache_stats():
+    return todo_cache.stats()
+
+
+# With `TODOS_GROUP_COMMIT=1`, single creates and updates are committed in batches by `todo_writer`
+# (see `write_queue.py`), the request returns once the batch holding its write is committed.
 @router.post("/todo", status_code=status.HTTP_201_CREATED)
 async def create_todo(db: db_dependency, todo_request: TodoRequest):
+    if todo_writer.enabled:
+        todo_id = await todo_writer.submit(insert_todo(todo_request.model_dump()))
+        await todo_cache.invalidate(todo_id)
+        todo_changes.publish("created", [todo_id])
+        return
+
     todo_model = Todos(**todo_request.model_dump())
 
     db.add(todo_model)
-    db.commit()
+    await db.commit()
+    await todo_cache.invalidate(todo_model.id)
+    todo_changes.publish("created", [todo_model.id])
+
+
+# `insert_todo` and `update_todo_by_id` build the writes passed to `todo_writer`
+def insert_todo(values: dict):
+    async def write(db: AsyncSession) -> int:
+        return await db.scalar(insert(Todos).values(**values).returning(Todos.id))
+
+    return write
+
+
+# Update and delete each run a single statement (`UPDATE ... WHERE id = ?` / `DELETE ... WHERE id = ?`).
+# There is no `SELECT` to load the todo into an ORM object first:
+# the number of affected rows (`rowcount`) tells whether the todo existed.
+# `synchronize_session=False` skips matching the change against objects already loaded in the session,
+# none are loaded here.
+def update_todo_by_id(todo_id: int, values: dict):
+    async def write(db: AsyncSession) -> int:
+        query = (
+            update(Todos)
+            .where(Todos.id == todo_id)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        return (await db.execute(query)).rowcount
+
+    return write
 
 
 @router.put("/todo/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -71,24 +601,124 @@ async def update_todo(
     todo_request: TodoRequest,
     todo_id: int = Path(gt=0),
 ):
-    todo_model = db.query(Todos).filter(Todos.id == todo_id).first()
-    if todo_model is None:
+    write = update_todo_by_id(todo_id, todo_request.model_dump())
+    if todo_writer.enabled:
+        rowcount = await todo_writer.submit(write)
+    else:
+        rowcount = await write(db)
+        if rowcount:
+            await db.commit()
+    if rowcount == 0:
         raise HTTPException(status_code=404, detail="Todo not found.")
 
-    todo_model.title = todo_request.title
-    todo_model.description = todo_request.description
-    todo_model.priority = todo_request.priority
-    todo_model.complete = todo_request.complete
-
-    db.add(todo_model)
-    db.commit()
+    await todo_cache.invalidate(todo_id)
+    todo_changes.publish("updated", [todo_id])
 
 
 @router.delete("/todo/{todo_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_todo(db: db_dependency, todo_id: int = Path(gt=0)):
-    todo_model = db.query(Todos).filter(Todos.id == todo_id).first()
-    if todo_model is None:
+    query = (
+        delete(Todos)
+        .where(Todos.id == todo_id)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(query)
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="Todo not found.")
-    db.query(Todos).filter(Todos.id == todo_id).delete()
 
-    db.commit()
+    await db.commit()
+    await todo_cache.invalidate(todo_id)
+    todo_changes.publish("deleted", [todo_id])
+
+
+# Bulk endpoints.
+# Each of them handles a whole list of todos in one request and one transaction (a single commit),
+# instead of one HTTP round trip and one commit per todo.
+# Passing a list of parameter dictionaries to `db.execute` makes SQLAlchemy send them
+# to the database in one "executemany" batch instead of one statement per row.
+# The response lists the result for every item, in the order of the request.
+@router.post(
+    "/todos/bulk",
+    status_code=status.HTTP_201_CREATED,
+    response_model=list[TodoBulkResult],
+)
+async def create_todos_bulk(
+    db: db_dependency,
+    todo_requests: Annotated[
+        list[TodoRequest], Body(min_length=1, max_length=MAX_BULK_ITEMS)
+    ],
+):
+    # `sort_by_parameter_order=True` guarantees the returned ids are in the same order as the input rows
+    query = insert(Todos).returning(Todos.id, sort_by_parameter_order=True)
+    rows = [todo_request.model_dump() for todo_request in todo_requests]
+    todo_ids = (await db.scalars(query, rows)).all()
+    await db.commit()
+    await todo_cache.invalidate(*todo_ids)
+    todo_changes.publish("created", todo_ids)
+    return [{"id": todo_id, "status": "created"} for todo_id in todo_ids]
+
+
+@router.put(
+    "/todos/bulk",
+    status_code=status.HTTP_200_OK,
+    response_model=list[TodoBulkResult],
+)
+async def update_todos_bulk(
+    db: db_dependency,
+    todo_requests: Annotated[
+        list[TodoBulkUpdateRequest], Body(min_length=1, max_length=MAX_BULK_ITEMS)
+    ],
+):
+    # One `SELECT id ... WHERE id IN (...)` finds which todos exist,
+    # then the existing ones are updated by primary key in one batch.
+    # The driver only opens a transaction before the first write, so `BEGIN IMMEDIATE` opens it
+    # (and takes the write lock) before the `SELECT`: no todo can be deleted between the two statements,
+    # which would make the batch update fail instead of reporting that todo as "not_found".
+    await db.execute(text("BEGIN IMMEDIATE"))
+    requested_ids = {todo_request.id for todo_request in todo_requests}
+    query = select(Todos.id).where(Todos.id.in_(requested_ids))
+    existing_ids = set((await db.scalars(query)).all())
+
+    rows = [
+        todo_request.model_dump()
+        for todo_request in todo_requests
+        if todo_request.id in existing_ids
+    ]
+    if rows:
+        await db.execute(update(Todos), rows)
+        await db.commit()
+        await todo_cache.invalidate(*existing_ids)
+        todo_changes.publish("updated", existing_ids)
+    return [
+        {
+            "id": todo_request.id,
+            "status": "updated" if todo_request.id in existing_ids else "not_found",
+        }
+        for todo_request in todo_requests
+    ]
+
+
+@router.delete(
+    "/todos/bulk",
+    status_code=status.HTTP_200_OK,
+    response_model=list[TodoBulkResult],
+)
+async def delete_todos_bulk(
+    db: db_dependency,
+    todo_ids: Annotated[list[int], Body(min_length=1, max_length=MAX_BULK_ITEMS)],
+):
+    query = delete(Todos).where(Todos.id.in_(set(todo_ids))).returning(Todos.id)
+    deleted_ids = set((await db.scalars(query)).all())
+    await db.commit()
+    await todo_cache.invalidate(*deleted_ids)
+    todo_changes.publish("deleted", deleted_ids)
+    # An id listed more than once removed a single row: its first occurrence is reported as "deleted",
+    # the repeats as "not_found" (like deleting it again in another request)
+    results = []
+    for todo_id in todo_ids:
+        if todo_id in deleted_ids:
+            deleted_ids.remove(todo_id)
+            results.append({"id": todo_id, "status": "deleted"})
+        else:
+            results.append({"id": todo_id, "status": "not_found"})
+    return results
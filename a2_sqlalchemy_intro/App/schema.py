@@ -0,0 +1,58 @@
+import os
+from contextlib import contextmanager
+
+import models
+from database import engine
+
+try:
+    import fcntl
+except ImportError:  # Windows, there the schema setup runs without the lock
+    fcntl = None
+
+# Version of the database schema created by `models.py`, stored in the database file itself
+# (`PRAGMA user_version`, an integer SQLite keeps in the file header for applications).
+# Bump it whenever tables, indexes or triggers change, so existing databases get the change on the next start.
+SCHEMA_VERSION = 2
+
+SCHEMA_LOCK_PATH = os.environ.get("TODOS_SCHEMA_LOCK", "./todosapp.db.schema-lock")
+
+
+def schema_version() -> int:
+    with engine.connect() as connection:
+        return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+@contextmanager
+def schema_lock():
+    # An exclusive `flock`: when several workers start at once, one sets up the schema and the others wait
+    with open(SCHEMA_LOCK_PATH, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def ensure_schema() -> bool:
+    """Create or upgrade the schema unless the database is already at `SCHEMA_VERSION`.
+
+    Usually this is a single `PRAGMA` read. Returns True when the schema was (re)created.
+    """
+    if schema_version() >= SCHEMA_VERSION:
+        return False
+    with schema_lock():
+        # Another worker may have finished while this one waited for the lock
+        if schema_version() >= SCHEMA_VERSION:
+            return False
+        with engine.begin() as connection:
+            # The driver doesn't open a transaction before DDL statements, every `CREATE` would be committed
+            # on its own. An explicit `BEGIN` commits the schema and `user_version` together:
+            # a failure halfway leaves the database as it was, and the next start sets it up again.
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            # Create all tables defined by the ORM models that don't exist yet,
+            # plus the indexes and triggers added by the `after_create` listener in `models.py`
+            models.Base.metadata.create_all(bind=connection)
+            connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        return True
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import os
+
+from database import AsyncSessionLocal
+from models import TODOS_STATS_REBUILD, Todos, TodosStats
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two reconciliations of `todos_stats`, `TODOS_STATS_RECONCILE_INTERVAL=0` turns them off
+STATS_RECONCILE_INTERVAL = float(os.environ.get("TODOS_STATS_RECONCILE_INTERVAL", 300))
+
+
+# Counters of the reconciliation job, exported on `/metrics`
+class ReconcileStats:
+    __slots__ = ("runs", "corrected", "failures")
+
+    def __init__(self):
+        self.runs = 0
+        # Number of (priority, complete) counts that were wrong and got fixed
+        self.corrected = 0
+        self.failures = 0
+
+
+reconcile_stats = ReconcileStats()
+
+
+async def reconcile_todo_stats() -> int:
+    """Compare `todos_stats` with a `GROUP BY` over `todos`, rebuild it if they differ.
+
+    Returns the number of counts that were wrong. The triggers update `todos_stats` in the same
+    transaction as every write, so this only finds drift caused by changes made around them
+    (e.g. a bulk import run with the triggers dropped, or a backup of `todos` restored on its own).
+    """
+    async with AsyncSessionLocal() as db:
+        # The driver only opens a transaction before a write, `BEGIN` opens it before the reads
+        # so that both see the same snapshot of the database. Otherwise a write committed between them
+        # would look like drift. If a write commits before the rebuild, the rebuild fails
+        # with "database is locked" instead of overwriting newer counts, and the next run retries.
+        await db.execute(text("BEGIN"))
+        actual = {
+            (priority, complete): count
+            for priority, complete, count in await db.execute(
+                select(Todos.priority, Todos.complete, func.count())
+                .where(Todos.priority.is_not(None), Todos.complete.is_not(None))
+                .group_by(Todos.priority, Todos.complete)
+            )
+        }
+        stored = {
+            (row.priority, row.complete): row.count
+            for row in await db.scalars(select(TodosStats).where(TodosStats.count != 0))
+        }
+        wrong = len(actual.keys() ^ stored.keys()) + sum(
+            actual[key] != stored[key] for key in actual.keys() & stored.keys()
+        )
+        if wrong:
+            for statement in TODOS_STATS_REBUILD:
+                await db.execute(text(statement))
+            await db.commit()
+        return wrong
+
+
+async def reconcile_periodically(interval: float = STATS_RECONCILE_INTERVAL) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            wrong = await reconcile_todo_stats()
+        except OperationalError:
+            # E.g. another connection wrote in between and the database is locked, next run will retry
+            reconcile_stats.failures += 1
+            logger.exception("Reconciliation of todos_stats failed")
+            continue
+        reconcile_stats.runs += 1
+        reconcile_stats.corrected += wrong
+        if wrong:
+            logger.warning("Fixed %d drifted counts in todos_stats", wrong)
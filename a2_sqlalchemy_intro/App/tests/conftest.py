@@ -0,0 +1,67 @@
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+APP_DIR = Path(__file__).resolve().parent.parent
+REPOSITORY_DIR = APP_DIR.parent.parent
+START_DIR = os.getcwd()
+
+# The app uses top-level imports (`from database import ...`), like when it's started from `App/`,
+# and the import time test reuses `benchmarks/import_time.py`
+for path in (APP_DIR, REPOSITORY_DIR):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+# The database URL is relative (`./todosapp.db`) and SQLAlchemy resolves it when the engines are created,
+# so the tests move to a temporary directory before anything imports the app, to get a database of their own
+WORKDIR = tempfile.mkdtemp(prefix="todos-tests-")
+os.chdir(WORKDIR)
+
+from database import async_engine, async_read_engine  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from main import app  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def workdir():
+    yield WORKDIR
+    os.chdir(START_DIR)
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+# Entering the client runs the app's lifespan, which creates the schema
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def make_todo(**values) -> dict:
+    return {
+        "title": "Buy groceries",
+        "description": "Milk and eggs",
+        "priority": 3,
+        "complete": False,
+        **values,
+    }
+
+
+# `(statement, parameters)` of every SQL statement sent to the database while the test runs
+@pytest.fixture
+def statements():
+    recorded = []
+
+    def record(connection, cursor, statement, parameters, context, executemany):
+        recorded.append((statement, parameters))
+
+    engines = {async_engine.sync_engine, async_read_engine.sync_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    yield recorded
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", record)
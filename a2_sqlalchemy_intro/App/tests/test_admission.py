@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from admission import ConcurrencyLimiter, admission_limiters
+
+
+@pytest.fixture
+def overloaded():
+    # No free slot and no room in the waiting line: every limited request is rejected right away
+    limiter = admission_limiters["read"]
+    limit, queue_size = limiter.limit, limiter.queue_size
+    limiter.limit = limiter.queue_size = 0
+    yield
+    limiter.limit, limiter.queue_size = limit, queue_size
+
+
+# A rejected request never reaches the router, the 503 is still recorded under its route
+def test_rejected_request_is_recorded_under_its_route(client, overloaded):
+    response = client.get("/todo/1")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+    metrics = client.get("/metrics").text
+    assert (
+        'http_responses_total{method="GET",route="/todo/{todo_id}",code="503"}'
+        in metrics
+    )
+    assert 'route="unmatched",code="503"' not in metrics
+
+
+def test_waiting_request_times_out():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, queue_size=1, timeout=0.01)
+        assert await limiter.acquire()
+        assert not await limiter.acquire()
+        assert limiter.stats() == {
+            "active": 1,
+            "queued": 0,
+            "admitted": 1,
+            "rejected": 0,
+            "timed_out": 1,
+        }
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+# Since Python 3.12 `wait_for` can raise `TimeoutError` after the slot was already handed to the waiter.
+# `wait_for` is replaced to make that race happen every time: the slot is released while waiting, then it times out.
+def test_timeout_racing_a_release_keeps_the_slot(monkeypatch):
+    limiter = ConcurrencyLimiter(limit=1, queue_size=1, timeout=1)
+
+    async def release_then_time_out(waiter, timeout):
+        limiter.release()
+        assert waiter.done()
+        raise asyncio.TimeoutError
+
+    async def scenario():
+        assert await limiter.acquire()
+        monkeypatch.setattr(asyncio, "wait_for", release_then_time_out)
+        # The handed over slot admits the request instead of being lost
+        assert await limiter.acquire()
+        monkeypatch.undo()
+        assert limiter.stats() == {
+            "active": 1,
+            "queued": 0,
+            "admitted": 2,
+            "rejected": 0,
+            "timed_out": 0,
+        }
+        limiter.release()
+        assert limiter.active == 0
+        assert await limiter.acquire()
+
+    asyncio.run(scenario())
+
+
+# Bulk transfers have a limiter of their own, so a long export doesn't take a slot of the short reads
+def test_transfers_use_their_own_limiter(client, overloaded):
+    assert client.get("/todos/export").status_code == 200
+    assert client.get("/todos/stats").status_code == 503
@@ -0,0 +1,156 @@
+import pytest
+from conftest import make_todo
+from database import async_engine
+from routers.todos import MAX_BULK_ITEMS
+from sqlalchemy import event
+
+
+def create_todos(client, count: int) -> list[int]:
+    response = client.post("/todos/bulk", json=[make_todo()] * count)
+    assert response.status_code == 201
+    return [result["id"] for result in response.json()]
+
+
+def total_todos(client) -> int:
+    return client.get("/todos/stats").json()["total"]
+
+
+class InjectedError(Exception):
+    pass
+
+
+# Makes the statement starting with `prefix` fail in the database, like a disk error would
+@pytest.fixture
+def fail_statement():
+    prefixes = []
+
+    def fail(connection, cursor, statement, parameters, context, executemany):
+        if statement.startswith(tuple(prefixes)):
+            raise InjectedError(statement)
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", fail)
+    yield prefixes.append
+    event.remove(async_engine.sync_engine, "before_cursor_execute", fail)
+
+
+# The ids are returned in the order of the request, every todo is inserted
+def test_bulk_create_returns_ids_in_order(client):
+    before = total_todos(client)
+    titles = [f"Bulk todo {i}" for i in range(5)]
+    response = client.post("/todos/bulk", json=[make_todo(title=t) for t in titles])
+    assert response.status_code == 201
+    results = response.json()
+    assert [result["status"] for result in results] == ["created"] * 5
+    todo_ids = [result["id"] for result in results]
+    assert todo_ids == sorted(todo_ids)
+    assert [client.get(f"/todo/{i}").json()["title"] for i in todo_ids] == titles
+    assert total_todos(client) == before + 5
+
+
+# One invalid item rejects the whole request, nothing is inserted
+@pytest.mark.parametrize(
+    "todos",
+    [
+        [make_todo(), make_todo(priority=6)],
+        [make_todo(), {"title": "No description"}],
+        [],
+        [make_todo()] * (MAX_BULK_ITEMS + 1),
+    ],
+    ids=["invalid-priority", "missing-field", "empty", "too-many"],
+)
+def test_bulk_create_rejects_invalid_request(client, todos):
+    before = total_todos(client)
+    assert client.post("/todos/bulk", json=todos).status_code == 422
+    assert total_todos(client) == before
+
+
+def test_bulk_update_reports_every_id(client):
+    first, second = create_todos(client, 2)
+    response = client.put(
+        "/todos/bulk",
+        json=[
+            {"id": first, **make_todo(title="First updated")},
+            {"id": 999999, **make_todo()},
+            {"id": second, **make_todo(title="Second updated", complete=True)},
+        ],
+    )
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id": first, "status": "updated"},
+        {"id": 999999, "status": "not_found"},
+        {"id": second, "status": "updated"},
+    ]
+    assert client.get(f"/todo/{first}").json()["title"] == "First updated"
+    assert client.get(f"/todo/{second}").json()["complete"] is True
+
+
+# The write lock is taken before the ids are looked up, the lookup and the update are one transaction
+def test_bulk_update_locks_before_reading(client, statements):
+    [todo_id] = create_todos(client, 1)
+    statements.clear()
+    client.put("/todos/bulk", json=[{"id": todo_id, **make_todo()}])
+    sql = [statement.split()[0] for statement, _ in statements]
+    assert sql[:3] == ["BEGIN", "SELECT", "UPDATE"]
+    assert statements[0][0] == "BEGIN IMMEDIATE"
+
+
+# Without any existing todo nothing is written, and the transaction doesn't keep the write lock
+def test_bulk_update_of_missing_todos_releases_the_lock(client):
+    response = client.put("/todos/bulk", json=[{"id": 999999, **make_todo()}])
+    assert response.json() == [{"id": 999999, "status": "not_found"}]
+    assert len(create_todos(client, 1)) == 1
+
+
+def test_bulk_update_rejects_invalid_item(client):
+    [todo_id] = create_todos(client, 1)
+    response = client.put(
+        "/todos/bulk",
+        json=[
+            {"id": todo_id, **make_todo(title="Not applied")},
+            {"id": todo_id, **make_todo(priority=0)},
+        ],
+    )
+    assert response.status_code == 422
+    assert client.get(f"/todo/{todo_id}").json()["title"] == "Buy groceries"
+
+
+# A failure in the database rolls the whole batch back and releases the write lock
+def test_bulk_update_error_is_rolled_back(client, fail_statement):
+    first, second = create_todos(client, 2)
+    stats = client.get("/todos/stats").json()
+    fail_statement("UPDATE todos")
+    with pytest.raises(InjectedError):
+        client.put(
+            "/todos/bulk",
+            json=[
+                {"id": first, **make_todo(title="Not applied", complete=True)},
+                {"id": second, **make_todo(title="Not applied", complete=True)},
+            ],
+        )
+    for todo_id in (first, second):
+        assert client.get(f"/todo/{todo_id}").json()["title"] == "Buy groceries"
+    assert client.get("/todos/stats").json() == stats
+    assert len(create_todos(client, 1)) == 1
+
+
+def test_bulk_delete_reports_every_id(client):
+    first, second = create_todos(client, 2)
+    response = client.request("DELETE", "/todos/bulk", json=[first, 999999, second])
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id": first, "status": "deleted"},
+        {"id": 999999, "status": "not_found"},
+        {"id": second, "status": "deleted"},
+    ]
+    assert client.get(f"/todo/{first}").status_code == 404
+
+
+# A repeated id deletes one row, so only its first occurrence is reported as deleted
+def test_bulk_delete_repeated_id(client):
+    [todo_id] = create_todos(client, 1)
+    response = client.request("DELETE", "/todos/bulk", json=[todo_id, todo_id])
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id": todo_id, "status": "deleted"},
+        {"id": todo_id, "status": "not_found"},
+    ]
@@ -0,0 +1,157 @@
+import asyncio
+from types import SimpleNamespace
+
+import cache
+import pytest
+from cache import LRUCache, ReadThroughCache, todo_cache
+from conftest import make_todo
+from write_queue import todo_writer
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # `LRUCache` reads the time from `now[0]`, which the test moves forward
+    now = [0.0]
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+# Concurrent misses for the same key share a single call of the loader
+def test_concurrent_misses_are_coalesced():
+    calls = []
+
+    async def scenario():
+        read_through = ReadThroughCache(LRUCache(max_size=8, ttl=30))
+        release = asyncio.Event()
+
+        async def load():
+            calls.append(1)
+            await release.wait()
+            return {"id": 1}
+
+        readers = [
+            asyncio.create_task(read_through.get_or_load(1, load)) for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        assert await asyncio.gather(*readers) == [{"id": 1}] * 5
+        assert read_through.stats()["coalesced"] == 4
+        # The result was cached, the next read doesn't call the loader
+        assert await read_through.get_or_load(1, load) == {"id": 1}
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
+
+
+# A value loaded before an invalidation may be stale, it's returned to its readers but not cached
+def test_invalidation_while_loading_is_not_cached():
+    async def scenario():
+        read_through = ReadThroughCache(LRUCache(max_size=8, ttl=30))
+
+        async def load_then_change():
+            await read_through.invalidate(1)
+            return {"id": 1, "title": "old"}
+
+        assert await read_through.get_or_load(1, load_then_change) == {
+            "id": 1,
+            "title": "old",
+        }
+        assert await read_through.backend.get(1) is None
+
+    asyncio.run(scenario())
+
+
+def test_entries_expire_after_ttl(clock):
+    async def scenario():
+        lru = LRUCache(max_size=8, ttl=30)
+        await lru.set(1, "value")
+        clock[0] = 29.9
+        assert await lru.get(1) == "value"
+        clock[0] = 30.1
+        assert await lru.get(1) is None
+        assert lru.stats()["expirations"] == 1
+        assert lru.stats()["size"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_least_recently_used_is_evicted():
+    async def scenario():
+        lru = LRUCache(max_size=2, ttl=30)
+        await lru.set(1, "one")
+        await lru.set(2, "two")
+        await lru.get(1)
+        await lru.set(3, "three")
+        assert await lru.get(2) is None
+        assert await lru.get(1) == "one"
+        assert lru.stats()["evictions"] == 1
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture(params=[False, True], ids=["per-request", "group-commit"])
+def group_commit(request):
+    enabled, todo_writer.enabled = todo_writer.enabled, request.param
+    yield
+    todo_writer.enabled = enabled
+
+
+@pytest.fixture
+def enabled_cache(monkeypatch):
+    # The cache is off by default (`TODOS_CACHE_SIZE=0`), the tests below turn it on
+    monkeypatch.setattr(todo_cache.backend, "max_size", 1024)
+    yield
+    asyncio.run(todo_cache.backend.clear())
+
+
+# Unless enabled, every read goes to the database
+def test_cache_is_off_by_default(client):
+    todo_id = client.post("/todos/bulk", json=[make_todo()]).json()[0]["id"]
+    client.get(f"/todo/{todo_id}")
+    hits = todo_cache.stats()["hits"]
+    assert client.get(f"/todo/{todo_id}").status_code == 200
+    assert todo_cache.stats()["hits"] == hits
+    assert todo_cache.stats()["size"] == 0
+
+
+@pytest.fixture
+def cached_todo(client, enabled_cache) -> tuple[int, str]:
+    todo_id = client.post("/todos/bulk", json=[make_todo()]).json()[0]["id"]
+    response = client.get(f"/todo/{todo_id}")
+    assert response.status_code == 200
+    # The next read is served by the cache
+    hits = todo_cache.stats()["hits"]
+    assert client.get(f"/todo/{todo_id}").headers["etag"] == response.headers["etag"]
+    assert todo_cache.stats()["hits"] == hits + 1
+    return todo_id, response.headers["etag"]
+
+
+def test_update_invalidates_cached_todo(client, group_commit, cached_todo):
+    todo_id, etag = cached_todo
+    response = client.put(f"/todo/{todo_id}", json=make_todo(title="Buy bread"))
+    assert response.status_code == 204
+
+    response = client.get(f"/todo/{todo_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Buy bread"
+    assert response.headers["etag"] != etag
+
+
+def test_bulk_update_invalidates_cached_todo(client, cached_todo):
+    todo_id, _ = cached_todo
+    response = client.put(
+        "/todos/bulk", json=[{"id": todo_id, **make_todo(title="Buy bread")}]
+    )
+    assert response.status_code == 200
+    assert client.get(f"/todo/{todo_id}").json()["title"] == "Buy bread"
+
+
+@pytest.mark.parametrize("bulk", [False, True], ids=["single", "bulk"])
+def test_delete_invalidates_cached_todo(client, cached_todo, bulk):
+    todo_id, _ = cached_todo
+    if bulk:
+        response = client.request("DELETE", "/todos/bulk", json=[todo_id])
+        assert response.status_code == 200
+    else:
+        assert client.delete(f"/todo/{todo_id}").status_code == 204
+    assert client.get(f"/todo/{todo_id}").status_code == 404
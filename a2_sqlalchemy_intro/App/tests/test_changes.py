@@ -0,0 +1,89 @@
+from collections import deque
+
+import pytest
+from changes import todo_changes
+from conftest import make_todo
+from fastapi.websockets import WebSocketDisconnect
+from uvicorn.protocols.utils import ClientDisconnected
+
+
+def create_todo(client) -> int:
+    return client.post("/todos/bulk", json=[make_todo()]).json()[0]["id"]
+
+
+def test_websocket_sends_changes(client):
+    with client.websocket_connect("/todos/changes/ws") as websocket:
+        todo_id = create_todo(client)
+        change = websocket.receive_json()
+    assert change["type"] == "created"
+    assert change["ids"] == [todo_id]
+    assert change["id"].startswith(f"{todo_changes.epoch}-")
+    # The subscription ends with the connection
+    assert todo_changes.stats()["subscribers"] == 0
+
+
+# A client reconnecting with the id of the last change it received first gets the changes it missed
+def test_websocket_resumes_after_last_change(client):
+    with client.websocket_connect("/todos/changes/ws") as websocket:
+        create_todo(client)
+        last_id = websocket.receive_json()["id"]
+
+    missed_ids = [create_todo(client), create_todo(client)]
+    with client.websocket_connect(f"/todos/changes/ws?after={last_id}") as websocket:
+        missed = [websocket.receive_json(), websocket.receive_json()]
+        todo_id = create_todo(client)
+        new = websocket.receive_json()
+    assert [change["ids"] for change in missed] == [[todo_id] for todo_id in missed_ids]
+    assert new["ids"] == [todo_id]
+
+
+@pytest.fixture
+def short_backlog(monkeypatch):
+    monkeypatch.setattr(todo_changes, "backlog", deque(maxlen=1))
+
+
+# Ids the feed can't resume from get a `reset`: another process (or a restart), a change that isn't
+# in the backlog anymore, or an id that doesn't exist yet
+@pytest.mark.parametrize("after", ["unknown", "1-1", "expired", "future"])
+def test_websocket_resets_unknown_or_expired_id(client, short_backlog, after):
+    with client.websocket_connect("/todos/changes/ws") as websocket:
+        create_todo(client)
+        expired_id = websocket.receive_json()["id"]
+    create_todo(client)
+    create_todo(client)
+    after = {
+        "expired": expired_id,
+        "future": f"{todo_changes.epoch}-{todo_changes.sequence + 1}",
+    }.get(after, after)
+
+    with client.websocket_connect(f"/todos/changes/ws?after={after}") as websocket:
+        change = websocket.receive_json()
+    assert change == {"id": "", "type": "reset"}
+
+
+# An error sending the changes isn't lost in the background task, it's raised by the endpoint
+def test_websocket_send_error_is_raised(client, monkeypatch):
+    async def fail(subscription):
+        raise RuntimeError("send failed")
+
+    monkeypatch.setattr("changes.Subscription.next", fail)
+    with pytest.raises(RuntimeError, match="send failed"):
+        with client.websocket_connect("/todos/changes/ws"):
+            pass
+    assert todo_changes.stats()["subscribers"] == 0
+
+
+# A client that disconnects while a change is being sent to it ends the connection quietly
+@pytest.mark.parametrize(
+    "error",
+    [WebSocketDisconnect(code=1006), ClientDisconnected()],
+    ids=lambda error: type(error).__name__,
+)
+def test_websocket_send_to_disconnected_client_is_ignored(client, monkeypatch, error):
+    async def disconnected(subscription):
+        raise error
+
+    monkeypatch.setattr("changes.Subscription.next", disconnected)
+    with client.websocket_connect("/todos/changes/ws"):
+        pass
+    assert todo_changes.stats()["subscribers"] == 0
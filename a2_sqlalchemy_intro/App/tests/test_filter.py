@@ -0,0 +1,69 @@
+import pytest
+from database import engine
+from models import Todos
+from sqlalchemy import delete, insert
+
+PREFIX = "Null priority"
+
+
+@pytest.fixture(scope="module")
+def todos(client):
+    # Rows written before `TodoRequest` validated the priority may hold NULL, the API can't create them
+    rows = [
+        {
+            "title": f"{PREFIX} {i}",
+            "description": "Description",
+            "priority": None if i % 2 else i % 5 + 1,
+            "complete": False,
+        }
+        for i in range(11)
+    ]
+    with engine.begin() as connection:
+        connection.execute(insert(Todos), rows)
+    items = client.get(
+        "/todos/filter", params={"title_prefix": PREFIX, "limit": 1000}
+    ).json()["items"]
+    yield [(item["priority"], item["id"]) for item in items]
+    # Other tests export and re-import every todo, which rejects NULL priorities
+    with engine.begin() as connection:
+        connection.execute(delete(Todos).where(Todos.title.startswith(PREFIX)))
+
+
+def page_through(client, sort: str) -> list[tuple]:
+    params = {"title_prefix": PREFIX, "sort": sort, "limit": 2}
+    keys = []
+    while True:
+        response = client.get("/todos/filter", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        keys += [(item["priority"], item["id"]) for item in page["items"]]
+        if page["next_cursor"] is None:
+            return keys
+        params["cursor"] = page["next_cursor"]
+
+
+# NULL priorities come first in ascending order and last in descending order (like SQLite sorts them),
+# and pages ending on one of them continue with the rest
+def test_paging_by_priority_with_nulls(client, todos):
+    nulls = sorted(key for key in todos if key[0] is None)
+    others = sorted(key for key in todos if key[0] is not None)
+    assert len(todos) == 11
+    assert page_through(client, "priority") == nulls + others
+    assert page_through(client, "-priority") == others[::-1] + nulls[::-1]
+
+
+def test_null_priority_cursor(client, todos):
+    response = client.get(
+        "/todos/filter",
+        params={"title_prefix": PREFIX, "sort": "priority", "limit": 1},
+    )
+    first_null = min(todo_id for priority, todo_id in todos if priority is None)
+    assert response.json()["next_cursor"] == f"null:{first_null}"
+
+
+@pytest.mark.parametrize("cursor", ["null", "null:x", "1:null"])
+def test_invalid_null_cursor(client, cursor):
+    response = client.get(
+        "/todos/filter", params={"sort": "priority", "cursor": cursor}
+    )
+    assert response.status_code == 422
@@ -0,0 +1,10 @@
+from benchmarks.import_time import IMPORT_TIME_BUDGET_MS, measure_best_import
+
+
+# Importing the app (what every worker does on startup) stays within the cold-start budget,
+# measured with `python -X importtime` in fresh interpreters, and doesn't touch the database:
+# the schema is set up by the lifespan (see `schema.py`)
+def test_import_time_budget():
+    times, touched_database = measure_best_import(runs=3)
+    assert not touched_database
+    assert times["main"][1] / 1000 <= IMPORT_TIME_BUDGET_MS
@@ -0,0 +1,57 @@
+import pytest
+from conftest import make_todo
+from database import engine
+
+
+@pytest.fixture(scope="module", autouse=True)
+def todos(client):
+    todos = [
+        make_todo(title=f"{word} {i}", priority=i % 5 + 1, complete=i % 2 == 0)
+        for i, word in enumerate(["Buy", "Call", "Write", "Read"] * 50)
+    ]
+    client.post("/todos/bulk", json=todos).raise_for_status()
+
+
+def query_plan(statements) -> list[str]:
+    # The `SELECT` sent by the filter endpoint, explained on a connection of its own
+    [(statement, parameters)] = [
+        (statement, parameters)
+        for statement, parameters in statements
+        if statement.lstrip().startswith("SELECT")
+    ]
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row.detail for row in rows]
+
+
+# Every filter is served by an index range scan (see `filter_todos`):
+# no full table scan, and the rows come out of the index already in order
+@pytest.mark.parametrize(
+    "params, index",
+    [
+        ({"complete": False, "priority": 3}, "ix_todos_complete_priority_id"),
+        ({"complete": True, "sort": "priority"}, "ix_todos_complete_priority_id"),
+        ({"complete": True, "sort": "-priority"}, "ix_todos_complete_priority_id"),
+        ({"priority": 2}, "ix_todos_priority_id"),
+        ({"priority": 2, "sort": "-id", "cursor": "100"}, "ix_todos_priority_id"),
+        ({"title_prefix": "Buy", "sort": "id"}, "ix_todos_title"),
+    ],
+)
+def test_filter_uses_index(client, statements, params, index):
+    response = client.get("/todos/filter", params=params)
+    assert response.status_code == 200
+    assert response.json()["items"]
+
+    plan = query_plan(statements)
+    assert plan[0].startswith(f"SEARCH todos USING INDEX {index} ")
+    assert not any(step.startswith("SCAN") for step in plan)
+    # The title index returns the matches in title order, only those are sorted by id afterwards
+    if "title_prefix" not in params:
+        assert not any("TEMP B-TREE" in step for step in plan)
+
+
+@pytest.mark.parametrize("title_prefix", ["\U0010ffff", "Buy\U0010ffff", "퟿"])
+def test_filter_title_prefix_without_upper_bound(client, title_prefix):
+    response = client.get("/todos/filter", params={"title_prefix": title_prefix})
+    assert response.status_code == 200
+    assert response.json()["items"] == []
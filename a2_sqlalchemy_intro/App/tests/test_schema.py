@@ -0,0 +1,51 @@
+import models
+import pytest
+import schema
+from sqlalchemy import create_engine
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.fixture
+def new_database(tmp_path, monkeypatch):
+    # `ensure_schema` on an empty database of its own
+    engine = create_engine(f"sqlite:///{tmp_path / 'todosapp.db'}")
+    monkeypatch.setattr(schema, "engine", engine)
+    monkeypatch.setattr(schema, "SCHEMA_LOCK_PATH", str(tmp_path / "schema-lock"))
+    yield engine
+    engine.dispose()
+
+
+def table_names(engine) -> set[str]:
+    with engine.connect() as connection:
+        query = "SELECT name FROM sqlite_master WHERE type = 'table'"
+        return set(connection.exec_driver_sql(query).scalars())
+
+
+def test_schema_is_created_once(new_database):
+    assert schema.ensure_schema()
+    assert {"todos", "todos_version", "todos_stats"} <= table_names(new_database)
+    assert schema.schema_version() == schema.SCHEMA_VERSION
+    assert not schema.ensure_schema()
+
+
+# The tables and `user_version` are committed together: a failure halfway leaves no table behind
+def test_failed_setup_is_rolled_back(new_database, monkeypatch):
+    create_all = models.Base.metadata.create_all
+
+    def create_all_then_fail(bind):
+        create_all(bind=bind)
+        raise Interrupted
+
+    monkeypatch.setattr(models.Base.metadata, "create_all", create_all_then_fail)
+    with pytest.raises(Interrupted):
+        schema.ensure_schema()
+    assert table_names(new_database) == set()
+    assert schema.schema_version() == 0
+
+    # The next start sets it up again
+    monkeypatch.setattr(models.Base.metadata, "create_all", create_all)
+    assert schema.ensure_schema()
+    assert "todos" in table_names(new_database)
@@ -0,0 +1,44 @@
+import pytest
+from conftest import make_todo
+from write_queue import todo_writer
+
+
+# Updating or deleting a todo sends a single `UPDATE` / `DELETE` statement, without loading the todo first.
+# A missing todo is noticed from the number of affected rows, so a 404 costs the same single statement.
+@pytest.fixture(autouse=True)
+def per_request_commits():
+    # With group commit the write would run in `todo_writer`'s own session, counted the same way
+    # but only once the batch is flushed
+    enabled, todo_writer.enabled = todo_writer.enabled, False
+    yield
+    todo_writer.enabled = enabled
+
+
+@pytest.fixture
+def todo_id(client) -> int:
+    response = client.post("/todos/bulk", json=[make_todo()])
+    return response.json()[0]["id"]
+
+
+def test_update_runs_one_statement(client, todo_id, statements):
+    response = client.put(f"/todo/{todo_id}", json=make_todo(title="Buy bread"))
+    assert response.status_code == 204
+    assert [statement.split()[0] for statement, _ in statements] == ["UPDATE"]
+
+
+def test_update_missing_todo_runs_one_statement(client, statements):
+    response = client.put("/todo/999999", json=make_todo())
+    assert response.status_code == 404
+    assert [statement.split()[0] for statement, _ in statements] == ["UPDATE"]
+
+
+def test_delete_runs_one_statement(client, todo_id, statements):
+    response = client.delete(f"/todo/{todo_id}")
+    assert response.status_code == 204
+    assert [statement.split()[0] for statement, _ in statements] == ["DELETE"]
+
+
+def test_delete_missing_todo_runs_one_statement(client, statements):
+    response = client.delete("/todo/999999")
+    assert response.status_code == 404
+    assert [statement.split()[0] for statement, _ in statements] == ["DELETE"]
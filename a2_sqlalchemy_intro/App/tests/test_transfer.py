@@ -0,0 +1,135 @@
+import cli
+import orjson
+import pytest
+import transfer
+from conftest import make_todo
+
+CSV_HEADER = "title,description,priority,complete\n"
+
+
+def exported_todos(client) -> list[dict]:
+    response = client.get("/todos/export", params={"format": "ndjson"})
+    assert response.status_code == 200
+    return [orjson.loads(line) for line in response.content.splitlines()]
+
+
+def without_ids(todos: list[dict]) -> list[dict]:
+    return [
+        {key: value for key, value in todo.items() if key != "id"} for todo in todos
+    ]
+
+
+# Exporting all todos and importing the file adds a copy of every todo, with new ids
+@pytest.mark.parametrize("file_format", ["ndjson", "csv"])
+def test_export_import_round_trip(client, file_format):
+    todos = [
+        make_todo(title='Quote " and, comma', description='Line one\nline "two"'),
+        make_todo(title="Ünïcödé ✓", priority=5, complete=True),
+    ]
+    client.post("/todos/bulk", json=todos).raise_for_status()
+    before = exported_todos(client)
+
+    exported = client.get("/todos/export", params={"format": file_format}).content
+    response = client.post(
+        "/todos/import", params={"format": file_format}, content=exported
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["imported"], report["rejected"]) == (len(before), 0)
+
+    after = exported_todos(client)
+    assert after[: len(before)] == before
+    copies = after[len(before) :]
+    assert without_ids(copies) == without_ids(before)
+    assert min(todo["id"] for todo in copies) > max(todo["id"] for todo in before)
+
+
+# Invalid rows are rejected with their line number, only the valid ones are inserted
+@pytest.mark.parametrize(
+    "file_format, content",
+    [
+        (
+            "csv",
+            CSV_HEADER
+            + "Valid csv 1,Description,3,false\n"
+            + "No,Title too short,3,false\n"
+            + "Invalid csv priority,Description,9,false\n"
+            + "Missing,values\n"
+            + "Valid csv 2,Description,2,true\n",
+        ),
+        (
+            "ndjson",
+            '{"title": "Valid ndjson 1", "description": "Description", "priority": 3, "complete": false}\n'
+            + '{"title": "No", "description": "Title too short", "priority": 3, "complete": false}\n'
+            + '{"title": "Invalid ndjson priority", "description": "Description", "priority": 9,\n'
+            + '{"title": "Missing values"}\n'
+            + '{"title": "Valid ndjson 2", "description": "Description", "priority": 2, "complete": true}\n',
+        ),
+    ],
+)
+def test_invalid_rows_are_rejected_with_their_line(client, file_format, content):
+    first_line = 2 if file_format == "csv" else 1
+    response = client.post(
+        "/todos/import", params={"format": file_format}, content=content
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["imported"], report["rejected"]) == (2, 3)
+    assert [error["line"] for error in report["errors"]] == [
+        first_line + 1,
+        first_line + 2,
+        first_line + 3,
+    ]
+
+    titles = {todo["title"] for todo in exported_todos(client)}
+    assert {f"Valid {file_format} 1", f"Valid {file_format} 2"} <= titles
+    assert not titles & {
+        "No",
+        f"Invalid {file_format} priority",
+        "Missing",
+        "Missing values",
+    }
+
+
+# When the input can't be read any further, the valid rows read since the last committed chunk are dropped:
+# the 400 response reports exactly what was imported
+def test_unreadable_input_does_not_commit_the_pending_chunk(client, monkeypatch):
+    monkeypatch.setattr(transfer, "MAX_LINE_LENGTH", 100)
+    before = exported_todos(client)
+    # Sent in two chunks, so the valid row is read and validated before the long line arrives
+    content = [
+        (CSV_HEADER + "Pending todo,Description,3,false\n").encode(),
+        b"x" * 200,
+    ]
+
+    response = client.post(
+        "/todos/import", params={"format": "csv"}, content=iter(content)
+    )
+    assert response.status_code == 400
+    detail = response.json()["detail"]
+    assert detail["error"] == "Line longer than 100 bytes"
+    assert detail["report"]["imported"] == 0
+    assert exported_todos(client) == before
+
+
+def test_undecodable_csv_line_is_rejected(client):
+    content = (
+        CSV_HEADER.encode()
+        + b"Caf\xe9 todo,Description,3,false\n"
+        + b"Valid latin todo,Description,3,false\n"
+    )
+    response = client.post("/todos/import", params={"format": "csv"}, content=content)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["imported"], report["rejected"]) == (1, 1)
+    assert report["errors"][0]["line"] == 2
+
+
+# `cli.py` uses the chunk and page sizes configured for the routes unless given others
+def test_cli_defaults_follow_transfer_settings(monkeypatch):
+    monkeypatch.setattr(transfer, "IMPORT_CHUNK_SIZE", 250)
+    monkeypatch.setattr(transfer, "EXPORT_PAGE_SIZE", 500)
+    parser = cli.build_parser()
+    assert parser.parse_args(["import", "todos.ndjson"]).chunk_size == 250
+    assert parser.parse_args(["export"]).page_size == 500
+    assert parser.parse_args(["import", "-", "--chunk-size", "10"]).chunk_size == 10
@@ -0,0 +1,96 @@
+import asyncio
+
+from models import Base, Todos
+from routers.todos import insert_todo
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from write_queue import GroupCommitWriter
+
+
+class Rejected(Exception):
+    pass
+
+
+def values(title: str) -> dict:
+    return {"title": title, "description": "Milk and eggs", "priority": 3}
+
+
+def failing_insert(title: str):
+    # Inserts a todo, then fails: the insert must not be committed
+    async def write(db) -> int:
+        await insert_todo(values(title))(db)
+        raise Rejected(title)
+
+    return write
+
+
+# Runs `scenario(writer, commits)` against a database of its own,
+# `commits` counts the transactions committed by the writer
+def run_with_writer(tmp_path, scenario):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'todos.db'}")
+        commits = []
+        event.listen(engine.sync_engine, "commit", lambda connection: commits.append(1))
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        commits.clear()
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        writer = GroupCommitWriter(
+            session_factory, enabled=True, max_batch=64, max_delay=0.05
+        )
+        try:
+            await scenario(writer, commits)
+            async with session_factory() as db:
+                return (await db.scalars(select(Todos.title).order_by(Todos.id))).all()
+        finally:
+            await writer.stop()
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_concurrent_writes_share_one_commit(tmp_path):
+    async def scenario(writer, commits):
+        todo_ids = await asyncio.gather(
+            *(writer.submit(insert_todo(values(f"Todo {i}"))) for i in range(10))
+        )
+        assert len(set(todo_ids)) == 10
+        assert writer.stats() == {"batches": 1, "writes": 10, "retried_batches": 0}
+        assert len(commits) == 1
+
+    titles = run_with_writer(tmp_path, scenario)
+    assert titles == [f"Todo {i}" for i in range(10)]
+
+
+# A failing write fails its own request, the other writes of its batch are still committed
+def test_failing_write_only_fails_its_caller(tmp_path):
+    async def scenario(writer, commits):
+        results = await asyncio.gather(
+            writer.submit(insert_todo(values("Todo 0"))),
+            writer.submit(failing_insert("Bad todo")),
+            writer.submit(insert_todo(values("Todo 2"))),
+            return_exceptions=True,
+        )
+        assert isinstance(results[0], int) and isinstance(results[2], int)
+        assert isinstance(results[1], Rejected)
+        assert writer.stats() == {"batches": 1, "writes": 3, "retried_batches": 1}
+        # The batch was rolled back and its writes retried one transaction each
+        assert len(commits) == 2
+
+    assert run_with_writer(tmp_path, scenario) == ["Todo 0", "Todo 2"]
+
+
+# `stop` commits the writes still waiting in the queue
+def test_stop_commits_queued_writes(tmp_path):
+    async def scenario(writer, commits):
+        pending = [
+            asyncio.create_task(writer.submit(insert_todo(values(f"Todo {i}"))))
+            for i in range(3)
+        ]
+        await asyncio.sleep(0)
+        await writer.stop()
+        assert all(task.done() for task in pending)
+        async with writer.session_factory() as db:
+            assert await db.scalar(select(func.count()).select_from(Todos)) == 3
+
+    assert len(run_with_writer(tmp_path, scenario)) == 3
@@ -0,0 +1,215 @@
+import csv
+import io
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Literal, Optional
+
+import orjson
+from database import AsyncReadSessionLocal, AsyncSessionLocal
+from models import Todos
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, select
+
+# Streaming import and export of todos, used by `POST /todos/import`, `GET /todos/export` and `cli.py`.
+# Both directions work on a bounded number of rows at a time, so memory use doesn't depend on the size of the data:
+# - import reads the input as a stream of bytes, splits it into records, validates `IMPORT_CHUNK_SIZE`
+#   of them and inserts them in one "executemany" batch and one transaction before reading on
+# - export reads `EXPORT_PAGE_SIZE` rows per query with keyset pagination (`WHERE id > ?`),
+#   so no read transaction stays open for the whole export
+# Formats:
+# - NDJSON: one JSON object per line
+# - CSV: a header line with the column names, then one todo per line
+# Exported files include the `id` column, imports ignore it (the database assigns new ids).
+IMPORT_CHUNK_SIZE = int(os.environ.get("TODOS_IMPORT_CHUNK_SIZE", 1000))
+EXPORT_PAGE_SIZE = int(os.environ.get("TODOS_EXPORT_PAGE_SIZE", 1000))
+EXPORT_COLUMNS = ("id", "title", "description", "priority", "complete")
+# A longer line is rejected, otherwise a file without line breaks would be buffered whole
+MAX_LINE_LENGTH = 1 << 20
+# Only the first errors are listed in the report, the others are only counted
+MAX_REPORTED_ERRORS = 100
+
+FileFormat = Literal["ndjson", "csv"]
+
+
+# The input can't be read any further, e.g. a line is too long.
+# `report` is set by `import_todos` to the report so far: the chunks committed before the error stay imported.
+class TransferFormatError(ValueError):
+    report: Optional["TodoImportReport"] = None
+
+
+class TodoImportError(BaseModel):
+    line: int
+    error: str
+
+
+class TodoImportReport(BaseModel):
+    imported: int = 0
+    rejected: int = 0
+    errors: list[TodoImportError] = []
+    seconds: float = 0.0
+    rows_per_second: float = 0.0
+
+
+async def read_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a stream of byte chunks into lines, without the line breaks."""
+    pending = b""
+    async for chunk in chunks:
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        if len(pending) > MAX_LINE_LENGTH:
+            raise TransferFormatError(f"Line longer than {MAX_LINE_LENGTH} bytes")
+        for line in lines:
+            yield line.removesuffix(b"\r")
+    if pending:
+        yield pending.removesuffix(b"\r")
+
+
+async def parse_ndjson(
+    chunks: AsyncIterator[bytes],
+) -> AsyncIterator[tuple[int, object]]:
+    """Yield `(line number, record)`, where record is the parsed object or the parsing error."""
+    line_number = 0
+    async for line in read_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_number, orjson.loads(line)
+        except orjson.JSONDecodeError as error:
+            yield line_number, error
+
+
+async def parse_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, object]]:
+    """Yield `(line number, record)` for every CSV record, as a dict keyed by the header's column names.
+
+    A quoted value may contain line breaks: lines are joined until the number of quotes is even
+    (an escaped quote is written `""`, so it never changes the parity).
+    """
+    header = None
+    record_lines = []
+    line_number = first_line = 0
+    async for line in read_lines(chunks):
+        line_number += 1
+        if not record_lines:
+            first_line = line_number
+        try:
+            text = line.decode("utf-8-sig" if line_number == 1 else "utf-8")
+        except UnicodeDecodeError as error:
+            if header is None:
+                raise TransferFormatError(f"Header on line {first_line}: {error}")
+            # The record holding the line is rejected, reading goes on with the next line
+            record_lines = []
+            yield first_line, error
+            continue
+        record_lines.append(text)
+        record = "\n".join(record_lines)
+        if record.count('"') % 2:
+            if len(record) > MAX_LINE_LENGTH:
+                raise TransferFormatError(f"Unterminated quote on line {first_line}")
+            continue
+        record_lines = []
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = values
+        elif len(values) != len(header):
+            yield first_line, ValueError(
+                f"Expected {len(header)} values, found {len(values)}"
+            )
+        else:
+            yield first_line, dict(zip(header, values))
+    if record_lines:
+        yield first_line, ValueError("Unterminated quote")
+
+
+PARSERS = {"ndjson": parse_ndjson, "csv": parse_csv}
+
+
+async def import_todos(
+    chunks: AsyncIterator[bytes],
+    file_format: FileFormat,
+    model: type[BaseModel],
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+    on_chunk: Optional[Callable[[TodoImportReport, list[int]], Awaitable[None]]] = None,
+) -> TodoImportReport:
+    """Validate every record with `model` and insert the valid ones, `chunk_size` at a time.
+
+    Invalid records are skipped and reported, they don't stop the import.
+    Every chunk is committed on its own, so a failure halfway keeps the chunks inserted before it;
+    when the failure is a `TransferFormatError`, its `report` tells how many rows were imported.
+    `on_chunk` is awaited after every committed chunk with the report so far and the new ids.
+    """
+    report = TodoImportReport()
+    start = time.perf_counter()
+    rows = []
+
+    async def flush():
+        # `sort_by_parameter_order=True` returns the ids in the order of `rows`
+        query = insert(Todos).returning(Todos.id, sort_by_parameter_order=True)
+        async with AsyncSessionLocal() as db:
+            todo_ids = list((await db.scalars(query, rows)).all())
+            await db.commit()
+        report.imported += len(rows)
+        rows.clear()
+        report.seconds = time.perf_counter() - start
+        report.rows_per_second = report.imported / report.seconds
+        if on_chunk is not None:
+            await on_chunk(report, todo_ids)
+
+    try:
+        async for line_number, record in PARSERS[file_format](chunks):
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                rows.append(model.model_validate(record).model_dump())
+            except (ValueError, ValidationError) as error:
+                report.rejected += 1
+                if len(report.errors) < MAX_REPORTED_ERRORS:
+                    report.errors.append(
+                        TodoImportError(line=line_number, error=str(error))
+                    )
+                continue
+            if len(rows) >= chunk_size:
+                await flush()
+    except TransferFormatError as error:
+        # The valid rows read before the error are not inserted, only the committed chunks count
+        error.report = finish_report(report, start)
+        raise
+    if rows:
+        await flush()
+    return finish_report(report, start)
+
+
+def finish_report(report: TodoImportReport, start: float) -> TodoImportReport:
+    report.seconds = time.perf_counter() - start
+    if report.seconds:
+        report.rows_per_second = report.imported / report.seconds
+    return report
+
+
+async def export_todos(
+    file_format: FileFormat, page_size: int = EXPORT_PAGE_SIZE
+) -> AsyncIterator[bytes]:
+    """Yield all todos in `file_format`, one encoded page of rows at a time."""
+    if file_format == "csv":
+        yield (",".join(EXPORT_COLUMNS) + "\r\n").encode()
+    columns = [getattr(Todos, column) for column in EXPORT_COLUMNS]
+    after = 0
+    while True:
+        query = (
+            select(*columns).where(Todos.id > after).order_by(Todos.id).limit(page_size)
+        )
+        async with AsyncReadSessionLocal() as db:
+            rows = (await db.execute(query)).all()
+        if not rows:
+            return
+        if file_format == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows)
+            yield buffer.getvalue().encode()
+        else:
+            yield b"".join(
+                orjson.dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in rows
+            )
+        after = rows[-1].id
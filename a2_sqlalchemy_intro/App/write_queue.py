@@ -0,0 +1,137 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from database import AsyncSessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+# Group commit settings, overridable with environment variables.
+# - `TODOS_GROUP_COMMIT=1` sends single todo creates and updates through `todo_writer`
+# - `TODOS_GROUP_COMMIT_MAX_BATCH` is the most writes committed together
+# - `TODOS_GROUP_COMMIT_MAX_DELAY` is how long (in ms) the writer waits for more writes after the first one
+# A longer delay makes bigger batches (more writes per commit) but adds up to that much latency to every write.
+GROUP_COMMIT_ENABLED = os.environ.get("TODOS_GROUP_COMMIT", "0") == "1"
+GROUP_COMMIT_MAX_BATCH = int(os.environ.get("TODOS_GROUP_COMMIT_MAX_BATCH", 256))
+GROUP_COMMIT_MAX_DELAY = float(os.environ.get("TODOS_GROUP_COMMIT_MAX_DELAY", 2)) / 1000
+
+# A write: an async function running its statements on the session it gets and returning its result.
+# It must not commit, the writer commits once for the whole batch.
+Write = Callable[[AsyncSession], Awaitable[Any]]
+
+
+# Group commit.
+# Every commit ends with SQLite writing (and, depending on `synchronous`, syncing) the changes to disk,
+# which limits how many single-row transactions per second the database can take.
+# Instead of committing in every request, the routes hand their write to `submit`,
+# a single background task collects the writes arriving within `max_delay` (at most `max_batch` of them)
+# and runs them in one transaction with one commit. Each request waits for its own result.
+# If the batch fails, it's rolled back and its writes are retried one transaction each,
+# so a failing write only fails its own request.
+class GroupCommitWriter:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        enabled: bool = GROUP_COMMIT_ENABLED,
+        max_batch: int = GROUP_COMMIT_MAX_BATCH,
+        max_delay: float = GROUP_COMMIT_MAX_DELAY,
+    ):
+        self.session_factory = session_factory
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.writes = 0
+        self.retried_batches = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, write: Write) -> Any:
+        """Queue `write` and return its result once the batch it's part of is committed."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((write, future))
+        return await future
+
+    async def stop(self) -> None:
+        """Commit the writes already queued, then stop the background task."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "writes": self.writes,
+            "retried_batches": self.retried_batches,
+        }
+
+    def _ensure_started(self) -> None:
+        # The task is started by the first write; it's restarted if the event loop changed
+        # (e.g. a test client running every request in a new loop)
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit(self, batch: list) -> None:
+        # Requests that were cancelled meanwhile (e.g. the client disconnected) are skipped
+        batch = [(write, future) for write, future in batch if not future.cancelled()]
+        if not batch:
+            return
+        self.batches += 1
+        self.writes += len(batch)
+        try:
+            async with self.session_factory() as db:
+                results = [await write(db) for write, _ in batch]
+                await db.commit()
+        except Exception:
+            self.retried_batches += 1
+            for write, future in batch:
+                await self._commit_one(write, future)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _commit_one(self, write: Write, future: asyncio.Future) -> None:
+        try:
+            async with self.session_factory() as db:
+                result = await write(db)
+                await db.commit()
+        except Exception as error:
+            if not future.done():
+                future.set_exception(error)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+
+todo_writer = GroupCommitWriter(AsyncSessionLocal)
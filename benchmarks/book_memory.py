@@ -0,0 +1,105 @@
+"""Compare how many bytes each book costs in the different catalog representations.
+
+Run from the repository root:
+
+    python -m benchmarks.book_memory --books 1000000
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Iterator
+
+from a1_basics import catalog
+from a1_basics.models import Book
+
+
+# The original `Book`: a plain class with a per-instance `__dict__`
+class DictBook:
+    def __init__(self, book_id, title, author, description, rating, published_date):
+        self.book_id = book_id
+        self.title = title
+        self.author = author
+        self.description = description
+        self.rating = rating
+        self.published_date = published_date
+
+
+def generate_rows(count: int, authors: int = 1000) -> Iterator[tuple]:
+    # Strings are built per row, as they would be when parsed from a request body,
+    # so duplicated authors really are separate objects unless a representation interns them
+    for book_id in range(1, count + 1):
+        yield (
+            book_id,
+            f"Title {book_id}",
+            "".join(("Author ", str(book_id % authors))),
+            f"Description of book {book_id}",
+            book_id % 5 + 1,
+            1801 + book_id % 298,
+        )
+
+
+REPRESENTATIONS: dict[str, Callable[[int], object]] = {
+    "list[DictBook]": lambda count: [DictBook(*row) for row in generate_rows(count)],
+    "list[Book]": lambda count: [Book(*row) for row in generate_rows(count)],
+    "BookCatalog": lambda count: catalog.BookCatalog(
+        Book(*row) for row in generate_rows(count)
+    ),
+    "ColumnarBookCatalog": lambda count: catalog.ColumnarBookCatalog(
+        Book(*row) for row in generate_rows(count)
+    ),
+}
+
+# The shared catalog keeps the books in a memory-mapped file, outside of the Python heap,
+# so the number shown is what each worker process costs on top of the single shared copy
+if "shared" in catalog.CATALOG_BACKENDS:
+    SHARED_PATH = os.path.join(tempfile.mkdtemp(), "books.shared")
+    SharedBookCatalog = catalog.CATALOG_BACKENDS["shared"]
+    REPRESENTATIONS["SharedBookCatalog"] = lambda count: SharedBookCatalog(
+        (Book(*row) for row in generate_rows(count)), path=SHARED_PATH
+    )
+
+
+def measure(build: Callable[[int], object], count: int) -> tuple[object, int]:
+    gc.collect()
+    tracemalloc.start()
+    store = build(count)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return store, size
+
+
+def time_rating_filter(store: object, rounds: int) -> float:
+    if isinstance(store, list):
+        # What the endpoints did before: a Python loop over book attributes
+        def query(rating):
+            return [book for book in store if book.rating == rating]
+
+    else:
+        query = store.by_rating
+    start = time.perf_counter()
+    for i in range(rounds):
+        query(i % 5 + 1)
+    return (time.perf_counter() - start) / rounds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'representation':<22}{'bytes/book':>12}{'rating filter (ms)':>20}")
+    for name, build in REPRESENTATIONS.items():
+        store, size = measure(build, args.books)
+        filter_time = time_rating_filter(store, args.rounds)
+        print(f"{name:<22}{size / args.books:>12.1f}{filter_time * 1000:>20.2f}")
+        del store
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Compare todo create throughput and latency with and without group commit.
+
+Run from the repository root:
+
+    python -m benchmarks.group_commit --requests 2000 --concurrency 64 --delays 0.5 2 5
+
+Every mode sends the same number of `POST /todo` requests from `--concurrency` concurrent clients.
+Set `TODOS_DB_SYNCHRONOUS=FULL` to measure with an fsync on every commit.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.todos_app import load_todos_app
+
+
+def todo(i: int) -> dict:
+    return {
+        "title": f"Todo {i}",
+        "description": f"Description {i}",
+        "priority": i % 5 + 1,
+        "complete": False,
+    }
+
+
+async def send_creates(
+    client: httpx.AsyncClient, requests: int, concurrency: int
+) -> tuple[float, list[float]]:
+    latencies = []
+    counter = iter(range(requests))
+
+    async def client_loop():
+        for i in counter:
+            start = time.perf_counter()
+            response = await client.post("/todo", json=todo(i))
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    return sorted(values)[min(int(len(values) * fraction), len(values) - 1)]
+
+
+async def run(
+    requests: int, concurrency: int, delays: list[float], max_batch: int
+) -> None:
+    # Admission control would reject part of the burst, only the commit modes are compared here
+    os.environ.setdefault("TODOS_ADMISSION", "0")
+    with tempfile.TemporaryDirectory() as workdir:
+        app = load_todos_app(workdir)
+        from write_queue import todo_writer
+
+        modes = [("per-request", False, 0.0)]
+        modes += [(f"group {delay:g}ms", True, delay / 1000) for delay in delays]
+
+        transport = httpx.ASGITransport(app=app)
+        print(
+            f"{'mode':<16}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'writes/batch':>14}"
+        )
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            for name, enabled, delay in modes:
+                todo_writer.enabled = enabled
+                todo_writer.max_delay = delay
+                todo_writer.max_batch = max_batch
+                batches, writes = todo_writer.batches, todo_writer.writes
+
+                elapsed, latencies = await send_creates(client, requests, concurrency)
+                batch_size = (
+                    (todo_writer.writes - writes) / (todo_writer.batches - batches)
+                    if enabled
+                    else 1
+                )
+                print(
+                    f"{name:<16}{requests / elapsed:>10.0f}"
+                    f"{statistics.median(latencies) * 1000:>10.2f}"
+                    f"{percentile(latencies, 0.99) * 1000:>10.2f}"
+                    f"{batch_size:>14.1f}"
+                )
+            await todo_writer.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--delays",
+        type=float,
+        nargs="+",
+        default=[0.5, 2, 5],
+        help="group commit `max_delay` values to try, in milliseconds",
+    )
+    parser.add_argument("--max-batch", type=int, default=256)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency, args.delays, args.max_batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Check that importing the todos app stays within a cold-start time budget.
+
+Run from the repository root:
+
+    python -m benchmarks.import_time --budget-ms 1100
+
+Imports `main` in fresh interpreters with `python -X importtime` (which reports the time spent importing
+every module), prints the slowest modules and exits with status 1 when the best of `--runs` attempts
+is over the budget, or when importing created the database file (the schema is set up by the app's lifespan,
+importing must not touch the database). The same check runs with the app's tests (`App/tests/test_import_time.py`).
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.todos_app import APP_DIR
+
+# `import main` takes about 800-1000 ms (best of 3 runs), the budget is a small margin above that,
+# so that a noticeably slower cold start fails the check. Lower it when the import gets faster.
+IMPORT_TIME_BUDGET_MS = 1100
+
+# `import time: <self us> | <cumulative us> | <indentation><module>`
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure_import(workdir: str) -> dict[str, tuple[int, int]]:
+    """Import `main` once, return `{module: (self microseconds, cumulative microseconds)}`."""
+    environment = {**os.environ, "PYTHONPATH": str(APP_DIR)}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=workdir,
+        env=environment,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            self_time, cumulative, _, module = match.groups()
+            times[module] = (int(self_time), int(cumulative))
+    return times
+
+
+def measure_best_import(runs: int) -> tuple[dict[str, tuple[int, int]], bool]:
+    """Import `main` `runs` times, return the times of the fastest run and whether any run created the database."""
+    best = None
+    touched_database = False
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            times = measure_import(workdir)
+            touched_database |= os.path.exists(os.path.join(workdir, "todosapp.db"))
+        if best is None or times["main"][1] < best["main"][1]:
+            best = times
+    return best, touched_database
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    best, touched_database = measure_best_import(args.runs)
+
+    print(f"{'module':<50}{'self ms':>10}{'cumulative ms':>16}")
+    slowest = sorted(best.items(), key=lambda item: item[1][0], reverse=True)
+    for module, (self_time, cumulative) in slowest[: args.top]:
+        print(f"{module:<50}{self_time / 1000:>10.1f}{cumulative / 1000:>16.1f}")
+
+    total = best["main"][1] / 1000
+    print(f"\nimport main: {total:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    failed = False
+    if total > args.budget_ms:
+        print("FAIL: over the import time budget")
+        failed = True
+    if touched_database:
+        print("FAIL: importing `main` created todosapp.db")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,496 @@
+"""Load test the example apps and report throughput and latency percentiles.
+
+Each app is seeded with `--rows` books or todos, then `--concurrency` clients send `--requests`
+requests picked at random from a weighted mix of operations (reads, writes, filtered queries).
+By default requests go through httpx's ASGI transport, in-process, which measures the app
+without any network overhead. `--uvicorn` serves the app with a real uvicorn server on a local port instead.
+
+Run from the repository root:
+
+    python -m benchmarks.load todos --rows 100000 --requests 20000 --concurrency 32
+    python -m benchmarks.load books --mix get=80,create=20 --output books.json
+    python -m benchmarks.load example --baseline example.json
+
+With `--baseline`, the run fails (exit code 1) when throughput drops, or a p95/p99 latency or the share
+of 5xx responses grows, by more than `--tolerance` compared to the results saved by an earlier run with `--output`.
+The baseline must have been recorded with the same app, rows, requests, concurrency, seed, mix and server,
+otherwise the numbers aren't comparable and the run stops (exit code 2) without comparing them.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+import httpx
+
+from benchmarks.todos_app import load_todos_app
+
+Operation = Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]
+
+
+@dataclass
+class Scenario:
+    # Imports the app, seeds it with `rows` items and returns it
+    setup: Callable[[int, str], object]
+    # Operation name -> (default weight, operation)
+    operations: dict[str, tuple[int, Operation]]
+    rows: int = 0
+
+
+@dataclass
+class Stats:
+    latencies: list[float] = field(default_factory=list)
+    client_errors: int = 0
+    server_errors: int = 0
+
+    def record(self, latency: float, status_code: int) -> None:
+        self.latencies.append(latency)
+        if status_code >= 500:
+            self.server_errors += 1
+        elif status_code >= 400:
+            self.client_errors += 1
+
+    def summary(self, elapsed: float) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "requests": len(latencies),
+            "throughput": len(latencies) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "client_errors": self.client_errors,
+            "server_errors": self.server_errors,
+        }
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+# Scenario for `a0_intro/example.py`
+def setup_example(rows: int, workdir: str):
+    from a0_intro import example
+
+    example.BOOKS.extend(
+        {
+            "title": f"Seeded book {i}",
+            "author": f"Author {i % 10_000}",
+            "category": f"Category {i % 1_000}",
+        }
+        for i in range(rows)
+    )
+    return example.app
+
+
+def example_scenario(rows: int) -> Scenario:
+    def title(rng):
+        return f"seeded BOOK {rng.randrange(rows)}"
+
+    return Scenario(
+        setup=setup_example,
+        rows=rows,
+        operations={
+            "title": (50, lambda c, rng: c.get(f"/books/{title(rng)}")),
+            "author": (
+                15,
+                lambda c, rng: c.get(
+                    "/books/byauthor/",
+                    params={"author": f"author {rng.randrange(10_000)}"},
+                ),
+            ),
+            "author_category": (
+                15,
+                lambda c, rng: c.get(
+                    f"/books/author {rng.randrange(10_000)}/",
+                    params={"category": f"category {rng.randrange(1_000)}"},
+                ),
+            ),
+            "autocomplete": (
+                10,
+                lambda c, rng: c.get(
+                    "/books/autocomplete/",
+                    params={"prefix": f"seeded book {rng.randrange(1000)}"},
+                ),
+            ),
+            "create": (
+                5,
+                lambda c, rng: c.post(
+                    "/books/create_book",
+                    json={
+                        "title": f"New book {rng.random()}",
+                        "author": "Someone",
+                        "category": "new",
+                    },
+                ),
+            ),
+            "update": (
+                5,
+                lambda c, rng: c.put(
+                    "/books/update_book",
+                    json={
+                        "title": title(rng),
+                        "author": "Updated",
+                        "category": "updated",
+                    },
+                ),
+            ),
+        },
+    )
+
+
+# Scenario for `a1_basics/books.py`
+def setup_books(rows: int, workdir: str):
+    from a1_basics import books
+    from a1_basics.models import Book
+
+    for i in range(rows):
+        books.BOOKS.add(
+            Book(
+                None,
+                f"Title {i}",
+                f"Author {i % 10_000}",
+                "Seeded",
+                i % 5 + 1,
+                1801 + i % 298,
+            )
+        )
+    return books.app
+
+
+def books_scenario(rows: int) -> Scenario:
+    def book(rng, **extra):
+        return {
+            "title": f"Title {rng.random()}",
+            "author": "Someone",
+            "description": "Benchmark book",
+            "rating": rng.randint(1, 5),
+            "published_date": rng.randint(1801, 2099),
+            **extra,
+        }
+
+    def book_id(rng):
+        return rng.randint(1, rows)
+
+    return Scenario(
+        setup=setup_books,
+        rows=rows,
+        operations={
+            "get": (70, lambda c, rng: c.get(f"/books/{book_id(rng)}")),
+            "publish_date": (
+                10,
+                lambda c, rng: c.get(
+                    "/books/publish/",
+                    params={"published_date": rng.randint(1801, 2099)},
+                ),
+            ),
+            # A single rating matches a fifth of the catalog, so it's off by default
+            "rating": (
+                0,
+                lambda c, rng: c.get(
+                    "/books/", params={"book_rating": rng.randint(1, 5)}
+                ),
+            ),
+            "create": (10, lambda c, rng: c.post("/create-book", json=book(rng))),
+            "update": (
+                5,
+                lambda c, rng: c.put(
+                    "/books/update_book", json=book(rng, book_id=book_id(rng))
+                ),
+            ),
+            "delete": (5, lambda c, rng: c.delete(f"/books/{book_id(rng)}")),
+        },
+    )
+
+
+# Scenario for the `a2_sqlalchemy_intro` todos API, on a fresh database in a temporary directory
+def setup_todos(rows: int, workdir: str):
+    app = load_todos_app(workdir)
+    from database import engine
+    from models import Todos
+    from sqlalchemy import insert
+
+    with engine.begin() as connection:
+        for start in range(0, rows, 10_000):
+            connection.execute(
+                insert(Todos),
+                [
+                    {
+                        "title": f"Todo {i}",
+                        "description": f"Description {i}",
+                        "priority": i % 5 + 1,
+                        "complete": i % 3 == 0,
+                    }
+                    for i in range(start, min(start + 10_000, rows))
+                ],
+            )
+    return app
+
+
+def todos_scenario(rows: int) -> Scenario:
+    def todo(rng):
+        return {
+            "title": "Benchmark todo",
+            "description": "Created by benchmarks.load",
+            "priority": rng.randint(1, 5),
+            "complete": rng.random() < 0.5,
+        }
+
+    def todo_id(rng):
+        return rng.randint(1, max(rows, 1))
+
+    return Scenario(
+        setup=setup_todos,
+        rows=rows,
+        operations={
+            "get": (60, lambda c, rng: c.get(f"/todo/{todo_id(rng)}")),
+            "page": (
+                20,
+                lambda c, rng: c.get("/", params={"after": todo_id(rng), "limit": 100}),
+            ),
+            "filter": (
+                10,
+                lambda c, rng: c.get(
+                    "/todos/filter",
+                    params={
+                        "complete": rng.random() < 0.5,
+                        "priority": rng.randint(1, 5),
+                        "limit": 50,
+                    },
+                ),
+            ),
+            "create": (10, lambda c, rng: c.post("/todo", json=todo(rng))),
+            "update": (
+                5,
+                lambda c, rng: c.put(f"/todo/{todo_id(rng)}", json=todo(rng)),
+            ),
+            "delete": (5, lambda c, rng: c.delete(f"/todo/{todo_id(rng)}")),
+        },
+    )
+
+
+SCENARIOS = {
+    "example": example_scenario,
+    "books": books_scenario,
+    "todos": todos_scenario,
+}
+
+
+def parse_mix(mix: str, operations: dict[str, tuple[int, Operation]]) -> dict[str, int]:
+    if not mix:
+        return {name: weight for name, (weight, _) in operations.items() if weight > 0}
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in operations:
+            raise SystemExit(
+                f"Unknown operation {name!r}, choose from {sorted(operations)}"
+            )
+        weights[name] = int(weight)
+    return weights
+
+
+@asynccontextmanager
+async def open_client(app, use_uvicorn: bool):
+    if not use_uvicorn:
+        # `ASGITransport` doesn't send lifespan events, so startup and shutdown are run here
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://bench"
+            ) as client:
+                yield client
+        return
+
+    import uvicorn
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", limits=limits
+        ) as client:
+            yield client
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+async def run_load(app, scenario: Scenario, weights: dict[str, int], args) -> dict:
+    names = list(weights)
+    stats: dict[str, Stats] = defaultdict(Stats)
+    remaining = args.requests
+
+    async def worker(seed: int) -> None:
+        nonlocal remaining
+        rng = random.Random(seed)
+        while remaining > 0:
+            remaining -= 1
+            name = rng.choices(names, weights=[weights[n] for n in names])[0]
+            operation = scenario.operations[name][1]
+            start = time.perf_counter()
+            response = await operation(client, rng)
+            stats[name].record(time.perf_counter() - start, response.status_code)
+
+    async with open_client(app, args.uvicorn) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(args.seed + i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    total = Stats()
+    for operation_stats in stats.values():
+        total.latencies.extend(operation_stats.latencies)
+        total.client_errors += operation_stats.client_errors
+        total.server_errors += operation_stats.server_errors
+    return {
+        "elapsed": elapsed,
+        "total": total.summary(elapsed),
+        "operations": {name: stats[name].summary(elapsed) for name in sorted(stats)},
+    }
+
+
+def config_mismatches(config: dict, baseline: dict) -> list[str]:
+    """List the settings of this run that differ from the ones the baseline was recorded with."""
+    baseline_config = baseline.get("config")
+    if baseline_config is None:
+        return ["the baseline doesn't record its config, record it again with --output"]
+    return [
+        f"{key}: {config[key]!r} != baseline {baseline_config.get(key)!r}"
+        for key in config
+        if config[key] != baseline_config.get(key)
+    ]
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    groups = {"total": (results["total"], baseline["total"])}
+    for name, summary in results["operations"].items():
+        if name in baseline["operations"]:
+            groups[name] = (summary, baseline["operations"][name])
+
+    for name, (current, previous) in groups.items():
+        if current["throughput"] < previous["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {current['throughput']:.0f}/s "
+                f"< baseline {previous['throughput']:.0f}/s"
+            )
+        for key in ("p95_ms", "p99_ms"):
+            if current[key] > previous[key] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {key} {current[key]:.2f} > baseline {previous[key]:.2f}"
+                )
+        # A build failing fast with 5xx shows a higher throughput and a lower latency,
+        # so the share of server errors is checked as well (any at all when the baseline had none)
+        error_rate = server_error_rate(current)
+        previous_error_rate = server_error_rate(previous)
+        if error_rate > previous_error_rate * (1 + tolerance):
+            regressions.append(
+                f"{name}: server errors {error_rate:.2%} "
+                f"> baseline {previous_error_rate:.2%}"
+            )
+    return regressions
+
+
+def server_error_rate(summary: dict) -> float:
+    return (
+        summary["server_errors"] / summary["requests"] if summary["requests"] else 0.0
+    )
+
+
+def print_results(results: dict) -> None:
+    print(
+        f"{'operation':<18}{'requests':>10}{'req/s':>10}{'p50 ms':>10}"
+        f"{'p95 ms':>10}{'p99 ms':>10}{'4xx':>7}{'5xx':>7}"
+    )
+    rows = {**results["operations"], "TOTAL": results["total"]}
+    for name, summary in rows.items():
+        print(
+            f"{name:<18}{summary['requests']:>10}{summary['throughput']:>10.0f}"
+            f"{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}"
+            f"{summary['client_errors']:>7}{summary['server_errors']:>7}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.splitlines()[1:]),
+    )
+    parser.add_argument("app", choices=sorted(SCENARIOS))
+    parser.add_argument(
+        "--rows", type=int, default=10_000, help="books or todos to seed"
+    )
+    parser.add_argument("--requests", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default="", help="e.g. get=70,create=30")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--uvicorn", action="store_true", help="serve the app with uvicorn"
+    )
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    # The todos scenario changes the working directory, so resolve file paths first
+    cwd = os.getcwd()
+    output = args.output and os.path.abspath(args.output)
+    baseline_path = args.baseline and os.path.abspath(args.baseline)
+
+    scenario = SCENARIOS[args.app](args.rows)
+    weights = parse_mix(args.mix, scenario.operations)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        seed_started = time.perf_counter()
+        app = scenario.setup(args.rows, workdir)
+        print(f"Seeded {args.rows} rows in {time.perf_counter() - seed_started:.2f}s")
+        results = asyncio.run(run_load(app, scenario, weights, args))
+        os.chdir(cwd)
+
+    results["config"] = {
+        key: getattr(args, key)
+        for key in ("app", "rows", "requests", "concurrency", "seed", "uvicorn")
+    }
+    results["config"]["mix"] = weights
+    print_results(results)
+
+    if output:
+        with open(output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if baseline_path:
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        mismatches = config_mismatches(results["config"], baseline)
+        for mismatch in mismatches:
+            print(f"BASELINE MISMATCH {mismatch}", file=sys.stderr)
+        if mismatches:
+            sys.exit(2)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Measure the per-row cost of serializing todos and books to JSON.
+
+Compares the path FastAPI takes without a response model (`jsonable_encoder` + `json.dumps`)
+with the response model path (Pydantic validation + JSON serialization in its Rust core)
+and, for reference, `orjson` on plain dicts.
+
+Run from the repository root:
+
+    python -m benchmarks.serialization --rows 10000
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import timeit
+from typing import Callable
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from a1_basics.models import Book, BookResponse
+from benchmarks.todos_app import load_todos_app
+
+
+def make_todos(rows: int) -> list:
+    Todos = sys.modules["models"].Todos
+    return [
+        Todos(
+            id=i,
+            title=f"Todo {i}",
+            description=f"Description {i}",
+            priority=i % 5 + 1,
+            complete=i % 2 == 0,
+        )
+        for i in range(1, rows + 1)
+    ]
+
+
+def make_books(rows: int) -> list[Book]:
+    return [
+        Book(i, f"Title {i}", f"Author {i % 100}", f"Description {i}", i % 5 + 1, 1900)
+        for i in range(1, rows + 1)
+    ]
+
+
+def cases(name: str, objects: list, response_model: type) -> dict[str, Callable]:
+    adapter = TypeAdapter(list[response_model])
+    dicts = jsonable_encoder(objects)
+    return {
+        f"{name}: jsonable_encoder + json": lambda: json.dumps(
+            jsonable_encoder(objects)
+        ).encode(),
+        f"{name}: response model": lambda: adapter.dump_json(
+            adapter.validate_python(objects, from_attributes=True)
+        ),
+        f"{name}: orjson (plain dicts)": lambda: orjson.dumps(dicts),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        load_todos_app(workdir)
+        TodoResponse = sys.modules["routers.todos"].TodoResponse
+        benchmarks = {
+            **cases("todos", make_todos(args.rows), TodoResponse),
+            **cases("books", make_books(args.rows), BookResponse),
+        }
+
+        print(f"{'case':<36}{'us/row':>10}")
+        for name, function in benchmarks.items():
+            best = min(timeit.repeat(function, number=1, repeat=args.repeat))
+            print(f"{name:<36}{best / args.rows * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compare todo write throughput of the per-row endpoints with the bulk endpoints.
+
+Run from the repository root:
+
+    python -m benchmarks.todo_bulk --rows 5000 --batch-size 500
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.todos_app import load_todos_app
+
+
+def todo(i: int, **extra) -> dict:
+    return {
+        "title": f"Todo {i}",
+        "description": f"Description {i}",
+        "priority": i % 5 + 1,
+        "complete": False,
+        **extra,
+    }
+
+
+def batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+async def per_row(client: httpx.AsyncClient, rows: int, first_id: int) -> None:
+    for i in range(rows):
+        await client.post("/todo", json=todo(i))
+    for i in range(rows):
+        await client.put(f"/todo/{first_id + i}", json=todo(i, complete=True))
+    for i in range(rows):
+        await client.delete(f"/todo/{first_id + i}")
+
+
+async def bulk(client: httpx.AsyncClient, rows: int, batch_size: int) -> None:
+    todo_ids = []
+    for batch in batches([todo(i) for i in range(rows)], batch_size):
+        response = await client.post("/todos/bulk", json=batch)
+        todo_ids.extend(result["id"] for result in response.json())
+    updates = [todo(i, id=todo_id, complete=True) for i, todo_id in enumerate(todo_ids)]
+    for batch in batches(updates, batch_size):
+        await client.put("/todos/bulk", json=batch)
+    for batch in batches(todo_ids, batch_size):
+        await client.request("DELETE", "/todos/bulk", json=batch)
+
+
+async def run(rows: int, batch_size: int) -> None:
+    with tempfile.TemporaryDirectory() as workdir:
+        app = load_todos_app(workdir)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            # Ids are never reused by SQLite, so the per-row run starts right after the warm-up todo
+            await client.post("/todo", json=todo(0))
+            await client.delete("/todo/1")
+
+            start = time.perf_counter()
+            await per_row(client, rows, first_id=2)
+            per_row_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            await bulk(client, rows, batch_size)
+            bulk_time = time.perf_counter() - start
+
+    # Every run creates, updates and deletes each row once
+    operations = rows * 3
+    print(f"{'mode':<10}{'seconds':>10}{'rows/s':>12}")
+    print(f"{'per-row':<10}{per_row_time:>10.2f}{operations / per_row_time:>12.0f}")
+    print(f"{'bulk':<10}{bulk_time:>10.2f}{operations / bulk_time:>12.0f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.rows, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "a2_sqlalchemy_intro" / "App"
+
+
+def load_todos_app(workdir: str):
+    """Import the todos app so that its `todosapp.db` is created inside `workdir`.
+
+    The app uses top-level imports (`import models`, `from database import ...`) and a relative
+    database URL, so it has to be imported with `App/` on `sys.path` and `workdir` as the current directory.
+    """
+    os.chdir(workdir)
+    if str(APP_DIR) not in sys.path:
+        sys.path.insert(0, str(APP_DIR))
+    app = importlib.import_module("main").app
+    # The tables are normally created by the app's lifespan, which `httpx.ASGITransport` doesn't run
+    importlib.import_module("schema").ensure_schema()
+    return app
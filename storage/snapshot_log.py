@@ -0,0 +1,309 @@
+import asyncio
+import marshal
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows, there the log is opened without the lock
+    fcntl = None
+
+# File layout
+# - `<name>.snapshot`: header (magic, format version, sequence number of the last operation it contains),
+#   followed by the records (the store's own format, e.g. a list of tuples) serialized with `marshal` in one blob.
+# - `<name>.log`: append-only list of operations made after the snapshot, each one framed as
+#   `length (4 bytes) + CRC32 (4 bytes) + marshal((sequence, operation))`.
+# `marshal` is Python's fast binary format for built-in types (tuples, lists, dicts, str, int, ...),
+# it's only ever used on files written by this module, never on untrusted data.
+SNAPSHOT_MAGIC = b"BOOKSNAP"
+SNAPSHOT_HEADER = struct.Struct("<8sIQ")
+LOG_FRAME = struct.Struct("<II")
+FORMAT_VERSION = 1
+
+
+# Raised by `load` when another process already uses the same files
+class LogLockedError(RuntimeError):
+    pass
+
+
+# Persistence for an in-memory store: a snapshot of all records plus a write-ahead log of the operations since.
+# Every write appends an operation to the log. On startup, `load` returns the snapshot records and the logged
+# operations, which the store replays to get back to the state before the restart.
+# `compact` writes a new snapshot and empties the log, so startup doesn't have to replay an ever-growing log.
+#
+# Durability is a trade-off with throughput, `fsync` (forcing the data to disk) is slow:
+# - `fsync_batch`: fsync after this many appended operations (1 = after every write, the safest)
+# - `fsync_interval`: also fsync at most this many seconds after a write, from a background thread
+# Operations not yet fsynced when the machine crashes are lost, a torn last entry is detected by its checksum.
+#
+# An async app calls `append_async`, which runs the fsync and the compaction in worker threads:
+# other requests keep being served while the disk works. A compaction takes a snapshot at a checkpoint
+# (`begin_compaction`), writes it in the background (`finish_compaction`) while appends go on,
+# then keeps only the log entries appended after the checkpoint.
+#
+# The files belong to a single process: the store lives in that process's memory, and two processes appending to
+# and compacting the same log would lose each other's records. `load` takes an exclusive `flock` on `<name>.lock`
+# and fails with `LogLockedError` when another process holds it, e.g. a second `uvicorn --workers N` worker.
+# Run such an app with a single worker (or share the store another way, see `a1_basics/shared_catalog.py`).
+class SnapshotLog:
+    def __init__(
+        self,
+        directory: str,
+        name: str,
+        fsync_batch: int = 64,
+        fsync_interval: Optional[float] = 0.05,
+        compact_every: int = 100_000,
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, f"{name}.snapshot")
+        self.log_path = os.path.join(directory, f"{name}.log")
+        self.lock_path = os.path.join(directory, f"{name}.lock")
+        self.fsync_batch = max(fsync_batch, 1)
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.sequence = 0
+        self.operations_since_snapshot = 0
+        self._unsynced = 0
+        self._lock = threading.Lock()
+        self._log = None
+        self._lock_file = None
+        self._closed = threading.Event()
+        self._syncer = None
+        self._compaction: Optional[asyncio.Task] = None
+        self.compacting = False
+
+    def load(self) -> tuple[Any, list[tuple]]:
+        """Return the snapshot records (None without a snapshot) and the operations logged after it.
+
+        Both files are read through `mmap`, the operating system maps them into memory
+        and `marshal` decodes straight from that memory without copying the file first.
+        """
+        self._lock_files()
+        records = None
+        snapshot_sequence = 0
+        if os.path.exists(self.snapshot_path):
+            records, snapshot_sequence = self._read_snapshot()
+
+        operations, valid_length = self._read_log(snapshot_sequence)
+        self.sequence = max(
+            [snapshot_sequence, *(sequence for sequence, _ in operations)]
+        )
+        self.operations_since_snapshot = len(operations)
+
+        self._log = open(self.log_path, "ab")
+        # Drop a partially written last entry, left by a crash in the middle of an append
+        if self._log.tell() > valid_length:
+            self._log.truncate(valid_length)
+            self._log.seek(valid_length)
+        return records, [operation for _, operation in operations]
+
+    def append(self, *operation) -> bool:
+        """Append `operation` to the log, without waiting for the disk.
+
+        Returns True once `fsync_batch` operations are waiting for an fsync, the caller then calls `sync`.
+        """
+        # The background syncer starts with the first write, it would only slow down loading the store
+        if self.fsync_interval and self._syncer is None:
+            self._syncer = threading.Thread(target=self._sync_periodically, daemon=True)
+            self._syncer.start()
+        with self._lock:
+            self.sequence += 1
+            payload = marshal.dumps((self.sequence, operation))
+            self._log.write(LOG_FRAME.pack(len(payload), zlib.crc32(payload)) + payload)
+            self.operations_since_snapshot += 1
+            self._unsynced += 1
+            return self._unsynced >= self.fsync_batch
+
+    async def append_async(
+        self,
+        *operation,
+        snapshot: Callable[[], Any],
+        encode: Callable[[Any], Any] = lambda records: records,
+    ) -> None:
+        """`append` for an asyncio app: the fsync and the compaction run in worker threads.
+
+        When a compaction is due, `snapshot()` is called right away and must quickly return a copy
+        of the current records that later writes won't change (e.g. a list of immutable objects).
+        `encode` turns that copy into the snapshot content (anything `marshal` can write), in the worker thread.
+        """
+        if self.append(*operation):
+            await asyncio.to_thread(self.sync)
+        if self.should_compact():
+            # Nothing is awaited between the checkpoint and the snapshot, so no write can fall in between
+            checkpoint = self.begin_compaction()
+            records = snapshot()
+            self._compaction = asyncio.create_task(
+                asyncio.to_thread(
+                    lambda: self.finish_compaction(encode(records), checkpoint)
+                )
+            )
+
+    def should_compact(self) -> bool:
+        return (
+            not self.compacting and self.operations_since_snapshot >= self.compact_every
+        )
+
+    def compact(self, records: Any) -> None:
+        """Write a snapshot of `records` (the current state of the store) and empty the log."""
+        self.finish_compaction(records, self.begin_compaction())
+
+    def begin_compaction(self) -> tuple[int, int]:
+        """Return the checkpoint of a compaction: the last sequence number and the end of the log.
+
+        The snapshot passed to `finish_compaction` must be the state of the store at this point.
+        """
+        with self._lock:
+            self.compacting = True
+            self._log.flush()
+            return self.sequence, self._log.tell()
+
+    def finish_compaction(self, records: Any, checkpoint: tuple[int, int]) -> None:
+        """Write `records` as the snapshot at `checkpoint` and drop the log entries it contains.
+
+        Slow with many records, an async app runs it in a worker thread (see `append_async`).
+        Appends go on meanwhile, the lock is only held to copy the entries appended since the checkpoint.
+        """
+        sequence, offset = checkpoint
+        try:
+            temporary_path = self.snapshot_path + ".tmp"
+            with open(temporary_path, "wb") as file:
+                file.write(
+                    SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, FORMAT_VERSION, sequence)
+                )
+                file.write(marshal.dumps(records))
+                file.flush()
+                os.fsync(file.fileno())
+            # The rename replaces the old snapshot atomically, a crash leaves either the old or the new one.
+            # Log entries already in the snapshot are skipped by their sequence number,
+            # so the log can be shortened afterwards without any risk.
+            os.replace(temporary_path, self.snapshot_path)
+            self._replace_log(offset, sequence)
+        finally:
+            self.compacting = False
+
+    def sync(self) -> None:
+        # Only the flush needs the lock, appends can go on during the fsync.
+        # The duplicated file descriptor stays valid even if a compaction replaces the log file meanwhile.
+        with self._lock:
+            if self._log is None or not self._unsynced:
+                return
+            self._log.flush()
+            descriptor = os.dup(self._log.fileno())
+            self._unsynced = 0
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+
+    async def aclose(self) -> None:
+        """Wait for a running compaction, then `close`."""
+        if self._compaction is not None:
+            await self._compaction
+        self.close()
+
+    def close(self) -> None:
+        self._closed.set()
+        self.sync()
+        with self._lock:
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+        if self._lock_file is not None:
+            # Closing the file releases the lock
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _lock_files(self) -> None:
+        if self._lock_file is not None:
+            return
+        lock_file = open(self.lock_path, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                raise LogLockedError(
+                    f"{self.log_path} is used by another process, "
+                    "persistence only works with a single worker"
+                )
+        self._lock_file = lock_file
+
+    def _replace_log(self, offset: int, sequence: int) -> None:
+        # The entries appended after the checkpoint are copied to a new log file, which replaces the old one.
+        # Most of them are copied and synced without the lock, only the last few are copied under it.
+        temporary_path = self.log_path + ".tmp"
+        with open(temporary_path, "wb") as new_log:
+            with self._lock:
+                self._log.flush()
+            with open(self.log_path, "rb") as old_log:
+                old_log.seek(offset)
+                new_log.write(old_log.read())
+                new_log.flush()
+                os.fsync(new_log.fileno())
+                with self._lock:
+                    self._log.flush()
+                    rest = old_log.read()
+                    new_log.write(rest)
+                    new_log.flush()
+                    os.replace(temporary_path, self.log_path)
+                    self._log.close()
+                    self._log = open(self.log_path, "ab")
+                    self.operations_since_snapshot = self.sequence - sequence
+                    if rest:
+                        self._unsynced = max(self._unsynced, 1)
+
+    def _sync_periodically(self) -> None:
+        while not self._closed.wait(self.fsync_interval):
+            if self._unsynced:
+                self.sync()
+
+    def _read_snapshot(self) -> tuple[list, int]:
+        with open(self.snapshot_path, "rb") as file, mmap.mmap(
+            file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped:
+            magic, version, sequence = SNAPSHOT_HEADER.unpack_from(mapped)
+            if magic != SNAPSHOT_MAGIC or version != FORMAT_VERSION:
+                raise ValueError(f"{self.snapshot_path} is not a snapshot file")
+            with memoryview(mapped) as view, view[SNAPSHOT_HEADER.size :] as data:
+                return marshal.loads(data), sequence
+
+    def _read_log(self, after_sequence: int) -> tuple[list[tuple[int, tuple]], int]:
+        if not os.path.exists(self.log_path) or os.path.getsize(self.log_path) == 0:
+            return [], 0
+        operations = []
+        offset = 0
+        with open(self.log_path, "rb") as file, mmap.mmap(
+            file.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mapped, memoryview(mapped) as view:
+            while offset + LOG_FRAME.size <= len(mapped):
+                length, checksum = LOG_FRAME.unpack_from(mapped, offset)
+                start = offset + LOG_FRAME.size
+                with view[start : start + length] as payload:
+                    if len(payload) < length or zlib.crc32(payload) != checksum:
+                        break
+                    sequence, operation = marshal.loads(payload)
+                if sequence > after_sequence:
+                    operations.append((sequence, operation))
+                offset = start + length
+        return operations, offset
+
+
+def from_env(name: str) -> Optional[SnapshotLog]:
+    """Create a `SnapshotLog` configured by `BOOKS_*` environment variables, or None when it's disabled.
+
+    Persistence is enabled by setting `BOOKS_DATA_DIR` to the directory where the files are kept.
+    """
+    directory = os.environ.get("BOOKS_DATA_DIR")
+    if not directory:
+        return None
+    return SnapshotLog(
+        directory,
+        name,
+        fsync_batch=int(os.environ.get("BOOKS_FSYNC_BATCH", 64)),
+        fsync_interval=float(os.environ.get("BOOKS_FSYNC_INTERVAL", 0.05)) or None,
+        compact_every=int(os.environ.get("BOOKS_COMPACT_EVERY", 100_000)),
+    )
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# The apps import the module as `storage.snapshot_log`, from the repository directory
+REPOSITORY_DIR = Path(__file__).resolve().parent.parent.parent
+if str(REPOSITORY_DIR) not in sys.path:
+    sys.path.insert(0, str(REPOSITORY_DIR))
@@ -0,0 +1,131 @@
+import os
+import shutil
+
+import pytest
+
+from storage.snapshot_log import LOG_FRAME, LogLockedError, SnapshotLog
+
+
+def open_log(directory) -> SnapshotLog:
+    return SnapshotLog(str(directory), "books", fsync_batch=1, fsync_interval=None)
+
+
+@pytest.fixture
+def written(tmp_path) -> SnapshotLog:
+    # A log with three operations, closed as a clean shutdown would
+    log = open_log(tmp_path)
+    assert log.load() == (None, [])
+    for book_id in (1, 2, 3):
+        log.append("add", book_id)
+    log.close()
+    return log
+
+
+def frame_offsets(path) -> list[int]:
+    offsets = [0]
+    with open(path, "rb") as file:
+        data = file.read()
+    while offsets[-1] < len(data):
+        length, _ = LOG_FRAME.unpack_from(data, offsets[-1])
+        offsets.append(offsets[-1] + LOG_FRAME.size + length)
+    return offsets
+
+
+def test_replays_the_log(tmp_path, written):
+    log = open_log(tmp_path)
+    assert log.load() == (None, [("add", 1), ("add", 2), ("add", 3)])
+    assert log.sequence == 3
+    log.close()
+
+
+# A crash in the middle of an append leaves part of the last frame: it's dropped, and cut off the file
+# so that the next appends follow the last complete frame
+@pytest.mark.parametrize("missing", [1, LOG_FRAME.size + 1])
+def test_torn_last_frame_is_truncated(tmp_path, written, missing):
+    *_, last_start, end = frame_offsets(written.log_path)
+    os.truncate(written.log_path, end - missing)
+
+    log = open_log(tmp_path)
+    assert log.load() == (None, [("add", 1), ("add", 2)])
+    assert os.path.getsize(written.log_path) == last_start
+    log.append("add", 4)
+    log.close()
+
+    log = open_log(tmp_path)
+    assert log.load() == (None, [("add", 1), ("add", 2), ("add", 4)])
+    log.close()
+
+
+# A frame whose checksum doesn't match stops the replay, it and everything after it are dropped
+def test_frame_with_bad_checksum_stops_replay(tmp_path, written):
+    _, second_start, third_start, _ = frame_offsets(written.log_path)
+    with open(written.log_path, "r+b") as file:
+        file.seek(third_start - 1)
+        last_byte = file.read(1)
+        file.seek(third_start - 1)
+        file.write(bytes([last_byte[0] ^ 0xFF]))
+
+    log = open_log(tmp_path)
+    assert log.load() == (None, [("add", 1)])
+    assert os.path.getsize(written.log_path) == second_start
+    log.close()
+
+
+def test_compaction_writes_a_snapshot_and_empties_the_log(tmp_path, written):
+    log = open_log(tmp_path)
+    log.load()
+    log.compact([1, 2, 3])
+    assert os.path.getsize(log.log_path) == 0
+    assert log.operations_since_snapshot == 0
+    log.append("remove", 2)
+    log.close()
+
+    log = open_log(tmp_path)
+    assert log.load() == ([1, 2, 3], [("remove", 2)])
+    assert log.sequence == 4
+    log.close()
+
+
+# Writes made while a compaction is writing its snapshot stay in the log
+def test_appends_during_compaction_are_kept(tmp_path, written):
+    log = open_log(tmp_path)
+    log.load()
+    checkpoint = log.begin_compaction()
+    log.append("add", 4)
+    log.finish_compaction([1, 2, 3], checkpoint)
+    assert log.operations_since_snapshot == 1
+    log.close()
+
+    log = open_log(tmp_path)
+    assert log.load() == ([1, 2, 3], [("add", 4)])
+    log.close()
+
+
+# A crash after the snapshot replaced the old one but before the log was shortened
+# leaves entries in the log that the snapshot already contains: they're skipped by their sequence number
+def test_recovery_skips_log_entries_in_the_snapshot(tmp_path, written):
+    shutil.copy(written.log_path, tmp_path / "old.log")
+    log = open_log(tmp_path)
+    log.load()
+    log.compact([1, 2, 3])
+    log.close()
+    with open(written.log_path, "ab") as file:
+        file.write((tmp_path / "old.log").read_bytes())
+
+    log = open_log(tmp_path)
+    assert log.load() == ([1, 2, 3], [])
+    assert log.sequence == 3
+    log.close()
+
+
+# A second process opening the same files (e.g. another uvicorn worker) is refused until the first one closes them
+def test_log_is_used_by_one_process_at_a_time(tmp_path, written):
+    log = open_log(tmp_path)
+    log.load()
+    with pytest.raises(LogLockedError):
+        open_log(tmp_path).load()
+    log.close()
+
+    other = open_log(tmp_path)
+    assert other.load() == (None, [("add", 1), ("add", 2), ("add", 3)])
+    other.close()